@@ -1,97 +1,191 @@
 import threading
-import serial
-import serial.tools.list_ports
-import json
-import tkinter as tk
-from tkinter import ttk, scrolledtext
-from tkinter import messagebox
-
-class UARTCommunication:
-    def __init__(self):
-        self.ser = None
-
-    def list_ports(self):
-        return [port.device for port in serial.tools.list_ports.comports()]
-
-    def open_port(self, port, baud_rate=9600):
-        try:
-            self.ser = serial.Serial(port, baud_rate, timeout=1)
-            return f"Connected to {port}"
-        except Exception as e:
-            self.ser = None
-            return f"Error: {e}"
-
-    def send_message(self, message):
-        if self.ser and self.ser.is_open:
+import time
+from messages import BoardMessage, TextMessage, WinStatusMessage, RawMessage, MESSAGE_CLASSES, from_dict
+from metrics import MetricsRegistry, NULL_REGISTRY
+from serial_writer import WRITE_QUEUE_SIZE, DROP, POLICIES
+from message_log import MessageLog
+# The link itself lives in uart_core; these names stay importable from here for existing callers.
+from uart_core import (MAX_MESSAGES_PER_FRAME, DEFAULT_BAUD_RATE, BAUD_RATES, parse_message, MessageFramer,
+                       SerialReader, UARTCommunication, HostAI, send_move, set_mode, reset_game)
+import engine
+# tkinter, the port registry and the game history are imported by the functions that use them,
+# so importing this module stays cheap and works where there is no Tk.
+
+FRAME_MS = 16
+PORT_POLL_MS = 500
+METRICS_INTERVAL = 1.0
+GAME_MODES = ["User vs User", "User vs AI", "AI vs AI", "User vs AI (host)"]
+HOST_AI_MODE = 3
+
+
+class BoardRenderer:
+    def __init__(self, buttons, make_button=None):
+        self.buttons = buttons
+        self.make_button = make_button
+        self.rendered = [[" " for _ in row] for row in buttons]
+        self.pending = None
+        self.updated_cells = 0
+        self.skipped_updates = 0
+
+    def resize(self, size):
+        # Rebuilds the grid for the board size the device reports.
+        for row in self.buttons:
+            for button in row:
+                button.destroy()
+        self.buttons = [[self.make_button(i, j, size) for j in range(size)] for i in range(size)]
+        self.rendered = [[" "] * size for _ in range(size)]
+
+    def submit(self, board):
+        # Only the newest board of a frame is drawn; the ones it replaces are never rendered.
+        if self.pending is not None:
+            self.skipped_updates += sum(len(row) for row in self.pending)
+        self.pending = board
+
+    def flush(self):
+        board, self.pending = self.pending, None
+        if board is None:
+            return False
+        if len(board) != len(self.rendered) and self.make_button is not None:
+            self.resize(len(board))
+        for i, row in enumerate(board[:len(self.rendered)]):
+            for j, cell in enumerate(row[:len(self.rendered[i])]):
+                if self.rendered[i][j] == cell:
+                    self.skipped_updates += 1
+                    continue
+                self.buttons[i][j].config(text=cell)
+                self.rendered[i][j] = cell
+                self.updated_cells += 1
+        return True
+
+
+class MetricsView:
+    # Refreshes a status-bar summary, and the export file, at most once per interval.
+    def __init__(self, label, registry, export_path=None, interval=METRICS_INTERVAL):
+        self.label = label
+        self.registry = registry
+        self.export_path = export_path
+        self.interval = interval
+        self.refreshed_at = time.monotonic()
+        self.totals = (0, 0)
+
+    def summary(self, elapsed):
+        registry = self.registry
+        received = registry.value("serial_bytes_received_total")
+        sent = registry.value("serial_bytes_sent_total")
+        rx_rate = (received - self.totals[0]) / elapsed if elapsed > 0 else 0
+        tx_rate = (sent - self.totals[1]) / elapsed if elapsed > 0 else 0
+        self.totals = (received, sent)
+        frame = registry.get("gui_frame_seconds")
+        p95 = frame.quantile(0.95) if frame else None
+        frame_text = "-" if p95 is None else f"<={p95 * 1000:g} ms"
+        return (f"RX {rx_rate:.0f} B/s, {registry.value('serial_messages_received_total')} msgs  "
+                f"TX {tx_rate:.0f} B/s, {registry.value('serial_commands_sent_total')} cmds  "
+                f"errors {registry.value('serial_decode_errors_total')}  frame p95 {frame_text}")
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        elapsed = now - self.refreshed_at
+        if not force and elapsed < self.interval:
+            return False
+        self.refreshed_at = now
+        self.label.config(text=self.summary(elapsed))
+        if self.export_path:
             try:
-                json_message = json.dumps(message)
-                self.ser.write((json_message + "\n").encode())
-                return f"Sent: {json_message}"
-            except Exception as e:
-                return f"Error: {e}"
-        return "Port not opened"
-
-    def receive_message(self):
-        if self.ser and self.ser.is_open:
-            try:
-                if self.ser.in_waiting > 0:
-                    response = self.ser.readline().decode().strip()
-                    if response:
-                        json_response = json.loads(response)
-                        return json_response
-            except json.JSONDecodeError:
-                return "Error: Invalid JSON received"
-            except Exception as e:
-                return f"Error: {e}"
-        return "Port not opened"
+                self.registry.export(self.export_path)
+            except OSError as e:
+                self.label.config(text=f"Metrics export failed: {e}")
+        return True
+
+
+def handle_board(response, renderer, log, host_ai=None):
+    renderer.submit(response.board)
+    if host_ai:
+        host_ai.on_board(response.board)
+
+
+def handle_status(response, renderer, log, host_ai=None):
+    log.write(f"Game status: {response.message}")
 
 
-def update_game_board(board, buttons):
-    for i in range(3):
-        for j in range(3):
-            buttons[i][j].config(text=board[i][j])
+def show_win_status(message):
+    from tkinter import messagebox
+    thread = threading.Thread(target=messagebox.showinfo, args=("Win Status", message))
+    thread.start()
 
 
-def send_move(uart, row, col):
-    message = {"command": "MOVE", "row": row, "col": col}
-    uart.send_message(message)
+def handle_win_status(response, renderer, log, host_ai=None):
+    handle_status(response, renderer, log, host_ai)
+    show_win_status(response.message)
 
 
-def set_mode(uart, mode):
-    message = {"command": "MODE", "mode": mode}
-    uart.send_message(message)
+def handle_raw(response, renderer, log, host_ai=None):
+    # Messages outside the schema keep the old dict handling.
+    if "board" in response:
+        renderer.submit(response["board"])
+        if host_ai:
+            host_ai.on_board(response["board"])
+    else:
+        log.write(f"Game status: {response['message']}")
+    if response.get("type") == "win_status":
+        show_win_status(response.get("message"))
 
 
-def reset_game(uart):
-    message = {"command": "RESET"}
-    uart.send_message(message)
+MESSAGE_HANDLERS = {cls: handle_status for cls in MESSAGE_CLASSES.values() if issubclass(cls, TextMessage)}
+MESSAGE_HANDLERS.update({BoardMessage: handle_board, WinStatusMessage: handle_win_status, RawMessage: handle_raw})
 
 
-def auto_receive(uart, buttons, output_text, root):
+def handle_message(response, renderer, log, host_ai=None):
+    if isinstance(response, dict):
+        response = from_dict(response)
+    handler = MESSAGE_HANDLERS.get(type(response))
+    if handler:
+        handler(response, renderer, log, host_ai)
+    else:
+        log.write(f"Received: {response}")
+
+
+def auto_receive(uart, renderer, log, root, render_label=None, host_ai=None, metrics_view=None, games=None):
+    start = time.perf_counter()
     try:
-        if uart.ser and uart.ser.is_open:
-            response = uart.receive_message()
-            if response and response != "Port not opened":
-                if isinstance(response, dict):
-                    if "board" in response:
-                        update_game_board(response["board"], buttons)
-                    else:
-                        output_text.insert(tk.END, f"Game status: {response['message']}\n")
-
-                    if response.get("type") == "win_status":
-                        thread = threading.Thread(target=messagebox.showinfo, args=("Win Status",
-                                                                                    response.get("message")))
-                        thread.start()
-
-                else:
-                    output_text.insert(tk.END, f"Received: {response}\n")
-                output_text.see(tk.END)
+        for response in uart.drain_messages():
+            handle_message(response, renderer, log, host_ai)
+            if games and not isinstance(response, str):
+                games.observe(response)
+        if renderer.flush() and render_label:
+            render_label.config(text=f"Cells redrawn: {renderer.updated_cells}  skipped: {renderer.skipped_updates}")
     except Exception as e:
-        output_text.insert(tk.END, f"Error: {str(e)}\n")
-    root.after(100, lambda: auto_receive(uart, buttons, output_text, root))
-
-def start_gui():
-    uart = UARTCommunication()
+        log.write(f"Error: {str(e)}")
+    log.flush()
+    metrics = uart.metrics
+    if metrics.enabled:
+        metrics.histogram("gui_frame_seconds", "Time spent in one receive frame").observe(time.perf_counter() - start)
+        metrics.gauge("gui_queue_depth", "Messages left queued after a frame").set(uart.messages.qsize())
+    if metrics_view:
+        metrics_view.refresh()
+    if uart.link_degraded():
+        threading.Thread(target=lambda: uart.messages.put(uart.fall_back_baud()), daemon=True).start()
+    if uart.is_active():
+        root.after(FRAME_MS, lambda: auto_receive(uart, renderer, log, root, render_label, host_ai, metrics_view, games))
+
+def poll_ports(picker, root):
+    picker.poll()
+    root.after(PORT_POLL_MS, lambda: poll_ports(picker, root))
+
+def start_gui(history_path=None, record_path=None, replay_path=None, realtime=False, metrics_path=None,
+              metrics_enabled=True, serial_number=None, queue_size=WRITE_QUEUE_SIZE, queue_policy=DROP, port=None,
+              games_path=None):
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext
+    from port_registry import PortRegistry, PortPicker
+
+    registry = MetricsRegistry() if metrics_enabled else NULL_REGISTRY
+    uart = UARTCommunication(registry)
+    games = None
+    if games_path:
+        from game_history import GameHistory, GameRecorder
+        games = GameRecorder(GameHistory(games_path))
+    ports = PortRegistry().start()
+    uart.ports = ports
 
     root = tk.Tk()
     root.title("TicTacToe Game Interface")
@@ -105,23 +199,41 @@ def start_gui():
 
     port_label = tk.Label(port_frame, text="Port:", font=font_style, fg="#ffffff", bg="#1b263b")
     port_label.pack(side="left", padx=5)
-    port_var = tk.StringVar()
-    port_combobox = ttk.Combobox(port_frame, textvariable=port_var, values=uart.list_ports(), state="readonly")
+    port_var = tk.StringVar(value=port or "")
+    # Editable, so a URL such as socket://127.0.0.1:7878 (see serial_mux.py) can be typed in.
+    port_combobox = ttk.Combobox(port_frame, textvariable=port_var, values=[], width=40)
     port_combobox.pack(side="left", padx=5, pady=5)
+    port_picker = PortPicker(port_combobox, port_var, ports, pinned=serial_number)
 
     open_button = tk.Button(port_frame, text="Open Port", command=lambda: open_port_callback(), font=font_style, bg="#3b5998", fg="#ffffff")
     open_button.pack(side="left", padx=5)
 
+    binary_var = tk.BooleanVar(value=False)
+    binary_check = tk.Checkbutton(port_frame, text="Binary protocol", variable=binary_var, font=font_style,
+                                  fg="#ffffff", bg="#1b263b", selectcolor="#3b5998", activebackground="#1b263b")
+    binary_check.pack(side="left", padx=5)
+
+    baud_var = tk.BooleanVar(value=False)
+    baud_check = tk.Checkbutton(port_frame, text="Fastest baud rate", variable=baud_var, font=font_style,
+                                fg="#ffffff", bg="#1b263b", selectcolor="#3b5998", activebackground="#1b263b")
+    baud_check.pack(side="left", padx=5)
+
     buttons_frame = tk.Frame(root, bg="#2e3b4e")
     buttons_frame.pack(pady=10)
 
-    buttons = [[None for _ in range(3)] for _ in range(3)]
-    for i in range(3):
-        for j in range(3):
-            button = tk.Button(buttons_frame, text=" ", width=10, height=3, font=font_large, bg="#6c757d", fg="#ffffff",
-                               command=lambda row=i, col=j: send_move(uart, row, col))
-            button.grid(row=i, column=j, padx=5, pady=5)
-            buttons[i][j] = button
+    def make_button(i, j, size=engine.BOARD_SIZE):
+        # Cells shrink as the board grows, so a 15x15 board still fits the window.
+        scale = engine.BOARD_SIZE / max(size, engine.BOARD_SIZE)
+        button = tk.Button(buttons_frame, text=" ", width=max(2, round(10 * scale)), height=max(1, round(3 * scale)),
+                           font=font_large if size <= engine.BOARD_SIZE else font_style, bg="#6c757d", fg="#ffffff",
+                           command=lambda row=i, col=j: send_move(uart, row, col))
+        padding = 5 if size <= engine.BOARD_SIZE else 1
+        button.grid(row=i, column=j, padx=padding, pady=padding)
+        return button
+
+    buttons = [[make_button(i, j) for j in range(engine.BOARD_SIZE)] for i in range(engine.BOARD_SIZE)]
+    renderer = BoardRenderer(buttons, make_button)
+    host_ai = HostAI(uart)
 
     mode_frame = tk.Frame(root, bg="#1b263b", relief="raised", bd=2)
     mode_frame.pack(pady=10, padx=10, fill="x")
@@ -129,10 +241,10 @@ def start_gui():
     mode_label = tk.Label(mode_frame, text="Mode:", font=font_style, fg="#ffffff", bg="#1b263b")
     mode_label.pack(side="left", padx=5)
     mode_var = tk.StringVar(value="User vs User")
-    mode_combobox = ttk.Combobox(mode_frame, textvariable=mode_var, values=["User vs User", "User vs AI", "AI vs AI"], state="readonly")
+    mode_combobox = ttk.Combobox(mode_frame, textvariable=mode_var, values=GAME_MODES, state="readonly")
     mode_combobox.pack(side="left", padx=5, pady=5)
 
-    mode_button = tk.Button(mode_frame, text="Set Mode", command=lambda: set_mode(uart, mode_combobox.current()), font=font_style, bg="#3b5998", fg="#ffffff")
+    mode_button = tk.Button(mode_frame, text="Set Mode", command=lambda: set_mode_callback(), font=font_style, bg="#3b5998", fg="#ffffff")
     mode_button.pack(side="left", padx=5)
 
     reset_button = tk.Button(mode_frame, text="Reset", command=lambda: reset_game(uart), font=font_style, bg="#dc3545", fg="#ffffff")
@@ -143,19 +255,94 @@ def start_gui():
 
     output_text = scrolledtext.ScrolledText(output_frame, width=50, height=10, wrap=tk.WORD, font=("Courier New", 10), bg="#1b263b", fg="#ffffff")
     output_text.pack(padx=5, pady=5)
+    log = MessageLog(output_text, history_path=history_path)
 
     status_label = tk.Label(root, text="Status: Not connected", font=font_style, fg="#ffffff", bg="#2e3b4e")
     status_label.pack(pady=10)
 
+    render_label = tk.Label(root, text="Cells redrawn: 0  skipped: 0", font=("Arial", 8), fg="#adb5bd", bg="#2e3b4e")
+    render_label.pack(pady=(0, 10))
+
+    metrics_view = None
+    if registry.enabled:
+        metrics_label = tk.Label(root, text="Metrics: waiting for data", font=("Arial", 8), fg="#adb5bd", bg="#2e3b4e")
+        metrics_label.pack(pady=(0, 10))
+        metrics_view = MetricsView(metrics_label, registry, metrics_path)
+
+    def set_mode_callback():
+        mode = mode_combobox.current()
+        host_ai.enabled = mode == HOST_AI_MODE
+        set_mode(uart, 0 if host_ai.enabled else mode)
+        if games:
+            games.set_mode(mode, 0 if host_ai.enabled else mode)
+
     def open_port_callback():
-        status = uart.open_port(port_var.get())
+        status = uart.open_port(port_picker.target())
         status_label.config(text=status)
         if "Connected" in status:
-            auto_receive(uart, buttons, output_text, root)
+            if record_path:
+                log.write(uart.start_recording(record_path))
+            uart.start_reader()
+            uart.start_writer(queue_size, queue_policy)
+            negotiate_binary, negotiate_baud = binary_var.get(), baud_var.get()
+
+            def negotiate():
+                if negotiate_binary:
+                    uart.messages.put(uart.negotiate_protocol())
+                if negotiate_baud:
+                    uart.messages.put(uart.negotiate_baud())
+
+            if negotiate_binary or negotiate_baud:
+                threading.Thread(target=negotiate, daemon=True).start()
+            auto_receive(uart, renderer, log, root, render_label, host_ai, metrics_view, games)
+        else:
+            log.write(f"Failed to connect: {status}")
+            log.flush()
+
+    if replay_path:
+        status = uart.open_replay(replay_path, realtime)
+        status_label.config(text=status)
+        if uart.ser:
+            uart.start_reader()
+            auto_receive(uart, renderer, log, root, render_label, host_ai, metrics_view, games)
         else:
-            output_text.insert(tk.END, f"Failed to connect: {status}\n")
+            log.write(status)
+            log.flush()
 
+    poll_ports(port_picker, root)
     root.mainloop()
+    ports.stop()
+    uart.stop_writer()
+    uart.stop_reader()
+    uart.stop_recording()
+    if metrics_view:
+        metrics_view.refresh(force=True)
+    if games:
+        games.finish()
+        games.history.close()
+    log.close()
 
 if __name__ == "__main__":
-    start_gui()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TicTacToe game interface.")
+    parser.add_argument("--history", help="Also keep the full message history in this rotating log file")
+    parser.add_argument("--record", help="Record the raw bytes of the session to this file")
+    parser.add_argument("--replay", help="Play a recorded session back instead of opening a port")
+    parser.add_argument("--realtime", action="store_true", help="Replay with the original timing instead of at full speed")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Export metrics to this file every second (.json, .txt, otherwise Prometheus text)")
+    parser.add_argument("--no-metrics", action="store_true", help="Turn off metrics collection")
+    parser.add_argument("--serial-number", help="Select the board with this USB serial number whenever it is plugged in")
+    parser.add_argument("--queue-size", type=int, default=WRITE_QUEUE_SIZE, help="Commands the write queue holds")
+    parser.add_argument("--queue-policy", choices=POLICIES, default=DROP,
+                        help="What to do with a command when the write queue is full")
+    parser.add_argument("--port", help="Port or URL to preselect, e.g. socket://127.0.0.1:7878 for serial_mux.py")
+    parser.add_argument("--games", metavar="FILE", help="Store every game played in this history file (see game_history.py)")
+    args = parser.parse_args()
+    if args.games:
+        import game_history
+        if game_history.np is None:
+            parser.error("--games needs NumPy to index the history (pip install numpy)")
+    start_gui(args.history, args.record, args.replay, args.realtime, args.metrics, not args.no_metrics,
+              args.serial_number, args.queue_size, args.queue_policy, args.port, args.games)
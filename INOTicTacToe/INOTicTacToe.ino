@@ -1,11 +1,38 @@
 #include <Arduino.h>
 #include <ArduinoJson.h>
+#include "tablebase.h"
 
 const int BOARD_SIZE = 3;
+// Cells in a row that win: the full side on small boards, five on larger ones.
+const int WIN_LENGTH = BOARD_SIZE < 5 ? BOARD_SIZE : 5;
 char board[BOARD_SIZE][BOARD_SIZE];
 char currentPlayer = 'X';
 bool gameOver = false;
 int gameMode = 0;
+bool binaryProtocol = false;
+
+// Binary frames: COBS([type][length][payload][crc8]) followed by a 0x00 delimiter.
+const uint8_t FRAME_MAX_PAYLOAD = 48;
+const uint8_t MSG_INFO = 1;
+const uint8_t MSG_BOARD = 2;
+const uint8_t MSG_WIN_STATUS = 3;
+const uint8_t MSG_GAME_STATUS = 4;
+const uint8_t MSG_GAME_MODE = 5;
+const uint8_t MSG_ERROR = 6;
+const uint8_t MSG_PROTO = 7;
+const uint8_t MSG_ECHO = 8;
+const uint8_t MSG_BAUD = 9;
+
+// Baud changes stay on probation until the host confirms them from the new rate.
+const long DEFAULT_BAUD_RATE = 9600;
+const long BAUD_RATES[] = {9600, 19200, 38400, 57600, 115200};
+const unsigned long BAUD_CONFIRM_MS = 2000;
+const int BAUD_ERROR_LIMIT = 3;
+long baudRate = DEFAULT_BAUD_RATE;
+long confirmedBaudRate = DEFAULT_BAUD_RATE;
+bool baudPending = false;
+unsigned long baudDeadline = 0;
+int parseErrors = 0;
 
 
 void initializeBoard() {
@@ -18,7 +45,65 @@ void initializeBoard() {
     gameOver = false;
 }
 
+uint8_t crc8(const uint8_t* data, size_t length) {
+    uint8_t crc = 0;
+    for (size_t i = 0; i < length; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+size_t cobsEncode(const uint8_t* input, size_t length, uint8_t* output) {
+    size_t writeIndex = 1;
+    size_t codeIndex = 0;
+    uint8_t code = 1;
+    for (size_t readIndex = 0; readIndex < length; readIndex++) {
+        if (input[readIndex] != 0) {
+            output[writeIndex++] = input[readIndex];
+            code++;
+        }
+        if (input[readIndex] == 0 || code == 0xFF) {
+            output[codeIndex] = code;
+            codeIndex = writeIndex++;
+            code = 1;
+        }
+    }
+    output[codeIndex] = code;
+    return writeIndex;
+}
+
+void sendFrame(uint8_t type, const uint8_t* payload, uint8_t length) {
+    if (length > FRAME_MAX_PAYLOAD) length = FRAME_MAX_PAYLOAD;
+    uint8_t raw[FRAME_MAX_PAYLOAD + 3];
+    uint8_t encoded[FRAME_MAX_PAYLOAD + 5];
+    raw[0] = type;
+    raw[1] = length;
+    memcpy(raw + 2, payload, length);
+    raw[length + 2] = crc8(raw, length + 2);
+    size_t encodedLength = cobsEncode(raw, length + 3, encoded);
+    Serial.write(encoded, encodedLength);
+    Serial.write((uint8_t)0);
+}
+
+uint8_t messageTypeCode(const char* type) {
+    if (strcmp(type, "info") == 0) return MSG_INFO;
+    if (strcmp(type, "win_status") == 0) return MSG_WIN_STATUS;
+    if (strcmp(type, "game_status") == 0) return MSG_GAME_STATUS;
+    if (strcmp(type, "game_mode") == 0) return MSG_GAME_MODE;
+    if (strcmp(type, "error") == 0) return MSG_ERROR;
+    if (strcmp(type, "echo") == 0) return MSG_ECHO;
+    if (strcmp(type, "baud") == 0) return MSG_BAUD;
+    return MSG_PROTO;
+}
+
 void sendJsonMessage(const char* type, const char* message) {
+    if (binaryProtocol) {
+        sendFrame(messageTypeCode(type), (const uint8_t*)message, strlen(message));
+        return;
+    }
     StaticJsonDocument<200> doc;
     doc["type"] = type;
     doc["message"] = message;
@@ -27,6 +112,18 @@ void sendJsonMessage(const char* type, const char* message) {
 }
 
 void sendBoardState() {
+    if (binaryProtocol) {
+        // Base-3 code of the nine cells (' ' = 0, X = 1, O = 2), little endian.
+        uint16_t code = 0;
+        for (int i = BOARD_SIZE - 1; i >= 0; i--) {
+            for (int j = BOARD_SIZE - 1; j >= 0; j--) {
+                code = code * 3 + (board[i][j] == 'X' ? 1 : board[i][j] == 'O' ? 2 : 0);
+            }
+        }
+        uint8_t payload[2] = {(uint8_t)(code & 0xFF), (uint8_t)(code >> 8)};
+        sendFrame(MSG_BOARD, payload, sizeof(payload));
+        return;
+    }
     StaticJsonDocument<300> doc;
     doc["type"] = "board";
     JsonArray boardArray = doc.createNestedArray("board");
@@ -40,13 +137,25 @@ void sendBoardState() {
     Serial.println();
 }
 
+bool lineFrom(int row, int col, int dRow, int dCol) {
+    for (int n = 0; n < WIN_LENGTH; n++) {
+        if (board[row + n * dRow][col + n * dCol] != currentPlayer) return false;
+    }
+    return true;
+}
+
 bool checkWin() {
+    // Every WIN_LENGTH run starting at each cell: right, down and along both diagonals.
     for (int i = 0; i < BOARD_SIZE; i++) {
-        if (board[i][0] == currentPlayer && board[i][1] == currentPlayer && board[i][2] == currentPlayer) return true;
-        if (board[0][i] == currentPlayer && board[1][i] == currentPlayer && board[2][i] == currentPlayer) return true;
+        for (int j = 0; j < BOARD_SIZE; j++) {
+            bool right = j + WIN_LENGTH <= BOARD_SIZE;
+            bool down = i + WIN_LENGTH <= BOARD_SIZE;
+            if (right && lineFrom(i, j, 0, 1)) return true;
+            if (down && lineFrom(i, j, 1, 0)) return true;
+            if (right && down && lineFrom(i, j, 1, 1)) return true;
+            if (down && j + 1 >= WIN_LENGTH && lineFrom(i, j, 1, -1)) return true;
+        }
     }
-    if (board[0][0] == currentPlayer && board[1][1] == currentPlayer && board[2][2] == currentPlayer) return true;
-    if (board[0][2] == currentPlayer && board[1][1] == currentPlayer && board[2][0] == currentPlayer) return true;
     return false;
 }
 
@@ -70,6 +179,23 @@ void aiMoveRandom() {
     }
 }
 
+void aiMoveTablebase() {
+    // Constant-time perfect play from the table generated by tablebase_gen.py.
+    if (BOARD_SIZE != 3) {
+        // tablebase.h covers the 3x3 board only; larger builds play random moves instead.
+        aiMoveRandom();
+        return;
+    }
+    uint8_t cells[BOARD_SIZE * BOARD_SIZE];
+    for (int i = 0; i < BOARD_SIZE; i++) {
+        for (int j = 0; j < BOARD_SIZE; j++) {
+            cells[i * BOARD_SIZE + j] = board[i][j] == 'X' ? 1 : board[i][j] == 'O' ? 2 : 0;
+        }
+    }
+    uint8_t move = tablebaseMove(cells);
+    board[move / BOARD_SIZE][move % BOARD_SIZE] = currentPlayer;
+}
+
 void handleAiVsAi() {
     while (!gameOver) {
         if (checkDraw()) {
@@ -112,19 +238,57 @@ bool makeMove(int row, int col) {
     return false;
 }
 
+bool isSupportedBaudRate(long rate) {
+    for (size_t i = 0; i < sizeof(BAUD_RATES) / sizeof(BAUD_RATES[0]); i++) {
+        if (BAUD_RATES[i] == rate) return true;
+    }
+    return false;
+}
+
+void setBaudRate(long rate) {
+    Serial.flush();  // Let queued output leave at the old rate first
+    Serial.end();
+    Serial.begin(rate);
+    baudRate = rate;
+}
+
+void revertBaudRate(long rate) {
+    baudPending = false;
+    confirmedBaudRate = rate;
+    setBaudRate(rate);
+    String message = "Reverted to " + String(rate);
+    sendJsonMessage("baud", message.c_str());
+}
+
+void countParseError() {
+    // Lines garbled by a rate the host cannot keep up with lead back to a safe rate.
+    if (++parseErrors < BAUD_ERROR_LIMIT) return;
+    parseErrors = 0;
+    if (baudPending) {
+        revertBaudRate(confirmedBaudRate);
+    } else if (baudRate != DEFAULT_BAUD_RATE) {
+        revertBaudRate(DEFAULT_BAUD_RATE);
+    }
+}
+
 void setup() {
-    Serial.begin(9600);
+    Serial.begin(DEFAULT_BAUD_RATE);
     initializeBoard();
     sendJsonMessage("info", "TicTacToe Game Started");
 }
 
 void loop() {
+    if (baudPending && (long)(millis() - baudDeadline) >= 0) {
+        revertBaudRate(confirmedBaudRate);
+    }
+
     if (Serial.available() > 0) {
         StaticJsonDocument<200> doc;
         String input = Serial.readStringUntil('\n');
         DeserializationError error = deserializeJson(doc, input);
 
         if (!error) {
+            parseErrors = 0;
             const char* command = doc["command"];
             if (strcmp(command, "MOVE") == 0) {
                 int row = doc["row"];
@@ -145,11 +309,44 @@ void loop() {
                 initializeBoard();
                 sendJsonMessage("game_status", "Game reset.");
                 sendBoardState();
+            } else if (strcmp(command, "PROTO") == 0) {
+                // The reply goes out in the old format, everything after it in the new one.
+                const char* format = doc["format"];
+                // The packed board frame holds nine cells, so larger boards stay on JSON.
+                bool binary = format && strcmp(format, "binary") == 0 && BOARD_SIZE == 3;
+                sendJsonMessage("proto", binary ? "binary" : "json");
+                binaryProtocol = binary;
+            } else if (strcmp(command, "ECHO") == 0) {
+                // Lets the host measure round trips for payloads of any size.
+                const char* data = doc["data"];
+                sendJsonMessage("echo", data ? data : "");
+            } else if (strcmp(command, "BAUD") == 0) {
+                long rate = doc["rate"];
+                bool confirm = doc["confirm"];
+                if (confirm) {
+                    if (baudPending && rate == baudRate) {
+                        baudPending = false;
+                        confirmedBaudRate = rate;
+                        String message = "Confirmed " + String(rate);
+                        sendJsonMessage("baud", message.c_str());
+                    } else {
+                        sendJsonMessage("error", "No baud change pending.");
+                    }
+                } else if (isSupportedBaudRate(rate)) {
+                    // The reply goes out at the old rate; unconfirmed rates revert after BAUD_CONFIRM_MS.
+                    String message = "Switching to " + String(rate);
+                    sendJsonMessage("baud", message.c_str());
+                    setBaudRate(rate);
+                    baudPending = true;
+                    baudDeadline = millis() + BAUD_CONFIRM_MS;
+                } else {
+                    sendJsonMessage("error", "Unsupported baud rate.");
+                }
             }
 
             // AI move logic if applicable
             if (gameMode == 1 && !gameOver && currentPlayer == 'O') {
-                aiMoveRandom();  // Make a random move for the AI
+                aiMoveTablebase();  // Perfect move for the AI
                 if (checkWin()) {
                     String message = "Player " + String(currentPlayer) + " wins!";
                     sendJsonMessage("win_status", message.c_str());
@@ -163,6 +360,8 @@ void loop() {
             } else if (gameMode == 2 && !gameOver) {
                 handleAiVsAi();  // Handle AI vs AI
             }
+        } else {
+            countParseError();
         }
     }
 }
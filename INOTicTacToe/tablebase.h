@@ -0,0 +1,90 @@
+// Generated by tablebase_gen.py; do not edit by hand.
+// 627 canonical positions in 680 slots, 582 bytes of flash.
+#ifndef TABLEBASE_H
+#define TABLEBASE_H
+
+#include <Arduino.h>
+#include <avr/pgmspace.h>
+
+const uint16_t TABLEBASE_SLOTS = 680;
+const uint16_t TABLEBASE_BUCKETS = 170;
+const uint16_t TABLEBASE_HASH_MULTIPLIER = 0x9E37;
+const uint16_t TABLEBASE_DISPLACEMENT_STEP = 0x2F1B;
+
+const uint8_t TABLEBASE_SYMMETRIES[8][9] PROGMEM = {
+    {0, 1, 2, 3, 4, 5, 6, 7, 8},
+    {2, 1, 0, 5, 4, 3, 8, 7, 6},
+    {6, 3, 0, 7, 4, 1, 8, 5, 2},
+    {0, 3, 6, 1, 4, 7, 2, 5, 8},
+    {8, 7, 6, 5, 4, 3, 2, 1, 0},
+    {6, 7, 8, 3, 4, 5, 0, 1, 2},
+    {2, 5, 8, 1, 4, 7, 0, 3, 6},
+    {8, 5, 2, 7, 4, 1, 6, 3, 0},
+};
+
+const uint8_t TABLEBASE_DISPLACEMENTS[170] PROGMEM = {
+    0x01, 0x00, 0x07, 0x00, 0x38, 0x00, 0x00, 0x00, 0x00, 0x0F, 0x0C, 0x08, 0x09, 0x15, 0x43, 0x0D,
+    0x00, 0x04, 0x09, 0x03, 0x0A, 0x00, 0x36, 0x01, 0x02, 0x00, 0x00, 0x02, 0x0B, 0x15, 0x03, 0x06,
+    0x00, 0x02, 0x00, 0x04, 0x07, 0x0B, 0x02, 0x06, 0x00, 0x02, 0x89, 0x01, 0x04, 0x0D, 0x2A, 0x0D,
+    0x0A, 0x04, 0x2E, 0x01, 0x0A, 0x00, 0x2D, 0x1E, 0x2D, 0x02, 0x18, 0x06, 0x1D, 0x09, 0x16, 0x0E,
+    0x29, 0x15, 0x4D, 0x04, 0x00, 0x09, 0x32, 0x08, 0x26, 0x59, 0x00, 0x01, 0x04, 0x30, 0x10, 0x18,
+    0x07, 0x0A, 0x5A, 0x02, 0x05, 0x07, 0x00, 0x27, 0x08, 0x05, 0x00, 0x15, 0x03, 0x05, 0x4F, 0x45,
+    0x03, 0x06, 0x03, 0x06, 0x17, 0x26, 0x04, 0x01, 0x3B, 0x17, 0x0B, 0x31, 0x26, 0x17, 0x0A, 0x00,
+    0x0E, 0x0F, 0x05, 0x0E, 0x16, 0x02, 0x19, 0x0B, 0x16, 0xCB, 0x3A, 0x44, 0x01, 0x04, 0x0E, 0x00,
+    0x01, 0x05, 0x06, 0x2B, 0x1B, 0x0F, 0x30, 0x06, 0x02, 0x2D, 0x03, 0x16, 0x00, 0x08, 0x04, 0x02,
+    0x3C, 0x08, 0x88, 0xB2, 0x57, 0x13, 0x52, 0x08, 0xF0, 0x6F, 0x6B, 0x4F, 0xCD, 0x42, 0x00, 0x70,
+    0x00, 0x0E, 0x0B, 0x9B, 0x20, 0x00, 0x03, 0x03, 0x09, 0x31,
+};
+
+// Two best moves per byte, low nibble first, in canonical orientation.
+const uint8_t TABLEBASE_MOVES[340] PROGMEM = {
+    0x08, 0x87, 0x8F, 0x84, 0x41, 0x44, 0x84, 0x3F, 0x6F, 0x54, 0x74, 0x84, 0xF3, 0x87, 0x86, 0x88,
+    0x08, 0x84, 0x44, 0x01, 0xF4, 0x47, 0x38, 0x84, 0x44, 0x22, 0x48, 0x36, 0x31, 0x7F, 0x88, 0x44,
+    0x82, 0x84, 0x82, 0xF4, 0x46, 0x21, 0x48, 0x82, 0x82, 0x08, 0x84, 0xF6, 0x81, 0x88, 0x21, 0x83,
+    0x08, 0x80, 0x28, 0x18, 0x46, 0x47, 0x38, 0x24, 0x47, 0x8F, 0x61, 0x80, 0x74, 0x87, 0x07, 0x26,
+    0x82, 0x44, 0x46, 0x60, 0x76, 0x44, 0x4F, 0x33, 0x88, 0x44, 0x48, 0x48, 0x42, 0x00, 0x7F, 0x64,
+    0x86, 0x82, 0x07, 0x27, 0xF8, 0x88, 0x80, 0x80, 0x41, 0x48, 0xF0, 0x07, 0x01, 0x62, 0x80, 0x83,
+    0x2F, 0x68, 0x58, 0x40, 0x48, 0x84, 0x88, 0x24, 0x08, 0x07, 0x78, 0x21, 0x44, 0x22, 0x82, 0x28,
+    0x44, 0x6F, 0x80, 0x14, 0x87, 0x42, 0x48, 0x64, 0x08, 0xF3, 0x88, 0x28, 0x7F, 0x88, 0x40, 0x02,
+    0x41, 0x44, 0x74, 0x87, 0x36, 0x04, 0xF8, 0xF4, 0x48, 0x74, 0x56, 0x06, 0x88, 0x48, 0x77, 0x57,
+    0x48, 0x5F, 0x78, 0x67, 0x46, 0xF3, 0x40, 0x48, 0x68, 0xF4, 0x82, 0x84, 0x45, 0xF1, 0x48, 0x16,
+    0x64, 0x6F, 0x24, 0x81, 0xF3, 0x88, 0x26, 0x02, 0x88, 0xF1, 0x76, 0x44, 0x88, 0x78, 0x8F, 0x48,
+    0x32, 0x44, 0x08, 0x74, 0x87, 0x34, 0x3F, 0x54, 0x48, 0x44, 0x18, 0x43, 0x00, 0x32, 0x84, 0xF0,
+    0xF5, 0x86, 0x78, 0x47, 0x77, 0x80, 0x88, 0x34, 0x44, 0x47, 0x44, 0x28, 0x61, 0x24, 0x84, 0x61,
+    0x37, 0x27, 0x88, 0xF1, 0x43, 0x74, 0x4F, 0x88, 0x4F, 0x44, 0x74, 0x5F, 0xF4, 0x44, 0x84, 0x87,
+    0x4F, 0x88, 0x78, 0x73, 0x84, 0x81, 0x18, 0x80, 0x26, 0x82, 0x24, 0x82, 0x4F, 0x88, 0x48, 0x00,
+    0x48, 0x03, 0x40, 0x42, 0x88, 0x28, 0x14, 0x48, 0x74, 0x77, 0x47, 0x08, 0x87, 0x48, 0x41, 0x86,
+    0x00, 0x84, 0xFF, 0x84, 0x8F, 0x48, 0x84, 0x24, 0x20, 0x88, 0x80, 0x26, 0x70, 0x84, 0x28, 0x42,
+    0x4F, 0xF3, 0x84, 0x78, 0xFF, 0x4F, 0x85, 0x40, 0x40, 0x4F, 0x43, 0x08, 0x71, 0x27, 0x24, 0x01,
+    0x25, 0x62, 0x82, 0x31, 0x86, 0x40, 0x80, 0x04, 0x80, 0x48, 0x34, 0x3F, 0x88, 0x44, 0x34, 0x01,
+    0x40, 0x10, 0x4F, 0x24, 0x87, 0x88, 0x77, 0x84, 0x54, 0x86, 0x88, 0x47, 0x86, 0x84, 0x00, 0x66,
+    0x86, 0x48, 0x44, 0x48, 0xF8, 0x33, 0x43, 0x74, 0x44, 0x4F, 0xFF, 0x81, 0x01, 0x88, 0x84, 0x14,
+    0x74, 0x10, 0x68, 0xF4,
+};
+
+// Returns the cell (row * 3 + col) of a best move for the side to move.
+// cells[i] is 0 for empty, 1 for X and 2 for O.
+static uint8_t tablebaseMove(const uint8_t cells[9]) {
+    uint16_t bestCode = 0xFFFF;
+    uint8_t bestSymmetry = 0;
+    for (uint8_t t = 0; t < 8; t++) {
+        uint16_t code = 0;
+        for (int8_t i = 8; i >= 0; i--) {
+            code = code * 3 + cells[pgm_read_byte(&TABLEBASE_SYMMETRIES[t][i])];
+        }
+        if (code < bestCode) {
+            bestCode = code;
+            bestSymmetry = t;
+        }
+    }
+    uint8_t displacement = pgm_read_byte(&TABLEBASE_DISPLACEMENTS[bestCode % TABLEBASE_BUCKETS]);
+    uint16_t mixed = (uint16_t)(bestCode + (uint16_t)displacement * TABLEBASE_DISPLACEMENT_STEP);
+    uint16_t value = (uint16_t)((uint32_t)mixed * TABLEBASE_HASH_MULTIPLIER);
+    value ^= value >> 7;
+    uint16_t slot = value % TABLEBASE_SLOTS;
+    uint8_t packed = pgm_read_byte(&TABLEBASE_MOVES[slot >> 1]);
+    uint8_t move = (slot & 1) ? (packed >> 4) : (packed & 0x0F);
+    return pgm_read_byte(&TABLEBASE_SYMMETRIES[bestSymmetry][move]);
+}
+
+#endif
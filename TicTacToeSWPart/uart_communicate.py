@@ -1,29 +1,40 @@
 # -*- coding: utf-8 -*-
 
 import serial
-import serial.tools.list_ports
-import tkinter as tk
-from tkinter import ttk, scrolledtext
-
-class UARTCommunication:
-    def __init__(self):
-        self.ser = None
-        self.baud_rate = 9600
+
+# The link, write queue, message pane and port registry are shared with the game GUI in the repository root,
+# so the terminal runs from there as a package: python -m TicTacToeSWPart.uart_communicate
+import uart_core
+from serial_writer import WRITE_QUEUE_SIZE, DROP, POLICIES
+from message_log import MessageLog
+
+LOG_CAPACITY = 1000
+PORT_POLL_MS = 500
+
+
+class LineFramer(uart_core.MessageFramer):
+    # The terminal shows what the board prints, so lines are kept as text rather than decoded.
+    def decode(self, line):
+        return line
+
+
+class UARTCommunication(uart_core.UARTCommunication):
+    # Typed text goes out as is; opening, pinned boards, the write queue and reconnects are the game link's.
+    def __init__(self, queue_size=WRITE_QUEUE_SIZE, queue_policy=DROP):
+        super().__init__()
+        self.queue_size = queue_size
+        self.queue_policy = queue_policy
         self.access_denied_shown = False
         self.stop_auto_receive = False
-
-    def list_ports(self):
-        return [port.device for port in serial.tools.list_ports.comports()]
+        self.framer = LineFramer()
 
     def open_port(self, port):
+        self.stop_writer()
         if self.ser and self.ser.is_open:
             self.ser.close()
 
         try:
-            self.ser = serial.Serial(port, self.baud_rate, timeout=1)
-            self.access_denied_shown = False
-            self.stop_auto_receive = False
-            return f"Connected to {port} at {self.baud_rate} baud"
+            self.ser = serial.serial_for_url(self.device_for(port), self.baud_rate, timeout=1)
         except serial.SerialException as e:
             self.ser = None
             if not self.access_denied_shown:
@@ -31,55 +42,86 @@ class UARTCommunication:
                 return f"Error: Could not open port {port} - {e}"
             return ""
         except PermissionError as e:
-            if self.ser and self.ser.is_open:
-                self.ser.close()
             self.ser = None
             if not self.access_denied_shown:
                 self.access_denied_shown = True
                 self.stop_auto_receive = True
                 return f"Error: Access denied to port {port} - {e}"
             return ""
+        self.port = port
+        self.start_writer(self.queue_size, self.queue_policy)
+        self.framer.reset()
+        self.access_denied_shown = False
+        self.stop_auto_receive = False
+        return f"Connected to {port} at {self.baud_rate} baud"
 
-    def set_baud_rate(self, baud_rate):
-        self.baud_rate = baud_rate
-        if self.ser and self.ser.is_open:
-            self.ser.close()
-            self.ser.baudrate = baud_rate
-            self.ser.open()
+    def reopen(self):
+        # Runs on the writer thread once the device has gone away.
+        ser = super().reopen()
+        self.framer.reset()
+        return ser
 
-    def send_message(self, message):
-        if self.ser and self.ser.is_open:
-            self.ser.write((message + "\n").encode())
-            return f"Sent: {message}"
-        return "Port not opened"
+    def set_baud_rate(self, baud_rate, drain=True):
+        # The rate can be picked before any port is open.
+        if self.ser:
+            super().set_baud_rate(baud_rate, drain)
+        else:
+            self.baud_rate = baud_rate
 
-    def receive_message(self):
+    def send_message(self, message):
+        error = self.write_command((message + "\n").encode(), {})
+        if error == "Write queue full":
+            return f"Error: Write queue full, dropped {message}"
+        if error == "Port not opened":
+            return error
+        if error:
+            return f"Error: {error}"
+        if self.writer and self.writer.reconnecting:
+            return f"Queued: {message} (reconnecting)"
+        return f"Sent: {message}"
+
+    def receive_messages(self):
+        # Writer notices come first, then every complete line the driver already holds.
+        notices = self.drain_messages()
+        if self.writer and self.writer.reconnecting:
+            return notices
         if self.ser and self.ser.is_open:
             try:
-                response = self.ser.readline().decode("utf-8", errors="replace").strip()
-                if response:
-                    return response
+                return notices + self.framer.read_from(self.ser)
             except Exception as e:
+                if self.writer:
+                    # The writer reopens the port; keep polling so its replies show up.
+                    self.writer.connection_lost(e)
+                    return notices + [f"Error: {e}"]
                 self.stop_auto_receive = True
-                return f"Error: {e}"
-        return "Port not opened"
+                return notices + [f"Error: {e}"]
+        return notices
+
 
-def auto_receive(uart, output_text, status_label, root):
+def auto_receive(uart, log, status_label, root):
     if uart.stop_auto_receive:
         return
 
-    response = uart.receive_message()
-    if response and response != "Port not opened":
-        output_text.insert(tk.END, f"{response}\n")
-        output_text.see(tk.END)
-    root.after(100, lambda: auto_receive(uart, output_text, status_label, root))
+    for response in uart.receive_messages():
+        log.write(response)
+    log.flush()
+    root.after(100, lambda: auto_receive(uart, log, status_label, root))
+
+
+def poll_ports(picker, root):
+    picker.poll()
+    root.after(PORT_POLL_MS, lambda: poll_ports(picker, root))
 
-import tkinter as tk
-from tkinter import ttk, scrolledtext
 
+def start_gui(history_path=None, serial_number=None, queue_size=WRITE_QUEUE_SIZE, queue_policy=DROP):
+    # Tk is only loaded once there is a window to build, so LineFramer and the link work without it.
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext
+    from port_registry import PortRegistry, PortPicker
 
-def start_gui():
-    uart = UARTCommunication()
+    uart = UARTCommunication(queue_size, queue_policy)
+    ports = PortRegistry().start()
+    uart.ports = ports
     root = tk.Tk()
     root.title("UART Communication Interface")
     root.geometry("800x600")
@@ -95,9 +137,10 @@ def start_gui():
 
     port_var = tk.StringVar()
     port_combobox = ttk.Combobox(
-        config_frame, textvariable=port_var, values=uart.list_ports(), state="readonly", width=30
+        config_frame, textvariable=port_var, values=[], state="readonly", width=30
     )
     port_combobox.grid(row=0, column=1, padx=10, pady=10, sticky="w")
+    port_picker = PortPicker(port_combobox, port_var, ports, pinned=serial_number)
 
     # Select Baud Rate
     baud_label = tk.Label(config_frame, text="Transmission Speed:", font=("Helvetica", 12), bg="#d3d3d3", fg="#000000")
@@ -167,6 +210,7 @@ def start_gui():
         output_frame, width=90, height=15, wrap=tk.WORD, font=("Helvetica", 11), bg="#ffffff", fg="#000000", insertbackground="#000000"
     )
     output_text.pack(padx=10, pady=10, fill="both", expand=True)
+    log = MessageLog(output_text, LOG_CAPACITY, history_path)
 
     # Status Label
     status_label = tk.Label(
@@ -179,14 +223,27 @@ def start_gui():
         status_label.config(text=status, fg="#006400" if "Sent" in status else "#8b0000")
 
     def open_port_callback():
-        status = uart.open_port(port_var.get())
+        status = uart.open_port(port_picker.target())
         if status:
             status_label.config(text=status, fg="#006400" if "Connected" in status else "#8b0000")
         if "Connected" in status:
-            auto_receive(uart, output_text, status_label, root)
+            auto_receive(uart, log, status_label, root)
 
+    poll_ports(port_picker, root)
     root.mainloop()
+    ports.stop()
+    uart.stop_writer()
+    log.close()
 
 
 if __name__ == "__main__":
-    start_gui()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="UART communication interface.")
+    parser.add_argument("--history", help="Also keep the full message history in this rotating log file")
+    parser.add_argument("--serial-number", help="Select the board with this USB serial number whenever it is plugged in")
+    parser.add_argument("--queue-size", type=int, default=WRITE_QUEUE_SIZE, help="Messages the write queue holds")
+    parser.add_argument("--queue-policy", choices=POLICIES, default=DROP,
+                        help="What to do with a message when the write queue is full")
+    args = parser.parse_args()
+    start_gui(args.history, args.serial_number, args.queue_size, args.queue_policy)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+
+import serial
+
+from uart_core import MessageFramer
+from messages import Message
+
+REQUEST_TIMEOUT = 3.0
+READ_SIZE = 4096
+_CLOSED = object()
+
+
+class AsyncUARTCommunication:
+    # Event-loop native client: the port's descriptor is non-blocking and watched with add_reader;
+    # writes go straight to it and whatever the driver does not take is flushed by add_writer,
+    # so any number of sessions share one loop and no call ever blocks it on the wire.
+    def __init__(self):
+        self.ser = None
+        self.loop = None
+        self.fd = None
+        self.framer = MessageFramer()
+        self.messages = asyncio.Queue()
+        self.request_lock = asyncio.Lock()
+        self.outgoing = bytearray()
+        self.waiter = None
+
+    async def open(self, port, baud_rate=9600):
+        self.loop = asyncio.get_running_loop()
+        try:
+            self.ser = serial.serial_for_url(port, baud_rate, timeout=0)
+            self.fd = self.ser.fileno()
+            os.set_blocking(self.fd, False)
+        except Exception as e:
+            if self.ser:
+                self.ser.close()
+            self.ser = None
+            return f"Error: {e}"
+        self.framer = MessageFramer()
+        self.outgoing = bytearray()
+        self.loop.add_reader(self.fd, self._on_readable)
+        return f"Connected to {port}"
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(max(self.ser.in_waiting, READ_SIZE))
+        except Exception as e:
+            self._deliver(f"Error: {e}")
+            self.close()
+            return
+        if data:
+            for message in self.framer.feed(data):
+                self._deliver(message)
+
+    def _deliver(self, message):
+        # Only the reply that completes a request is taken from the iterator; everything else,
+        # including what the request collects on the way, is still delivered to it.
+        if self.waiter is not None:
+            collected, expect, future = self.waiter
+            collected.append(message)
+            if isinstance(message, Message) and message.type in expect and not future.done():
+                self.waiter = None
+                future.set_result(collected)
+                return
+        self.messages.put_nowait(message)
+
+    async def send(self, message):
+        if self.ser and self.ser.is_open:
+            json_message = json.dumps(message)
+            try:
+                self._write((json_message + "\n").encode())
+                return f"Sent: {json_message}"
+            except OSError as e:
+                return f"Error: {e}"
+        return "Port not opened"
+
+    def _write(self, data):
+        # Anything already waiting for add_writer goes first, so ordering holds without a lock.
+        if self.outgoing:
+            self.outgoing += data
+            return
+        try:
+            sent = os.write(self.fd, data)
+        except BlockingIOError:
+            sent = 0
+        if sent < len(data):
+            self.outgoing += data[sent:]
+            self.loop.add_writer(self.fd, self._on_writable)
+
+    def _on_writable(self):
+        try:
+            sent = os.write(self.fd, self.outgoing)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._deliver(f"Error: {e}")
+            self.close()
+            return
+        del self.outgoing[:sent]
+        if not self.outgoing:
+            self.loop.remove_writer(self.fd)
+
+    async def request(self, message, expect=("board", "error"), timeout=REQUEST_TIMEOUT):
+        # Returns every message from the send up to the first one of an expected type.
+        if isinstance(expect, str):
+            expect = (expect,)
+        async with self.request_lock:
+            future = self.loop.create_future()
+            self.waiter = ([], tuple(expect), future)
+            try:
+                status = await self.send(message)
+                if not status.startswith("Sent"):
+                    raise ConnectionError(status)
+                return await asyncio.wait_for(future, timeout)
+            finally:
+                self.waiter = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.messages.get()
+        if message is _CLOSED:
+            self.messages.put_nowait(_CLOSED)
+            raise StopAsyncIteration
+        return message
+
+    def close(self):
+        if self.ser is None:
+            return
+        if self.fd is not None:
+            self.loop.remove_reader(self.fd)
+            if self.outgoing:
+                self.loop.remove_writer(self.fd)
+                self.outgoing = bytearray()
+            self.fd = None
+        self.ser.close()
+        self.ser = None
+        if self.waiter is not None:
+            future = self.waiter[2]
+            if not future.done():
+                future.set_exception(ConnectionError("Port closed"))
+        self.messages.put_nowait(_CLOSED)
+
+    async def __aenter__(self):
+        return self
+
+    async def aclose(self):
+        self.close()
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
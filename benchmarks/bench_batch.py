@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from firmware_emulator import TcpEmulator
+from uart_core import UARTCommunication, BATCH_WINDOW, BOARD_RX_BUFFER
+
+# RESET and the nine moves of hardware_test.test_draw.
+DRAW = [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (1, 2), (2, 1), (2, 0), (2, 2)]
+COMMANDS = [{"command": "MODE", "mode": 0}] + [{"command": "MOVE", "row": row, "col": col} for row, col in DRAW]
+READY_TIMEOUT = 3.0
+
+
+def connect(url, baud_rate):
+    uart = UARTCommunication()
+    status = uart.open_port(url, baud_rate)
+    if not status.startswith("Connected"):
+        raise ConnectionError(status)
+    uart.start_reader()
+    uart.start_writer()
+    # Opening the port resets a real board; it is ready once it has announced itself.
+    # COMMANDS starts with MODE, which send_batch needs as the greeting does not tell the mode.
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            message = uart.messages.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        if getattr(message, "type", None) == "info":
+            break
+    return uart
+
+
+def rate(uart, games, window, buffer_bytes):
+    start = time.perf_counter()
+    for _ in range(games):
+        results = uart.send_batch(COMMANDS, window, buffer_bytes)
+        failed = [result for result in results if not result.ok]
+        if failed:
+            raise RuntimeError(f"{failed[0]!r} failed with window {window}")
+    return games * len(COMMANDS) / (time.perf_counter() - start)
+
+
+def run(url, baud_rate, games, buffer_bytes):
+    uart = connect(url, baud_rate)
+    try:
+        sequential = rate(uart, games, 1, buffer_bytes)
+        pipelined = rate(uart, games, BATCH_WINDOW, buffer_bytes)
+    finally:
+        uart.stop_writer()
+        uart.stop_reader()
+        uart.ser.close()
+    print(f"{sequential:14.1f}{pipelined:14.1f}{pipelined / sequential:9.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Commands per second sent one at a time and pipelined with send_batch.")
+    parser.add_argument("--port", help="Serial port or URL of a real board (default: the emulator at each baud rate)")
+    parser.add_argument("--baud-rates", type=int, nargs="+",
+                        help="Link rates (default 9600 for a board; 9600, 115200 and 0, unpaced, emulated)")
+    parser.add_argument("--games", type=int, default=10, help="Drawn games, each a MODE and nine MOVE commands")
+    parser.add_argument("--buffer-bytes", type=int, default=BOARD_RX_BUFFER,
+                        help="Bytes allowed to wait in the board's receive buffer")
+    args = parser.parse_args()
+
+    print(f"{'link':<14}{'one by one':>14}{'pipelined':>14}  commands/s")
+    if args.port:
+        for baud_rate in args.baud_rates or [9600]:
+            print(f"{baud_rate:<14}", end="")
+            run(args.port, baud_rate, args.games, args.buffer_bytes)
+    else:
+        for baud_rate in args.baud_rates or [9600, 115200, 0]:
+            print(f"{baud_rate or 'unpaced':<14}", end="")
+            with TcpEmulator(baud_rate=baud_rate) as emulator:
+                run(emulator.url, baud_rate or 9600, args.games, args.buffer_bytes)
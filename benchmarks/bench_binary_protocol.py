@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from binary_protocol import FrameDecoder
+from firmware_emulator import TicTacToeFirmware, TcpEmulator
+from uart_core import UARTCommunication
+from messages import WinStatusMessage
+
+
+def game_stream(binary, games, seed):
+    firmware = TicTacToeFirmware(seed)
+    if binary:
+        firmware.handle_line('{"command": "PROTO", "format": "binary"}')
+    chunks = []
+    for _ in range(games):
+        chunks.extend(firmware.handle_line('{"command": "MODE", "mode": 2}'))
+    return [chunk if isinstance(chunk, bytes) else chunk.encode() + b"\r\n" for chunk in chunks]
+
+
+def decode_json(chunks):
+    for chunk in chunks:
+        json.loads(chunk)
+
+
+def decode_binary(chunks):
+    decoder = FrameDecoder()
+    for chunk in chunks:
+        decoder.feed(chunk)
+
+
+def measure_link(binary, baud_rate, games):
+    with TcpEmulator(baud_rate=baud_rate, boot_delay=0) as emulator:
+        uart = UARTCommunication()
+        uart.open_port(emulator.url)
+        uart.start_reader()
+        try:
+            uart.messages.get(timeout=5)
+            if binary:
+                uart.negotiate_protocol("binary")
+            start = time.perf_counter()
+            for _ in range(games):
+                uart.send_message({"command": "MODE", "mode": 2})
+                while True:
+                    message = uart.messages.get(timeout=30)
+                    if isinstance(message, WinStatusMessage):
+                        break
+            return (time.perf_counter() - start) / games
+        finally:
+            uart.stop_reader()
+            uart.ser.close()
+
+
+def run(games, link_games, seed):
+    print(f"{'format':<8}{'bytes/board':>12}{'bytes/game':>12}{'ms/board @9600':>16}{'decode us/msg':>15}{'ms/game @9600':>15}")
+    for name, binary, decode in (("json", False, decode_json), ("binary", True, decode_binary)):
+        chunks = game_stream(binary, games, seed)
+        boards = game_stream(binary, 1, seed)[3]
+        total = sum(len(chunk) for chunk in chunks)
+        start = time.perf_counter()
+        decode(chunks)
+        decode_us = (time.perf_counter() - start) / len(chunks) * 1e6
+        game_ms = measure_link(binary, 9600, link_games) * 1000
+        print(f"{name:<8}{len(boards):>12}{total / games:>12.1f}{len(boards) * 10 / 9600 * 1000:>16.2f}"
+              f"{decode_us:>15.2f}{game_ms:>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare JSON lines with binary frames on the serial link.")
+    parser.add_argument("--games", type=int, default=2000, help="AI vs AI games used for byte counts and decode cost")
+    parser.add_argument("--link-games", type=int, default=5, help="Games played over the paced emulator link")
+    parser.add_argument("--seed", type=int, default=15)
+    args = parser.parse_args()
+    run(args.games, args.link_games, args.seed)
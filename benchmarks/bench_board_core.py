@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from board_core import get_geometry, X, O
+
+CASES = ((3, 3), (7, 4), (15, 5))
+
+
+def random_boards(size, count, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.choice(np.array([0, 1, 2], dtype=np.int8), size=(count, size * size), p=(0.5, 0.25, 0.25))
+
+
+def per_board(geometry, boards):
+    # The bitmask scan engine.py uses for 3x3, one board at a time.
+    weights = [1 << cell for cell in range(geometry.cells)]
+    results = []
+    for cells in boards.tolist():
+        x_mask = sum(weight for weight, code in zip(weights, cells) if code == X)
+        o_mask = sum(weight for weight, code in zip(weights, cells) if code == O)
+        results.append((geometry.mask_wins(x_mask), geometry.mask_wins(o_mask)))
+    return results
+
+
+def best_rate(function, count, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batched and per-board win checks in board_core.py.")
+    parser.add_argument("--boards", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'board':<10}{'lines':>7}{'per board':>14}{'batched':>14}  positions/s")
+    for size, length in CASES:
+        geometry = get_geometry(size, length)
+        boards = random_boards(size, args.boards)
+        scalar = best_rate(lambda: per_board(geometry, boards), args.boards, args.repeat)
+        batched = best_rate(lambda: geometry.status(boards), args.boards, args.repeat)
+        print(f"{f'{size}x{size} k={length}':<10}{len(geometry.lines):>7}{scalar:>14,.0f}{batched:>14,.0f}")
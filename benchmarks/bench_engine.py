@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import engine
+
+
+def run(rounds):
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, "engine_table.bin")
+        start = time.perf_counter()
+        solver = engine.Engine(cache_path)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        engine.Engine(cache_path)
+        load = time.perf_counter() - start
+        size = os.path.getsize(cache_path)
+
+    keys = list(solver.table)
+    boards = [engine.masks_to_board(*engine.split_key(key)) for key in keys]
+    masks = [engine.split_key(key) for key in keys]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for x_mask, o_mask in masks:
+            solver.lookup(x_mask, o_mask)
+    mask_rate = rounds * len(masks) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for board in boards:
+            solver.best_move(board)
+    board_rate = rounds * len(boards) / (time.perf_counter() - start)
+
+    print(f"positions:             {len(keys)}")
+    print(f"table build:           {build * 1000:.1f} ms")
+    print(f"cache load:            {load * 1000:.1f} ms ({size} bytes)")
+    print(f"lookups (bitboards):   {mask_rate:,.0f}/s")
+    print(f"best_move (board):     {board_rate:,.0f}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the host-side perfect-play engine.")
+    parser.add_argument("--rounds", type=int, default=50, help="Passes over every reachable position")
+    args = parser.parse_args()
+    run(args.rounds)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from board_core import X_WINS
+from game_history import GameHistory, Game, HEADER, opening_cells
+
+
+def random_games(count, seed=1):
+    rng = random.Random(seed)
+    cells = list(range(9))
+    return [Game(number, rng.randrange(60000), rng.randrange(4), rng.randrange(4), rng.sample(cells, rng.randint(1, 9)))
+            for number in range(count)]
+
+
+def best_time(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scan(history, corners):
+    # What a query costs without the indexes: every record read back and filtered.
+    records = np.fromfile(history.path, dtype=history.dtype, offset=HEADER.size)
+    matching = (records["mode"] == 1) & np.isin(records["moves"][:, 0], corners) & (records["result"] != 0)
+    return np.count_nonzero(matching & (records["result"] == X_WINS)) / np.count_nonzero(matching)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time game_history.py queries against a full scan.")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "games.bin")
+        games = random_games(args.games)
+        history = GameHistory(path)
+        elapsed, _ = best_time(lambda: history.extend(games), 1)
+        print(f"bulk import: {args.games / elapsed:,.0f} games/s, {os.path.getsize(path) / args.games:.0f} bytes/game")
+        history.close()
+        elapsed, history = best_time(lambda: GameHistory(path), 1)
+        print(f"reopen with saved indexes: {elapsed * 1e3:.1f} ms")
+        os.remove(history.index_path)
+        history.close(save=False)
+        elapsed, history = best_time(lambda: GameHistory(path), 1)
+        print(f"reopen rebuilding indexes: {elapsed * 1e3:.1f} ms")
+
+        corners = opening_cells("corner")
+        indexed, rates = best_time(lambda: history.win_rates(mode=1, opening=corners), args.repeat)
+        scanned, rate = best_time(lambda: scan(history, corners), args.repeat)
+        assert abs(rates["X"] - rate) < 1e-12
+        selected, numbers = best_time(lambda: history.select(mode=1, opening=corners, result=X_WINS), args.repeat)
+        print(f"X win rate in mode 1 after a corner opening ({rates['X']:.1%}):")
+        print(f"  from totals {indexed * 1e3:8.2f} ms   full scan {scanned * 1e3:8.2f} ms")
+        print(f"record numbers of those X wins ({len(numbers):,}): {selected * 1e3:.2f} ms")
+        history.close()
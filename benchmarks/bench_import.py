@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Module -> modules it must never pull in. uart_core is what headless services and tests load.
+MODULES = {
+    "uart_core": ("tkinter", "numpy", "serial.tools.list_ports"),
+    "serial_mux": ("tkinter", "numpy"),
+    "GUI": ("tkinter", "numpy"),
+    "TicTacToeSWPart.uart_communicate": ("tkinter",),
+}
+CORE = "uart_core"
+CORE_BUDGET_MS = 100.0
+
+
+def import_times(module):
+    # One fresh interpreter: {module name: (self us, cumulative us, depth)} from -X importtime.
+    environment = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=environment,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(own), int(cumulative), depth)
+    return times
+
+
+def measure(module, repeat):
+    # The best of several runs; the first one also pays for writing the bytecode caches.
+    best = None
+    for _ in range(repeat):
+        times = import_times(module)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the client modules with -X importtime.")
+    parser.add_argument("modules", nargs="*", default=list(MODULES))
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=CORE_BUDGET_MS,
+                        help=f"Fail if importing {CORE} takes longer than this")
+    parser.add_argument("--top", type=int, default=5, help="Show this many of the slowest direct imports")
+    args = parser.parse_args()
+
+    failures = []
+    for module in args.modules:
+        times = measure(module, args.repeat)
+        total_ms = times[module][1] / 1000
+        print(f"{module:<18}{total_ms:8.1f} ms  {len(times):4d} modules")
+        children = sorted(((cumulative, name) for name, (_, cumulative, depth) in times.items() if depth == 1),
+                          reverse=True)
+        for cumulative, name in children[:args.top]:
+            print(f"    {name:<30}{cumulative / 1000:8.1f} ms")
+        loaded = [name for name in MODULES.get(module, ()) if name in times]
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)}")
+        if module == CORE and total_ms > args.budget_ms:
+            failures.append(f"{module} took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from TicTacToeSWPart.uart_communicate import LineFramer
+
+BOARD_LINE = b'{"type":"board","board":[["X","O"," "],[" ","X"," "],["O"," "," "]]}\r\n'
+STATUS_LINE = b'{"type":"win_status","message":"Player X wins!"}\r\n'
+
+
+class StreamSerial:
+    # Hands out a fixed stream in chunks the size a UART would have buffered per tick.
+    def __init__(self, data, chunk):
+        self.data = memoryview(data)
+        self.position = 0
+        self.chunk = chunk
+
+    @property
+    def in_waiting(self):
+        return min(self.chunk, len(self.data) - self.position)
+
+    def read(self, size):
+        data = self.data[self.position:self.position + size].tobytes()
+        self.position += len(data)
+        return data
+
+
+def run(baud_rate, tick_ms, lines):
+    payload = (BOARD_LINE * 4 + STATUS_LINE) * (lines // 5)
+    bytes_per_tick = max(1, int(baud_rate / 10 * tick_ms / 1000))
+    ser = StreamSerial(payload, bytes_per_tick)
+    framer = LineFramer()
+
+    received = 0
+    ticks = 0
+    start = time.perf_counter()
+    while ser.in_waiting:
+        received += len(framer.read_from(ser))
+        ticks += 1
+    elapsed = time.perf_counter() - start
+
+    wire_lines_per_second = baud_rate / 10 / (len(payload) / received)
+    print(f"baud rate:              {baud_rate}")
+    print(f"tick:                   {tick_ms} ms ({bytes_per_tick} bytes per tick)")
+    print(f"lines framed:           {received} in {ticks} ticks")
+    print(f"framer throughput:      {received / elapsed:,.0f} lines/s")
+    print(f"wire rate:              {wire_lines_per_second:,.0f} lines/s")
+    print(f"readline per tick:      {1000 / tick_ms:,.0f} lines/s")
+    print(f"headroom over the wire: {received / elapsed / wire_lines_per_second:,.0f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the non-blocking UART line framer.")
+    parser.add_argument("--baud-rate", type=int, default=115200)
+    parser.add_argument("--tick-ms", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=200000)
+    args = parser.parse_args()
+    run(args.baud_rate, args.tick_ms, args.lines)
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import serial
+
+from uart_core import MessageFramer, BAUD_RATES, BOARD_RX_BUFFER, DEFAULT_BAUD_RATE
+from messages import Message
+
+# Only rates the sketch negotiates, so that a real board can be stepped through them.
+DEFAULT_BAUD_RATES = list(BAUD_RATES)
+DEFAULT_SIZES = [8, 32, 64, 128]
+READ_TIMEOUT = 0.01
+RESPONSE_TIMEOUT = 5.0
+HISTOGRAM_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+
+class Link:
+    def __init__(self, port, baud_rate):
+        self.ser = serial.serial_for_url(port, baud_rate, timeout=READ_TIMEOUT)
+        self.baud_rate = baud_rate
+        self.framer = MessageFramer()
+        self.pending = []
+        self.parse_seconds = 0.0
+        self.parsed = 0
+
+    def close(self):
+        self.ser.close()
+
+    def send(self, message):
+        self.ser.write((json.dumps(message) + "\n").encode())
+
+    def next_message(self, deadline):
+        while not self.pending:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("No response from the board")
+            data = self.ser.read(self.ser.in_waiting or 1)
+            if data:
+                start = time.perf_counter()
+                messages = self.framer.feed(data)
+                self.parse_seconds += time.perf_counter() - start
+                self.parsed += len(messages)
+                self.pending.extend(messages)
+        return self.pending.pop(0)
+
+    def wait_for(self, message_type, timeout=RESPONSE_TIMEOUT):
+        deadline = time.perf_counter() + timeout
+        while True:
+            message = self.next_message(deadline)
+            if isinstance(message, Message) and message.type in message_type:
+                return message
+
+    def switch_rate(self, baud_rate):
+        # The sketch's BAUD handshake: the reply comes at the old rate, the confirmation at the new one.
+        self.send({"command": "BAUD", "rate": baud_rate})
+        reply = self.wait_for(("baud", "error"))
+        if reply.type == "error":
+            raise ValueError(f"{baud_rate} baud refused: {reply['message']}")
+        self.ser.flush()
+        self.ser.baudrate = baud_rate
+        self.baud_rate = baud_rate
+        self.send({"command": "BAUD", "rate": baud_rate, "confirm": True})
+        reply = self.wait_for(("baud", "error"))
+        if reply.type == "error":
+            raise ValueError(f"{baud_rate} baud not confirmed: {reply['message']}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def histogram(values_ms):
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for value in values_ms:
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+    labels = [f"<={bound}" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}"]
+    return dict(zip(labels, counts))
+
+
+def measure(link, size, round_trips, burst, buffer_bytes):
+    payload = "x" * size
+    link.send({"command": "MODE", "mode": 0})
+    link.wait_for(("board",))
+
+    samples = []
+    for _ in range(round_trips):
+        start = time.perf_counter()
+        link.send({"command": "ECHO", "data": payload})
+        link.wait_for(("echo",))
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Sustained rate: keep echoes in flight and count completed ones. The board reads the oldest one,
+    # the rest wait in its receive buffer, so only as many as fit there are queued behind it.
+    window = 1 + buffer_bytes // len(json.dumps({"command": "ECHO", "data": payload}) + "\n")
+    link.parse_seconds, link.parsed = 0.0, 0
+    start = time.perf_counter()
+    sent = 0
+    for received in range(burst):
+        while sent < burst and sent - received < window:
+            link.send({"command": "ECHO", "data": payload})
+            sent += 1
+        link.wait_for(("echo",))
+    sustained = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "payload_bytes": size,
+        "round_trips": round_trips,
+        "rtt_ms": {
+            "min": samples[0],
+            "p50": percentile(samples, 0.50),
+            "p95": percentile(samples, 0.95),
+            "p99": percentile(samples, 0.99),
+            "max": samples[-1],
+            "mean": sum(samples) / len(samples),
+        },
+        "rtt_histogram_ms": histogram(samples),
+        "messages_per_second": burst / sustained,
+        "burst_window": window,
+        "parse_us_per_message": link.parse_seconds / max(1, link.parsed) * 1e6,
+    }
+
+
+def connect(port, baud_rate, ready_timeout):
+    link = Link(port, baud_rate)
+    try:
+        link.wait_for(("info",), timeout=ready_timeout)
+    except TimeoutError:
+        pass
+    return link
+
+
+def measure_rate(link, baud_rate, args, results):
+    for size in args.sizes:
+        result = measure(link, size, args.round_trips, args.burst, args.buffer_bytes)
+        result["baud_rate"] = baud_rate
+        results.append(result)
+        rtt = result["rtt_ms"]
+        print(f"{baud_rate:>7} baud {size:>4} B  p50 {rtt['p50']:8.2f} ms  p95 {rtt['p95']:8.2f} ms  "
+              f"p99 {rtt['p99']:8.2f} ms  {result['messages_per_second']:8.1f} msg/s  "
+              f"parse {result['parse_us_per_message']:6.2f} us/msg")
+
+
+def run_sweep(args):
+    # A rate that fails is reported and skipped; the results of the others are kept.
+    results = []
+    if args.port is None:
+        from firmware_emulator import PtyEmulator
+        for baud_rate in args.baud_rates:
+            with PtyEmulator(baud_rate=baud_rate) as emulator:
+                link = connect(emulator.port, baud_rate, args.ready_timeout)
+                try:
+                    measure_rate(link, baud_rate, args, results)
+                except TimeoutError as e:
+                    print(f"{baud_rate:>7} baud skipped: {e}")
+                finally:
+                    link.close()
+        return results
+
+    # Opening the port resets a real board to its default rate; BAUD steps it through the others.
+    link = connect(args.port, DEFAULT_BAUD_RATE, args.ready_timeout)
+    try:
+        for baud_rate in args.baud_rates:
+            try:
+                if baud_rate != link.baud_rate:
+                    link.switch_rate(baud_rate)
+                measure_rate(link, baud_rate, args, results)
+            except (TimeoutError, ValueError) as e:
+                print(f"{baud_rate:>7} baud skipped: {e}")
+    finally:
+        link.close()
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    baseline = {(r["baud_rate"], r["payload_bytes"]): r for r in old["results"]}
+    print(f"{'baud':>7} {'bytes':>5} {'p50 ms':>16} {'p99 ms':>16} {'msg/s':>18}")
+    for result in new["results"]:
+        before = baseline.get((result["baud_rate"], result["payload_bytes"]))
+        if before is None:
+            continue
+
+        def delta(old_value, new_value):
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            return f"{new_value:8.2f} ({change:+5.1f}%)"
+
+        print(f"{result['baud_rate']:>7} {result['payload_bytes']:>5} "
+              f"{delta(before['rtt_ms']['p50'], result['rtt_ms']['p50']):>16} "
+              f"{delta(before['rtt_ms']['p99'], result['rtt_ms']['p99']):>16} "
+              f"{delta(before['messages_per_second'], result['messages_per_second']):>18}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure serial link latency and throughput with ECHO round trips.")
+    parser.add_argument("--port", help="Serial port or URL of a real board (default: a pty emulator per baud rate)")
+    parser.add_argument("--baud-rates", type=int, nargs="+", default=DEFAULT_BAUD_RATES)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="ECHO payload sizes in bytes")
+    parser.add_argument("--round-trips", type=int, default=50)
+    parser.add_argument("--burst", type=int, default=50, help="Echoes sent back to back for the sustained rate")
+    parser.add_argument("--buffer-bytes", type=int, default=BOARD_RX_BUFFER,
+                        help="Bytes allowed to wait in the board's receive buffer during a burst")
+    parser.add_argument("--ready-timeout", type=float, default=3.0, help="Time allowed for the board to boot")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    results = run_sweep(args)
+    if args.output:
+        report = {
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "endpoint": args.port or "emulator",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import messages
+from GUI import BoardRenderer, MessageLog, handle_message
+
+BOARD_LINE = '{"type":"board","board":[["X","O"," "],[" ","X"," "],["O"," "," "]]}'
+STATUS_LINE = '{"type":"game_status","message":"Game reset."}'
+ERROR_LINE = '{"type":"error","message":"Invalid move."}'
+
+
+def previous_decode(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError:
+        return "Error: Invalid JSON received"
+
+
+def previous_handle(response, renderer, log):
+    # The branch chain handle_message used before the dispatch table.
+    if isinstance(response, dict):
+        if "board" in response:
+            renderer.submit(response["board"])
+        else:
+            log.write(f"Game status: {response['message']}")
+        if response.get("type") == "win_status":
+            pass
+    else:
+        log.write(f"Received: {response}")
+
+
+def time_per_message(function, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            function(line)
+        best = min(best, time.perf_counter() - start)
+    return best / len(lines) * 1e9
+
+
+def run(count, repeat):
+    # A game stream is mostly board updates with the odd status or error line.
+    lines = ([BOARD_LINE] * 8 + [STATUS_LINE, ERROR_LINE]) * (count // 10)
+    renderer = BoardRenderer([[MagicMock() for _ in range(3)] for _ in range(3)])
+    log = MessageLog(MagicMock(), capacity=10)
+
+    def old_path(line):
+        previous_handle(previous_decode(line), renderer, log)
+        log.pending.clear()
+
+    def new_path(line):
+        handle_message(messages.decode_line(line), renderer, log)
+        log.pending.clear()
+
+    results = [
+        ("board, json.loads", time_per_message(previous_decode, [BOARD_LINE] * count, repeat)),
+        ("board, fast path", time_per_message(messages.decode_line, [BOARD_LINE] * count, repeat)),
+        ("status, json.loads", time_per_message(previous_decode, [STATUS_LINE] * count, repeat)),
+        (f"status, typed ({messages.JSON_BACKEND})", time_per_message(messages.decode_line, [STATUS_LINE] * count, repeat)),
+        ("mixed stream, previous decode+handle", time_per_message(old_path, lines, repeat)),
+        ("mixed stream, typed decode+dispatch", time_per_message(new_path, lines, repeat)),
+    ]
+    for name, nanoseconds in results:
+        print(f"{name:<40}{nanoseconds:10.0f} ns/message")
+    print(f"board decode speed-up: {results[0][1] / results[1][1]:.1f}x, "
+          f"mixed stream speed-up: {results[4][1] / results[5][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the typed message decoder with plain json.loads.")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.count, args.repeat)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+import queue
+import sys
+import time
+from unittest.mock import MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from uart_core import SerialReader
+from messages import Message, ProtoMessage, GameModeMessage, InfoMessage
+from metrics import MetricsRegistry, NULL_REGISTRY
+
+BOARD_LINE = b'{"type":"board","board":[["X","O"," "],[" ","X"," "],["O"," "," "]]}\n'
+
+
+class UninstrumentedReader(SerialReader):
+    # SerialReader.feed with every metrics call taken out: the baseline that even NullRegistry's no-op calls add to.
+    def feed(self, data):
+        for message in self.framer.feed(data):
+            if not isinstance(message, Message):
+                self.errors += 1
+            elif isinstance(message, ProtoMessage):
+                self.negotiated.set()
+            elif isinstance(message, GameModeMessage):
+                mode = str(message.message).split()[-1:]
+                self.game_mode = int(mode[0]) if mode and mode[0].isdigit() else None
+            elif isinstance(message, InfoMessage):
+                self.game_mode = None
+            tap = self.tap
+            if tap is not None:
+                tap.put(message)
+            self.messages.put(message)
+
+
+def time_per_message(registry, chunks, lines_per_chunk, repeat):
+    # registry None times UninstrumentedReader, which also skips the byte count SerialReader.run keeps.
+    best = float("inf")
+    for _ in range(repeat):
+        messages = queue.Queue()
+        if registry is None:
+            reader = UninstrumentedReader(MagicMock(), messages)
+            start = time.perf_counter()
+            for chunk in chunks:
+                reader.feed(chunk)
+        else:
+            reader = SerialReader(MagicMock(), messages, registry)
+            start = time.perf_counter()
+            for chunk in chunks:
+                reader.bytes_received.inc(len(chunk))
+                reader.feed(chunk)
+        best = min(best, time.perf_counter() - start)
+    return best / (len(chunks) * lines_per_chunk) * 1e9
+
+
+def run(count, lines_per_chunk, repeat):
+    chunks = [BOARD_LINE * lines_per_chunk] * (count // lines_per_chunk)
+    baseline = time_per_message(None, chunks, lines_per_chunk, repeat)
+    disabled = time_per_message(NULL_REGISTRY, chunks, lines_per_chunk, repeat)
+    enabled = time_per_message(MetricsRegistry(), chunks, lines_per_chunk, repeat)
+    print(f"{'uninstrumented':<24}{baseline:10.0f} ns/message")
+    print(f"{'metrics disabled':<24}{disabled:10.0f} ns/message")
+    print(f"{'metrics enabled':<24}{enabled:10.0f} ns/message")
+    print(f"disabled overhead: {disabled - baseline:.0f} ns/message ({(disabled / baseline - 1) * 100:.1f}%)")
+    print(f"enabled overhead:  {enabled - baseline:.0f} ns/message ({(enabled / baseline - 1) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cost of metrics on the serial receive path.")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--lines-per-chunk", type=int, default=1,
+                        help="Messages per read; one is the worst case for the per-read timer")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.count, args.lines_per_chunk, args.repeat)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import selectors
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_link import percentile
+from firmware_emulator import TcpEmulator
+from serial_mux import SerialMux, run_in_thread, stop_thread
+
+RESPONSE_TIMEOUT = 5.0
+
+
+def connect(url, count):
+    host, port = url[len("socket://"):].rsplit(":", 1)
+    subscribers = []
+    for _ in range(count):
+        client = socket.create_connection((host, int(port)))
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.setblocking(False)
+        subscribers.append(client)
+    return subscribers
+
+
+def run(subscriber_count, rounds, external_url=None):
+    emulator = None
+    if external_url is None:
+        emulator = TcpEmulator(baud_rate=0).start()
+        mux = SerialMux(emulator.url, tcp_port=0)
+        thread = run_in_thread(mux)
+        url = mux.url
+    else:
+        url = external_url
+    subscribers = connect(url, subscriber_count)
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for client in subscribers:
+        selector.register(client, selectors.EVENT_READ)
+        buffers[client] = b""
+    time.sleep(0.5)
+    for client in subscribers:
+        try:
+            client.recv(65536)
+        except BlockingIOError:
+            pass
+
+    end_to_end = []
+    spreads = []
+    try:
+        for round_number in range(rounds):
+            # The send time travels in the payload, so every copy of the echo carries its own start.
+            payload = f"{round_number}-{time.perf_counter_ns()}"
+            subscribers[0].sendall((json.dumps({"command": "ECHO", "data": payload}) + "\n").encode())
+            arrivals = []
+            waiting = set(subscribers)
+            deadline = time.perf_counter() + RESPONSE_TIMEOUT
+            while waiting:
+                if time.perf_counter() > deadline:
+                    raise TimeoutError(f"{len(waiting)} subscribers missed round {round_number}")
+                for key, _ in selector.select(timeout=0.1):
+                    client = key.fileobj
+                    buffers[client] += client.recv(65536)
+                    while b"\n" in buffers[client]:
+                        line, buffers[client] = buffers[client].split(b"\n", 1)
+                        if payload.encode() in line and client in waiting:
+                            waiting.discard(client)
+                            arrivals.append(time.perf_counter_ns())
+            sent = int(payload.split("-")[1])
+            end_to_end.extend((arrival - sent) / 1e6 for arrival in arrivals)
+            spreads.append((max(arrivals) - min(arrivals)) / 1e6)
+    finally:
+        for client in subscribers:
+            client.close()
+        if emulator is not None:
+            stop_thread(mux, thread)
+            emulator.stop()
+
+    end_to_end.sort()
+    spreads.sort()
+    print(f"{subscriber_count} subscribers, {rounds} rounds")
+    print(f"{'':<28}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  ms")
+    for name, values in (("command to each subscriber", end_to_end), ("first to last subscriber", spreads)):
+        print(f"{name:<28}" + "".join(f"{percentile(values, fraction):9.2f}" for fraction in (0.5, 0.95, 0.99))
+              + f"{values[-1]:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how long serial_mux.py takes to fan a message out.")
+    parser.add_argument("--subscribers", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--url", help="Benchmark a running multiplexer instead of an emulated board")
+    args = parser.parse_args()
+    run(args.subscribers, args.rounds, args.url)
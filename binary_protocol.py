@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Frame layout before COBS encoding: [type][length][payload ...][crc8].
+# Encoded frames never contain 0x00, which delimits them on the wire.
+
+MESSAGE_TYPES = {
+    "info": 1,
+    "board": 2,
+    "win_status": 3,
+    "game_status": 4,
+    "game_mode": 5,
+    "error": 6,
+    "proto": 7,
+    "echo": 8,
+    "baud": 9,
+}
+MESSAGE_NAMES = {code: name for name, code in MESSAGE_TYPES.items()}
+
+CELL_CODES = {" ": 0, "X": 1, "O": 2}
+CELL_SYMBOLS = " XO"
+BOARD_SIZE = 3
+# FRAME_MAX_PAYLOAD in the sketch, whose frame buffers are sized for it: longer messages are cut
+# to this length on the board, so the host and the emulator cut them the same way.
+MAX_PAYLOAD = 48
+
+
+def _crc8_table():
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def cobs_encode(data):
+    out = bytearray([0])
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+    out[code_index] = code
+    return bytes(out)
+
+
+def cobs_decode(data):
+    out = bytearray()
+    index = 0
+    while index < len(data):
+        code = data[index]
+        if code == 0 or index + code > len(data):
+            raise ValueError("Invalid COBS block")
+        out += data[index + 1:index + code]
+        index += code
+        if code < 0xFF and index < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+def encode_board(board):
+    code = 0
+    for row in reversed(board):
+        for cell in reversed(row):
+            code = code * 3 + CELL_CODES.get(cell, 0)
+    return code.to_bytes(2, "little")
+
+
+def decode_board(payload):
+    code = int.from_bytes(payload, "little")
+    board = []
+    for _ in range(BOARD_SIZE):
+        row = []
+        for _ in range(BOARD_SIZE):
+            code, cell = divmod(code, 3)
+            row.append(CELL_SYMBOLS[cell])
+        board.append(row)
+    return board
+
+
+def encode_message(message):
+    message_type = MESSAGE_TYPES[message["type"]]
+    if message["type"] == "board":
+        payload = encode_board(message["board"])
+    else:
+        payload = message.get("message", "").encode()[:MAX_PAYLOAD]
+    raw = bytes([message_type, len(payload)]) + payload
+    return cobs_encode(raw + bytes([crc8(raw)])) + b"\x00"
+
+
+def decode_frame(frame):
+    raw = cobs_decode(frame)
+    if len(raw) < 3 or raw[1] != len(raw) - 3 or raw[1] > MAX_PAYLOAD:
+        raise ValueError("Invalid frame length")
+    if crc8(raw[:-1]) != raw[-1]:
+        raise ValueError("Frame checksum mismatch")
+    name = MESSAGE_NAMES.get(raw[0])
+    if name is None:
+        raise ValueError(f"Unknown message type {raw[0]}")
+    payload = raw[2:-1]
+    if name == "board":
+        return {"type": name, "board": decode_board(payload)}
+    return {"type": name, "message": payload.decode(errors="replace")}
+
+
+def parse_frame(frame):
+    try:
+        return decode_frame(frame)
+    except ValueError:
+        return "Error: Invalid frame received"
+
+
+class FrameDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while True:
+            end = self.buffer.find(b"\x00")
+            if end < 0:
+                break
+            frame = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            if frame:
+                messages.append(parse_frame(frame))
+        return messages
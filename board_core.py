@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cell (row, col) is index row * size + col. Boards are int8 arrays of these codes.
+EMPTY, X, O = 0, 1, 2
+CELL_CODES = {" ": EMPTY, "X": X, "O": O}
+CELL_SYMBOLS = (" ", "X", "O")
+ONGOING, X_WINS, O_WINS, DRAW = 0, 1, 2, 3
+RESULTS = {ONGOING: None, X_WINS: "X", O_WINS: "O", DRAW: "draw"}
+# Right, down, down-right, down-left.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+class BoardGeometry:
+    # Every winning line of an N x N board with k in a row, precomputed three ways:
+    # cell indices and bitmasks for single boards, and shifted window slices that test
+    # a whole batch of boards for a direction with k array ANDs. Only the bitmasks work without NumPy.
+    def __init__(self, size=3, win_length=None):
+        win_length = default_win_length(size) if win_length is None else win_length
+        if size < 1 or not 1 <= win_length <= size:
+            raise ValueError(f"Cannot play {win_length} in a row on a {size}x{size} board")
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+
+        lines = []
+        self.windows = []
+        for d_row, d_col in DIRECTIONS:
+            rows = range(size - (win_length - 1) * d_row)
+            cols = range(win_length - 1 if d_col < 0 else 0, size - (win_length - 1) * max(d_col, 0))
+            for row in rows:
+                for col in cols:
+                    lines.append([(row + n * d_row) * size + col + n * d_col for n in range(win_length)])
+            self.windows.append(tuple(
+                (slice(None),
+                 slice(rows.start + n * d_row, rows.stop + n * d_row),
+                 slice(cols.start + n * d_col, cols.stop + n * d_col))
+                for n in range(win_length)))
+        self.masks = tuple(sum(1 << cell for cell in line) for line in lines)
+        self.full_mask = (1 << self.cells) - 1
+        if np is None:
+            return
+        self.lines = np.array(lines, dtype=np.intp).reshape(len(lines), win_length)
+        through = [[] for _ in range(self.cells)]
+        for index, line in enumerate(lines):
+            for cell in line:
+                through[cell].append(index)
+        self.lines_through = tuple(self.lines[indexes] for indexes in through)
+
+    def encode(self, board):
+        require_numpy()
+        if len(board) != self.size or any(len(row) != self.size for row in board):
+            raise ValueError(f"Expected a {self.size}x{self.size} board")
+        return np.array([CELL_CODES.get(cell, EMPTY) for row in board for cell in row], dtype=np.int8)
+
+    def decode(self, cells):
+        require_numpy()
+        symbols = [CELL_SYMBOLS[code] for code in np.asarray(cells).ravel().tolist()]
+        return [symbols[row * self.size:(row + 1) * self.size] for row in range(self.size)]
+
+    def has_line(self, stones):
+        # stones: (boards, size, size) bool. True where a board holds a full line.
+        require_numpy()
+        found = np.zeros(len(stones), dtype=bool)
+        for window in self.windows:
+            run = stones[window[0]].copy()
+            for offset in window[1:]:
+                run &= stones[offset]
+            found |= run.reshape(len(run), -1).any(axis=1)
+        return found
+
+    def status(self, boards):
+        # boards: (count, cells) or (count, size, size) codes; returns one of ONGOING, X_WINS, O_WINS, DRAW each.
+        require_numpy()
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, self.size, self.size)
+        result = np.full(len(boards), ONGOING, dtype=np.int8)
+        full = (boards != EMPTY).reshape(len(boards), -1).all(axis=1)
+        result[full] = DRAW
+        result[self.has_line(boards == O)] = O_WINS
+        # A position with lines for both sides cannot come from play; X is reported, as X moved first.
+        result[self.has_line(boards == X)] = X_WINS
+        return result
+
+    def winner(self, board):
+        # "X", "O", "draw" or None for one board in the list-of-rows form the firmware sends.
+        return RESULTS[int(self.status(self.encode(board)[None])[0])]
+
+    def wins_at(self, cells, cell):
+        # After a move to cell: does it complete a line? Only the lines through that cell are read.
+        require_numpy()
+        player = cells[cell]
+        return player != EMPTY and bool((cells[self.lines_through[cell]] == player).all(axis=1).any())
+
+    def mask_wins(self, mask):
+        return any(mask & line == line for line in self.masks)
+
+    def board_mask(self, board, player):
+        # Bitmask of player's stones on a board in the list-of-rows form the firmware keeps.
+        return sum(1 << row * self.size + col
+                   for row in range(self.size) for col in range(self.size) if board[row][col] == player)
+
+
+@functools.lru_cache(maxsize=None)
+def get_geometry(size=3, win_length=None):
+    return BoardGeometry(size, win_length)
+
+
+def default_win_length(size):
+    # A full side on small boards, five in a row (as in gomoku) on anything larger.
+    return min(size, 5)
+
+
+def require_numpy():
+    if np is None:
+        raise ImportError("The vectorized board checks need NumPy (pip install numpy)")
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import io
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import serial.tools.list_ports
+
+from uart_core import UARTCommunication
+from hardware_test import TicTacToeArduinoTests
+
+
+class BoardResult:
+    def __init__(self, port, value=None, error=None, seconds=0.0):
+        self.port = port
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        if self.error is not None:
+            return False
+        if isinstance(self.value, unittest.TestResult):
+            return self.value.wasSuccessful()
+        return True
+
+
+def run_hardware_suite(port, baud_rate):
+    # A subclass per board keeps the class-level serial handle of each run separate.
+    name = "TicTacToeArduinoTests_" + "".join(c if c.isalnum() else "_" for c in port)
+    tests = type(name, (TicTacToeArduinoTests,), {"SERIAL_PORT": port, "BAUD_RATE": baud_rate})
+    stream = io.StringIO()
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(
+        unittest.defaultTestLoader.loadTestsFromTestCase(tests))
+    result.output = stream.getvalue()
+    return result
+
+
+class BoardPool:
+    def __init__(self, ports=None, baud_rate=9600, max_workers=None):
+        if ports is None:
+            ports = [port.device for port in serial.tools.list_ports.comports()]
+        self.ports = list(ports)
+        self.baud_rate = baud_rate
+        self.max_workers = max_workers or max(1, len(self.ports))
+        self.sessions = {}
+
+    def map(self, session):
+        # Runs session(port) on every board at once; one board failing never stops the others.
+        def timed(port):
+            start = time.perf_counter()
+            try:
+                return BoardResult(port, value=session(port), seconds=time.perf_counter() - start)
+            except Exception as e:
+                return BoardResult(port, error=e, seconds=time.perf_counter() - start)
+
+        if not self.ports:
+            return {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(self.ports, executor.map(timed, self.ports)))
+
+    def run_hardware_suite(self):
+        return self.map(lambda port: run_hardware_suite(port, self.baud_rate))
+
+    def open(self):
+        def connect(port):
+            uart = UARTCommunication()
+            status = uart.open_port(port, self.baud_rate)
+            if not status.startswith("Connected"):
+                raise IOError(status)
+            uart.start_reader()
+            return uart
+
+        results = self.map(connect)
+        self.sessions = {port: result.value for port, result in results.items() if result.ok}
+        return results
+
+    def map_sessions(self, session):
+        return self.map(lambda port: session(self.sessions[port]))
+
+    def close(self):
+        for uart in self.sessions.values():
+            uart.stop_reader()
+            uart.ser.close()
+        self.sessions = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def print_summary(results, wall_time):
+    for port, result in results.items():
+        if result.error is not None:
+            print(f"{port}: ERROR {result.error} ({result.seconds:.2f} s)")
+            continue
+        suite = result.value
+        status = "OK" if result.ok else "FAILED"
+        print(f"{port}: {status} - {suite.testsRun} tests, {len(suite.failures)} failures, "
+              f"{len(suite.errors)} errors ({result.seconds:.2f} s)")
+        if not result.ok:
+            print(suite.output)
+    slowest = max((result.seconds for result in results.values()), default=0.0)
+    print(f"{len(results)} boards in {wall_time:.2f} s (slowest board {slowest:.2f} s)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run the hardware test suite on many boards in parallel.")
+    parser.add_argument("ports", nargs="*", help="Serial ports or URLs (default: every detected port)")
+    parser.add_argument("--baud-rate", type=int, default=9600)
+    parser.add_argument("--emulate", type=int, metavar="N", help="Test N emulated boards on ptys instead")
+    parser.add_argument("--no-delay", action="store_true", help="Do not pace emulator bytes at the baud rate")
+    args = parser.parse_args()
+
+    emulators = []
+    if args.emulate:
+        from firmware_emulator import PtyEmulator
+        emulators = [PtyEmulator(baud_rate=0 if args.no_delay else args.baud_rate).start()
+                     for _ in range(args.emulate)]
+        args.ports = [emulator.port for emulator in emulators]
+
+    try:
+        pool = BoardPool(args.ports or None, args.baud_rate)
+        start = time.perf_counter()
+        results = pool.run_hardware_suite()
+        print_summary(results, time.perf_counter() - start)
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+    sys.exit(0 if results and all(result.ok for result in results.values()) else 1)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+
+# Cell (row, col) is bit row * 3 + col; a position is the pair of X and O masks.
+BOARD_SIZE = 3
+FULL_MASK = 0x1FF
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+)
+MOVE_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+WIN_SCORE = 10
+
+CACHE_MAGIC = b"TTTE"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sHI")
+CACHE_ENTRY = struct.Struct("<Ibb")
+DEFAULT_CACHE_PATH = os.path.join(
+    os.environ.get("TICTACTOE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "tictactoe")),
+    "engine_table.bin",
+)
+
+_engine = None
+
+
+def is_win(mask):
+    for line in WIN_MASKS:
+        if mask & line == line:
+            return True
+    return False
+
+
+def position_key(x_mask, o_mask):
+    return x_mask | (o_mask << 9)
+
+
+def split_key(key):
+    return key & FULL_MASK, key >> 9
+
+
+def board_to_masks(board):
+    x_mask = o_mask = 0
+    for i in range(BOARD_SIZE):
+        for j in range(BOARD_SIZE):
+            if board[i][j] == "X":
+                x_mask |= 1 << (i * BOARD_SIZE + j)
+            elif board[i][j] == "O":
+                o_mask |= 1 << (i * BOARD_SIZE + j)
+    return x_mask, o_mask
+
+
+def masks_to_board(x_mask, o_mask):
+    board = [[" "] * BOARD_SIZE for _ in range(BOARD_SIZE)]
+    for cell in range(BOARD_SIZE * BOARD_SIZE):
+        if x_mask >> cell & 1:
+            board[cell // BOARD_SIZE][cell % BOARD_SIZE] = "X"
+        elif o_mask >> cell & 1:
+            board[cell // BOARD_SIZE][cell % BOARD_SIZE] = "O"
+    return board
+
+
+def x_to_move(x_mask, o_mask):
+    return bin(x_mask).count("1") == bin(o_mask).count("1")
+
+
+def build_table():
+    # Negamax over every reachable position; scores are from the side to move and
+    # prefer faster wins and slower losses.
+    table = {}
+
+    def negamax(own, other):
+        key = position_key(own, other) if x_to_move(own, other) else position_key(other, own)
+        entry = table.get(key)
+        if entry is not None:
+            return entry[0]
+        occupied = own | other
+        if is_win(other):
+            score, move = -(WIN_SCORE - bin(occupied).count("1")), -1
+        elif occupied == FULL_MASK:
+            score, move = 0, -1
+        else:
+            score, move = -WIN_SCORE - 1, -1
+            for cell in MOVE_ORDER:
+                bit = 1 << cell
+                if occupied & bit:
+                    continue
+                value = -negamax(other, own | bit)
+                if value > score:
+                    score, move = value, cell
+        table[key] = (score, move)
+        return score
+
+    negamax(0, 0)
+    return table
+
+
+def search(own, other, alpha=-WIN_SCORE - 1, beta=WIN_SCORE + 1):
+    # Alpha-beta fallback for positions outside the table (e.g. boards edited by hand).
+    occupied = own | other
+    if is_win(other):
+        return -(WIN_SCORE - bin(occupied).count("1")), -1
+    if occupied == FULL_MASK:
+        return 0, -1
+    best_move = -1
+    for cell in MOVE_ORDER:
+        bit = 1 << cell
+        if occupied & bit:
+            continue
+        value = -search(other, own | bit, -beta, -alpha)[0]
+        if value > alpha or best_move < 0:
+            alpha, best_move = max(alpha, value), cell
+        if alpha >= beta:
+            break
+    return alpha, best_move
+
+
+def save_table(table, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as cache:
+        cache.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(table)))
+        for key in sorted(table):
+            score, move = table[key]
+            cache.write(CACHE_ENTRY.pack(key, score, move))
+    os.replace(temporary, path)
+
+
+def load_table(path):
+    with open(path, "rb") as cache:
+        data = cache.read()
+    magic, version, count = CACHE_HEADER.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        raise ValueError("Unsupported engine cache")
+    if len(data) != CACHE_HEADER.size + count * CACHE_ENTRY.size:
+        raise ValueError("Truncated engine cache")
+    return {key: (score, move) for key, score, move in CACHE_ENTRY.iter_unpack(data[CACHE_HEADER.size:])}
+
+
+class Engine:
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH):
+        self.table = None
+        if cache_path:
+            try:
+                self.table = load_table(cache_path)
+            except (OSError, ValueError, struct.error):
+                self.table = None
+        if self.table is None:
+            self.table = build_table()
+            if cache_path:
+                try:
+                    save_table(self.table, cache_path)
+                except OSError:
+                    pass
+
+    def lookup(self, x_mask, o_mask):
+        entry = self.table.get(position_key(x_mask, o_mask))
+        if entry is not None:
+            return entry
+        if x_to_move(x_mask, o_mask):
+            return search(x_mask, o_mask)
+        return search(o_mask, x_mask)
+
+    def best_move(self, board):
+        move = self.lookup(*board_to_masks(board))[1]
+        if move < 0:
+            return None
+        return divmod(move, BOARD_SIZE)
+
+    def evaluate(self, board):
+        return self.lookup(*board_to_masks(board))[0]
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = Engine()
+    return _engine
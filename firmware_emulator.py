@@ -0,0 +1,490 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import random
+import select
+import socket
+import threading
+import time
+
+import board_core
+from binary_protocol import encode_message
+from tablebase_gen import get_tablebase
+
+BOARD_SIZE = 3
+BOOT_DELAY = 0.05
+PACING_INTERVAL = 0.001
+DEFAULT_BAUD_RATE = 9600
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200)
+BAUD_CONFIRM_TIMEOUT = 2.0
+BAUD_ERROR_LIMIT = 3
+UNSTABLE_ERROR_RATE = 0.01
+
+
+class TicTacToeFirmware:
+    # Mirrors the command handling of INOTicTacToe/INOTicTacToe.ino statement for statement.
+    def __init__(self, seed=None, baud_rate=DEFAULT_BAUD_RATE, board_size=BOARD_SIZE, win_length=None):
+        # board_size and win_length stand for the sketch's BOARD_SIZE and WIN_LENGTH constants.
+        self.board_size = board_size
+        if win_length is None:
+            win_length = board_core.default_win_length(board_size)
+        self.win_length = win_length
+        self.geometry = board_core.get_geometry(board_size, win_length)
+        self.random = random.Random(seed)
+        self.default_baud_rate = baud_rate
+        self.clock = time.monotonic
+        self.output = []
+        self.reboot()
+
+    def reboot(self):
+        self.board = [[" "] * self.board_size for _ in range(self.board_size)]
+        self.current_player = "X"
+        self.game_over = False
+        self.game_mode = 0
+        self.binary_protocol = False
+        self.baud_rate = self.confirmed_baud_rate = self.default_baud_rate
+        self.baud_pending = False
+        self.baud_deadline = 0.0
+        self.parse_errors = 0
+        return self.setup()
+
+    def initialize_board(self):
+        for i in range(self.board_size):
+            for j in range(self.board_size):
+                self.board[i][j] = " "
+        self.current_player = "X"
+        self.game_over = False
+
+    def send_json_message(self, message_type, message):
+        document = {"type": message_type, "message": message}
+        if self.binary_protocol:
+            self.output.append(encode_message(document))
+            return
+        self.output.append(json.dumps(document, separators=(",", ":")))
+
+    def send_board_state(self):
+        document = {"type": "board", "board": [list(row) for row in self.board]}
+        if self.binary_protocol:
+            self.output.append(encode_message(document))
+            return
+        self.output.append(json.dumps(document, separators=(",", ":")))
+
+    def check_win(self):
+        # The sketch scans every run from every cell; the precomputed lines of board_core are the same runs.
+        return self.geometry.mask_wins(self.geometry.board_mask(self.board, self.current_player))
+
+    def check_draw(self):
+        return all(cell != " " for row in self.board for cell in row)
+
+    def ai_move_random(self):
+        while True:
+            row = self.random.randrange(self.board_size)
+            col = self.random.randrange(self.board_size)
+            if self.board[row][col] == " ":
+                self.board[row][col] = self.current_player
+                break
+
+    def ai_move_tablebase(self):
+        if self.board_size != BOARD_SIZE:
+            # As in aiMoveTablebase: tablebase.h covers 3x3 only, so other sizes play random moves.
+            self.ai_move_random()
+            return
+        row, col = get_tablebase().best_move(self.board)
+        self.board[row][col] = self.current_player
+
+    def handle_ai_vs_ai(self):
+        while not self.game_over:
+            if self.check_draw():
+                self.send_json_message("win_status", "It's a draw!")
+                self.game_over = True
+                return
+
+            self.ai_move_random()
+
+            if self.check_win():
+                self.send_board_state()
+                self.send_json_message("win_status", f"Player {self.current_player} wins!")
+                self.game_over = True
+                return
+            self.current_player = "O" if self.current_player == "X" else "X"
+            self.send_board_state()
+
+    def make_move(self, row, col):
+        if 0 <= row < self.board_size and 0 <= col < self.board_size and self.board[row][col] == " " and not self.game_over:
+            self.board[row][col] = self.current_player
+            if self.check_win():
+                self.send_json_message("win_status", f"Player {self.current_player} wins!")
+                self.game_over = True
+            elif self.check_draw():
+                self.send_json_message("win_status", "It's a draw!")
+                self.game_over = True
+            else:
+                self.current_player = "O" if self.current_player == "X" else "X"
+            return True
+        return False
+
+    def set_baud_rate(self, rate):
+        # Serial.flush(); Serial.end(); Serial.begin(rate): the link switches once the queued output is out.
+        self.baud_rate = rate
+        self.output.append(rate)
+
+    def revert_baud_rate(self, rate):
+        self.baud_pending = False
+        self.confirmed_baud_rate = rate
+        self.set_baud_rate(rate)
+        self.send_json_message("baud", f"Reverted to {rate}")
+
+    def count_parse_error(self):
+        self.parse_errors += 1
+        if self.parse_errors < BAUD_ERROR_LIMIT:
+            return
+        self.parse_errors = 0
+        if self.baud_pending:
+            self.revert_baud_rate(self.confirmed_baud_rate)
+        elif self.baud_rate != self.default_baud_rate:
+            self.revert_baud_rate(self.default_baud_rate)
+
+    def poll(self):
+        # The part of loop() that runs without any input.
+        self.output = []
+        if self.baud_pending and self.clock() >= self.baud_deadline:
+            self.revert_baud_rate(self.confirmed_baud_rate)
+        return self.output
+
+    def setup(self):
+        self.output = []
+        self.initialize_board()
+        self.send_json_message("info", "TicTacToe Game Started")
+        return self.output
+
+    def handle_line(self, line):
+        self.output = []
+        try:
+            doc = json.loads(line)
+        except ValueError:
+            self.count_parse_error()
+            return self.output
+        self.parse_errors = 0
+        # A missing command would make the sketch call strcmp on NULL; drop the line instead.
+        if not isinstance(doc, dict) or not isinstance(doc.get("command"), str):
+            return self.output
+
+        command = doc["command"]
+        if command == "MOVE":
+            if self.make_move(as_int(doc.get("row")), as_int(doc.get("col"))):
+                self.send_board_state()
+            else:
+                self.send_json_message("error", "Invalid move.")
+        elif command == "RESET":
+            self.initialize_board()
+            self.send_json_message("game_status", "Game reset.")
+            self.send_board_state()
+        elif command == "MODE":
+            self.game_mode = as_int(doc.get("mode"))
+            self.send_json_message("game_mode", f"Game mode set to {self.game_mode}")
+            self.initialize_board()
+            self.send_json_message("game_status", "Game reset.")
+            self.send_board_state()
+        elif command == "PROTO":
+            # The packed board frame holds nine cells, so larger boards stay on JSON.
+            binary = doc.get("format") == "binary" and self.board_size == BOARD_SIZE
+            self.send_json_message("proto", "binary" if binary else "json")
+            self.binary_protocol = binary
+        elif command == "ECHO":
+            data = doc.get("data")
+            self.send_json_message("echo", data if isinstance(data, str) else "")
+        elif command == "BAUD":
+            rate = as_int(doc.get("rate"))
+            if doc.get("confirm") is True:
+                if self.baud_pending and rate == self.baud_rate:
+                    self.baud_pending = False
+                    self.confirmed_baud_rate = rate
+                    self.send_json_message("baud", f"Confirmed {rate}")
+                else:
+                    self.send_json_message("error", "No baud change pending.")
+            elif rate in BAUD_RATES:
+                self.send_json_message("baud", f"Switching to {rate}")
+                self.set_baud_rate(rate)
+                self.baud_pending = True
+                self.baud_deadline = self.clock() + BAUD_CONFIRM_TIMEOUT
+            else:
+                self.send_json_message("error", "Unsupported baud rate.")
+
+        if self.game_mode == 1 and not self.game_over and self.current_player == "O":
+            self.ai_move_tablebase()
+            if self.check_win():
+                self.send_json_message("win_status", f"Player {self.current_player} wins!")
+                self.game_over = True
+            elif self.check_draw():
+                self.send_json_message("win_status", "It's a draw!")
+                self.game_over = True
+            self.current_player = "X"
+            self.send_board_state()
+        elif self.game_mode == 2 and not self.game_over:
+            self.handle_ai_vs_ai()
+        return self.output
+
+
+def as_int(value):
+    # ArduinoJson converts missing or non-numeric values to 0 and truncates floats.
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    return 0
+
+
+class EmulatorLink:
+    # Paces and garbles bytes like a serial wire. PtyEmulator and TcpEmulator each add the transport
+    # and a serve() loop, which start() runs on a background thread. There is no loop:// variant:
+    # pyserial's loop:// echoes a client's writes back to that same client, so it has no far end
+    # for the firmware to sit on. socket:// (TcpEmulator.url) is the URL form to use instead.
+    def __init__(self, firmware=None, baud_rate=9600, boot_delay=BOOT_DELAY, max_stable_baud=None):
+        self.firmware = firmware or TicTacToeFirmware()
+        # A paced link boots at baud_rate, like a sketch built with that Serial.begin rate.
+        self.paced = bool(baud_rate)
+        if baud_rate:
+            self.firmware.default_baud_rate = baud_rate
+        self.max_stable_baud = max_stable_baud
+        self.noise = random.Random()
+        self.set_wire_rate(baud_rate)
+        self.boot_delay = boot_delay
+        self.buffer = bytearray()
+        self.receive_clock = 0.0
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def set_wire_rate(self, baud_rate):
+        self.wire_rate = baud_rate
+        self.byte_time = 10.0 / baud_rate if self.paced and baud_rate else 0.0
+
+    def host_baud_rate(self):
+        return None
+
+    def garble(self, data):
+        if not self.paced:
+            return data
+        host_rate = self.host_baud_rate()
+        if host_rate is not None and host_rate != self.wire_rate:
+            # A receiver clocked at the wrong rate decodes noise. Delimiters survive so
+            # that the sketch still sees one bad line per command, as its read timeout gives.
+            return bytes(byte if byte in (0x00, 0x0A) else self.noise.randrange(0x80, 0x100) for byte in data)
+        if self.max_stable_baud and self.wire_rate > self.max_stable_baud:
+            return bytes(byte ^ 0x20 if byte not in (0x00, 0x0A) and self.noise.random() < UNSTABLE_ERROR_RATE
+                         else byte for byte in data)
+        return data
+
+    def boot(self, write):
+        self.buffer.clear()
+        with self.lock:
+            lines = self.firmware.reboot()
+        self.set_wire_rate(self.firmware.baud_rate)
+        self.transmit(write, lines)
+
+    def tick(self, write):
+        with self.lock:
+            lines = self.firmware.poll()
+        self.transmit(write, lines)
+
+    def receive(self, write, data):
+        # The wire is full duplex: these bytes cross it from the moment they were written, even while
+        # the board is still sending an earlier reply. Where the buffer starts, relative to them:
+        start = max(time.monotonic(), self.receive_clock)
+        self.receive_clock = start + len(data) * self.byte_time
+        offset = -len(self.buffer)
+        self.buffer += self.garble(data)
+        while True:
+            end = self.buffer.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            # The sketch only sees the command once all of its bytes crossed the wire.
+            offset += end + 1
+            self.wait_until(start + offset * self.byte_time)
+            with self.lock:
+                lines = self.firmware.handle_line(line.decode(errors="replace"))
+            self.transmit(write, lines)
+
+    def transmit(self, write, lines):
+        data = bytearray()
+        for line in lines:
+            if isinstance(line, int):
+                # A baud change: everything queued before it leaves at the old rate.
+                self.send(write, data)
+                data = bytearray()
+                self.set_wire_rate(line)
+            else:
+                # JSON lines are text; binary frames arrive already delimited.
+                data += line if isinstance(line, bytes) else line.encode() + b"\r\n"
+        self.send(write, data)
+
+    def send(self, write, data):
+        if not data:
+            return
+        data = self.garble(bytes(data))
+        if not self.byte_time:
+            write(data)
+            return
+        chunk = max(1, int(PACING_INTERVAL / self.byte_time))
+        deadline = time.monotonic()
+        for start in range(0, len(data), chunk):
+            piece = data[start:start + chunk]
+            write(piece)
+            deadline += len(piece) * self.byte_time
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def wait_until(self, moment):
+        delay = moment - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PtyEmulator(EmulatorLink):
+    def __init__(self, firmware=None, baud_rate=9600, boot_delay=BOOT_DELAY, max_stable_baud=None):
+        super().__init__(firmware, baud_rate, boot_delay, max_stable_baud)
+        import fcntl
+        import struct
+        import termios
+        import tty
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # Packet mode reports tcflush on the slave, which pyserial issues on open;
+        # it stands in for the DTR pulse that auto-resets a real board.
+        fcntl.ioctl(self.master, termios.TIOCPKT, struct.pack("i", 1))
+        self.flush_read = termios.TIOCPKT_FLUSHREAD
+        self.port = os.ttyname(self.slave)
+        # The client's termios speed on the slave is the rate its UART would be clocked at.
+        self.tcgetattr = termios.tcgetattr
+        self.speeds = {getattr(termios, f"B{rate}"): rate for rate in BAUD_RATES}
+
+    def host_baud_rate(self):
+        return self.speeds.get(self.tcgetattr(self.slave)[5])
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master, view)
+            view = view[written:]
+
+    def start(self):
+        # Boot before any client can open the slave, so that its open-time flush always
+        # discards this banner and the reboot banner is the first thing it reads.
+        self.boot(self.write)
+        return super().start()
+
+    def serve(self):
+        boot_at = None
+        while self.running:
+            timeout = 0.1
+            if boot_at is not None:
+                timeout = max(0.0, min(timeout, boot_at - time.monotonic()))
+            ready, _, _ = select.select([self.master], [], [], timeout)
+            if ready:
+                packet = os.read(self.master, 4096)
+                if packet[0] == 0:
+                    # Bytes sent while the board is still booting are lost, as with the bootloader.
+                    if boot_at is None:
+                        self.receive(self.write, packet[1:])
+                elif packet[0] & self.flush_read:
+                    boot_at = time.monotonic() + self.boot_delay
+            if boot_at is not None and time.monotonic() >= boot_at:
+                boot_at = None
+                self.boot(self.write)
+            elif boot_at is None:
+                self.tick(self.write)
+
+    def stop(self):
+        super().stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class TcpEmulator(EmulatorLink):
+    def __init__(self, firmware=None, baud_rate=9600, boot_delay=BOOT_DELAY, host="127.0.0.1", port=0,
+                 max_stable_baud=None):
+        super().__init__(firmware, baud_rate, boot_delay, max_stable_baud)
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.1)
+        self.url = "socket://%s:%d" % self.server.getsockname()[:2]
+
+    def serve(self):
+        while self.running:
+            try:
+                client, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            with client:
+                client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.serve_client(client)
+
+    def serve_client(self, client):
+        # Each connection behaves like opening the port: the board resets and greets again.
+        time.sleep(self.boot_delay)
+        try:
+            self.boot(client.sendall)
+            client.settimeout(0.1)
+            while self.running:
+                try:
+                    data = client.recv(4096)
+                except socket.timeout:
+                    self.tick(client.sendall)
+                    continue
+                if not data:
+                    break
+                self.receive(client.sendall, data)
+        except OSError:
+            pass
+
+    def stop(self):
+        super().stop()
+        self.server.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Emulate the INOTicTacToe firmware on a virtual serial port.")
+    parser.add_argument("--tcp", type=int, metavar="PORT", help="Serve on socket://127.0.0.1:PORT instead of a pty")
+    parser.add_argument("--baud-rate", type=int, default=9600, help="Baud rate used to pace bytes (0 for no delay)")
+    parser.add_argument("--seed", type=int, help="Seed for the random AI moves")
+    parser.add_argument("--max-stable-baud", type=int, help="Corrupt a share of the bytes above this rate")
+    parser.add_argument("--board-size", type=int, default=BOARD_SIZE, help="Emulate a sketch built with this BOARD_SIZE")
+    parser.add_argument("--win-length", type=int, help="Cells in a row that win (default: up to five)")
+    args = parser.parse_args()
+
+    firmware = TicTacToeFirmware(args.seed, board_size=args.board_size, win_length=args.win_length)
+    if args.tcp is not None:
+        emulator = TcpEmulator(firmware, args.baud_rate, port=args.tcp, max_stable_baud=args.max_stable_baud)
+        print(f"Emulator listening on {emulator.url}")
+    else:
+        emulator = PtyEmulator(firmware, args.baud_rate, max_stable_baud=args.max_stable_baud)
+        print(f"Emulator attached to {emulator.port}")
+
+    with emulator:
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+
+import array
+import collections
+import csv
+import json
+import os
+import struct
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import board_core
+from engine import BOARD_SIZE
+from board_core import ONGOING, X_WINS, O_WINS, DRAW
+
+# File layout: header, then fixed-width records, so record n sits at HEADER.size + n * record size:
+# [started_ns][duration_ms][mode][result][move count][moves ...]. Moves are cell indices,
+# row * size + col as in board_core, padded with NO_MOVE up to one byte per cell.
+MAGIC = b"TTTGAM"
+VERSION = 1
+HEADER = struct.Struct("<6sBBQ")
+NO_MOVE = 0xFF
+MAX_BOARD_SIZE = 15
+# Secondary indexes: field -> record numbers per value, plus game counts per (mode, opening, result)
+# for the analytics queries; both are kept in a sidecar file next to the log.
+INDEXED = ("result", "mode", "opening")
+INDEX_SUFFIX = ".idx"
+INDEX_CHUNK = 1 << 20
+RESULT_NAMES = {ONGOING: "unfinished", X_WINS: "X", O_WINS: "O", DRAW: "draw"}
+RESULT_CODES = {name: code for code, name in RESULT_NAMES.items()}
+FINISHED = (X_WINS, O_WINS, DRAW)
+CSV_FIELDS = ("started_ns", "duration_ms", "mode", "result", "moves")
+
+
+class Game:
+    __slots__ = ("started_ns", "duration_ms", "mode", "result", "moves")
+
+    def __init__(self, started_ns, duration_ms, mode, result, moves):
+        self.started_ns = started_ns
+        self.duration_ms = duration_ms
+        self.mode = mode
+        self.result = result
+        self.moves = tuple(moves)
+
+    @property
+    def opening(self):
+        return self.moves[0] if self.moves else NO_MOVE
+
+    def to_dict(self):
+        return {"started_ns": self.started_ns, "duration_ms": self.duration_ms, "mode": self.mode,
+                "result": RESULT_NAMES[self.result], "moves": list(self.moves)}
+
+    @classmethod
+    def from_dict(cls, document):
+        moves = document["moves"]
+        if isinstance(moves, str):
+            moves = moves.split()
+        return cls(int(document["started_ns"]), int(document["duration_ms"]), int(document["mode"]),
+                   RESULT_CODES[document["result"]], [int(move) for move in moves])
+
+    def __eq__(self, other):
+        if not isinstance(other, Game):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Game({self.to_dict()!r})"
+
+
+def opening_cells(name, size=BOARD_SIZE):
+    # "corner", "edge", "center" or a cell index, as accepted by the query options.
+    last = size - 1
+    corners = {0, last, last * size, last * size + last}
+    centers = {row * size + col for row in (last // 2, size // 2) for col in (last // 2, size // 2)}
+    if name == "corner":
+        return sorted(corners)
+    if name == "center":
+        return sorted(centers)
+    if name == "edge":
+        return sorted(cell for cell in range(size * size)
+                      if cell not in corners and (cell // size in (0, last) or cell % size in (0, last)))
+    return [int(name)]
+
+
+class GameHistory:
+    # Append-only: games are only ever added at the end, so the indexes stay sorted by record
+    # number and opening an existing file only has to index the records added since the last save.
+    def __init__(self, path, board_size=BOARD_SIZE):
+        if np is None:
+            raise ImportError("Game histories need NumPy (pip install numpy)")
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            header = self.file.read(HEADER.size)
+            if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+                self.file.close()
+                raise ValueError(f"{path} is not a game history")
+            _, self.version, board_size, self.created_ns = HEADER.unpack(header)
+        else:
+            self.version, self.created_ns = VERSION, time.time_ns()
+            self.file.write(HEADER.pack(MAGIC, VERSION, board_size, self.created_ns))
+        if not 1 <= board_size <= MAX_BOARD_SIZE:
+            self.file.close()
+            raise ValueError(f"Boards up to {MAX_BOARD_SIZE}x{MAX_BOARD_SIZE} can be stored")
+        self.board_size = board_size
+        self.cells = board_size * board_size
+        self.record = struct.Struct(f"<QIBBB{self.cells}s")
+        self.dtype = np.dtype([("started_ns", "<u8"), ("duration_ms", "<u4"), ("mode", "u1"), ("result", "u1"),
+                               ("count", "u1"), ("moves", "u1", (self.cells,))])
+        # A record torn by a crash is cut off, so the next append lands on a record boundary.
+        self.count = (self.file.seek(0, os.SEEK_END) - HEADER.size) // self.record.size
+        end = HEADER.size + self.count * self.record.size
+        if self.file.tell() != end:
+            self.file.truncate(end)
+            self.file.seek(end)
+        self.index = {field: {} for field in INDEXED}
+        self.totals = collections.Counter()
+        self.indexed = 0
+        self.load_index()
+        self.catch_up()
+
+    def __len__(self):
+        return self.count
+
+    def pack(self, game):
+        if len(game.moves) > self.cells or any(not 0 <= move < self.cells for move in game.moves):
+            raise ValueError(f"Moves do not fit a {self.board_size}x{self.board_size} board: {game.moves}")
+        moves = bytes(game.moves).ljust(self.cells, bytes((NO_MOVE,)))
+        return self.record.pack(game.started_ns, min(game.duration_ms, 0xFFFFFFFF), game.mode, game.result,
+                                len(game.moves), moves)
+
+    def unpack(self, data):
+        started_ns, duration_ms, mode, result, count, moves = self.record.unpack(data)
+        return Game(started_ns, duration_ms, mode, result, moves[:count])
+
+    def append(self, game):
+        return self.extend((game,))
+
+    def extend(self, games):
+        # One write for the whole batch, then the batch is indexed column by column.
+        data = b"".join(self.pack(game) for game in games)
+        if not data:
+            return 0
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(data)
+        self.file.flush()
+        added = len(data) // self.record.size
+        self.count += added
+        self._index_records(np.frombuffer(data, dtype=self.dtype))
+        return added
+
+    def games(self, numbers=None):
+        # Reads the given record numbers (all of them by default) without touching the rest of the file.
+        self.file.flush()
+        if numbers is None:
+            self.file.seek(HEADER.size)
+            data = self.file.read(self.count * self.record.size)
+            return [self.unpack(data[offset:offset + self.record.size])
+                    for offset in range(0, len(data), self.record.size)]
+        games = []
+        for number in numbers:
+            self.file.seek(HEADER.size + int(number) * self.record.size)
+            games.append(self.unpack(self.file.read(self.record.size)))
+        return games
+
+    def _index_records(self, records):
+        base = self.indexed
+        columns = {"result": records["result"], "mode": records["mode"], "opening": records["moves"][:, 0]}
+        for field, column in columns.items():
+            postings = self.index[field]
+            for value in np.unique(column).tolist():
+                numbers = np.flatnonzero(column == value).astype(np.uint32) + np.uint32(base)
+                postings.setdefault(value, array.array("I")).frombytes(numbers.tobytes())
+        # The three one-byte fields packed into one integer, so a single unique() groups them.
+        keys, counts = np.unique(columns["mode"].astype(np.uint32) << 16 | columns["opening"].astype(np.uint32) << 8
+                                 | columns["result"], return_counts=True)
+        self.totals.update({(key >> 16, key >> 8 & 0xFF, key & 0xFF): count
+                            for key, count in zip(keys.tolist(), counts.tolist())})
+        self.indexed += len(records)
+
+    def catch_up(self):
+        # Indexes whatever the sidecar did not cover, a chunk of records at a time.
+        self.file.flush()
+        while self.indexed < self.count:
+            count = min(INDEX_CHUNK, self.count - self.indexed)
+            records = np.fromfile(self.path, dtype=self.dtype, count=count,
+                                  offset=HEADER.size + self.indexed * self.record.size)
+            self._index_records(records)
+
+    def load_index(self):
+        try:
+            with np.load(self.index_path) as saved:
+                covered, created_ns = saved["meta"].tolist()
+                if created_ns != self.created_ns or covered > self.count:
+                    # The log was replaced or cut short; the sidecar describes another file.
+                    return False
+                index = {field: {} for field in INDEXED}
+                totals = collections.Counter({tuple(row[:-1]): row[-1] for row in saved["totals"].tolist()})
+                for key in saved.files:
+                    if ":" in key:
+                        field, value = key.split(":")
+                        index[field][int(value)] = array.array("I", saved[key].astype(np.uint32).tobytes())
+        except (OSError, ValueError, KeyError):
+            return False
+        self.index = index
+        self.totals = totals
+        self.indexed = covered
+        return True
+
+    def save_index(self):
+        arrays = {f"{field}:{value}": np.frombuffer(numbers, dtype=np.uint32)
+                  for field, postings in self.index.items() for value, numbers in postings.items()}
+        arrays["meta"] = np.array([self.indexed, self.created_ns], dtype=np.uint64)
+        arrays["totals"] = np.array([key + (count,) for key, count in self.totals.items()], dtype=np.int64).reshape(-1, 4)
+        # Written aside and renamed, like the metrics export, so a crash leaves the old sidecar intact.
+        temporary = f"{self.index_path}.tmp"
+        with open(temporary, "wb") as output:
+            np.savez(output, **arrays)
+        os.replace(temporary, self.index_path)
+
+    def postings(self, field, value):
+        numbers = self.index[field].get(value)
+        return np.frombuffer(numbers, dtype=np.uint32) if numbers else np.empty(0, dtype=np.uint32)
+
+    def select(self, result=None, mode=None, opening=None):
+        # Record numbers matching every given filter; each filter is a value or a collection of values.
+        groups = []
+        for field, wanted in (("result", result), ("mode", mode), ("opening", opening)):
+            if wanted is not None:
+                values = [wanted] if isinstance(wanted, int) else list(wanted)
+                groups.append([self.postings(field, value) for value in values])
+        if not groups:
+            return np.arange(self.count, dtype=np.uint32)
+        groups.sort(key=lambda group: sum(map(len, group)))
+        first = groups[0]
+        selected = first[0] if len(first) == 1 else np.sort(np.concatenate(first))
+        for group in groups[1:]:
+            if not len(selected):
+                break
+            # Marking the group's records in a bitmap and reading it back at the selected numbers is
+            # linear in the lists involved; merging or sorting them is not.
+            members = np.zeros(self.count, dtype=bool)
+            for numbers in group:
+                members[numbers] = True
+            selected = selected[members[selected]]
+        return selected
+
+    def count_games(self, result=None, mode=None, opening=None):
+        # Answered from the totals, so counting never touches the record numbers.
+        wanted = [None if value is None else {value} if isinstance(value, int) else set(value)
+                  for value in (mode, opening, result)]
+        return sum(count for key, count in self.totals.items()
+                   if all(values is None or field in values for field, values in zip(key, wanted)))
+
+    def win_rates(self, mode=None, opening=None):
+        # Share of finished games won by X, won by O and drawn; None when no game matches.
+        counts = {result: self.count_games(result=result, mode=mode, opening=opening) for result in FINISHED}
+        total = sum(counts.values())
+        if not total:
+            return None
+        return {RESULT_NAMES[result]: count / total for result, count in counts.items()}
+
+    def export(self, path, numbers=None):
+        # The format follows the extension: .csv, anything else is one JSON document per line.
+        games = self.games(numbers)
+        with open(path, "w", encoding="utf-8", newline="") as output:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(output, CSV_FIELDS)
+                writer.writeheader()
+                for game in games:
+                    row = game.to_dict()
+                    row["moves"] = " ".join(map(str, game.moves))
+                    writer.writerow(row)
+            else:
+                for game in games:
+                    output.write(json.dumps(game.to_dict(), separators=(",", ":")) + "\n")
+        return len(games)
+
+    def import_file(self, path):
+        # Takes an export (.csv or JSON lines) or another history file with the same board size.
+        with open(path, "rb") as source:
+            magic = source.read(len(MAGIC))
+        if magic == MAGIC:
+            other = GameHistory(path)
+            try:
+                if other.board_size != self.board_size:
+                    raise ValueError(f"{path} holds {other.board_size}x{other.board_size} games")
+                return self.extend(other.games())
+            finally:
+                other.close(save=False)
+        with open(path, encoding="utf-8", newline="") as source:
+            if path.endswith(".csv"):
+                return self.extend(Game.from_dict(row) for row in csv.DictReader(source))
+            return self.extend(Game.from_dict(json.loads(line)) for line in source if line.strip())
+
+    def close(self, save=True):
+        if self.file is None:
+            return
+        if save:
+            self.save_index()
+        self.file.close()
+        self.file = None
+
+
+class GameRecorder:
+    # Rebuilds games from the message stream: the moves are read off consecutive boards,
+    # the result off win_status, and a game is stored once its final board has arrived.
+    def __init__(self, history, mode=0):
+        self.history = history
+        self.geometry = board_core.get_geometry(history.board_size)
+        self.mode = mode
+        self.aliases = {}
+        self.cells = None
+        self.moves = []
+        self.started_ns = None
+        self.result = None
+        self.stored = 0
+
+    def set_mode(self, mode, reported=None):
+        # For modes the board does not know (the host AI), the mode it reports back stands for this one.
+        self.mode = mode
+        self.aliases = {reported: mode} if reported is not None and reported != mode else {}
+
+    def observe(self, message):
+        kind = message.get("type")
+        if kind == "board":
+            self.on_board(message.get("board"))
+        elif kind == "win_status":
+            self.on_result(message.get("message"))
+        elif kind == "game_mode":
+            self.finish()
+            reported = str(message.get("message")).split()[-1]
+            if reported.isdigit():
+                self.mode = self.aliases.get(int(reported), int(reported))
+        elif kind == "game_status":
+            self.finish()
+
+    def on_board(self, board):
+        if not isinstance(board, list) or len(board) != self.history.board_size:
+            return
+        try:
+            cells = self.geometry.encode(board)
+        except ValueError:
+            return
+        if self.cells is not None and (self.cells[self.cells != board_core.EMPTY]
+                                       != cells[self.cells != board_core.EMPTY]).any():
+            # Stones went away: a new game started without us hearing about it.
+            self.finish()
+            self.cells = None
+        if self.cells is None:
+            self.cells = cells
+            # Joined mid-game; without its start the game cannot be stored.
+            self.moves = None if cells.any() else []
+            return
+        added = np.flatnonzero(cells != self.cells).tolist()
+        self.cells = cells
+        if self.moves is None or not added:
+            return
+        if self.started_ns is None:
+            self.started_ns = time.time_ns()
+        # Several moves between two boards (a move and the board's reply) alternate, X first.
+        by_player = {board_core.X: [], board_core.O: []}
+        for cell in added:
+            by_player[int(cells[cell])].append(cell)
+        player = board_core.X if len(self.moves) % 2 == 0 else board_core.O
+        while by_player[board_core.X] or by_player[board_core.O]:
+            if by_player[player]:
+                self.moves.append(by_player[player].pop(0))
+            player = board_core.O if player == board_core.X else board_core.X
+        if self.result is not None and self.geometry.status(cells[None])[0] == self.result:
+            self.finish()
+
+    def on_result(self, text):
+        text = str(text)
+        if "draw" in text.lower():
+            self.result = DRAW
+        elif "X" in text.split():
+            self.result = X_WINS
+        elif "O" in text.split():
+            self.result = O_WINS
+        else:
+            return
+        # The board announces the result before it sends the final board.
+        if self.cells is not None and self.geometry.status(self.cells[None])[0] == self.result:
+            self.finish()
+
+    def finish(self):
+        if self.moves:
+            duration_ms = (time.time_ns() - self.started_ns) // 1_000_000
+            self.history.append(Game(self.started_ns, duration_ms, self.mode, self.result or ONGOING, self.moves))
+            self.stored += 1
+        self.moves = []
+        self.started_ns = None
+        self.result = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query and convert a game history written by the GUI's --games option.")
+    parser.add_argument("history", help="Game history file")
+    parser.add_argument("--mode", type=int, help="Only games played in this mode")
+    parser.add_argument("--opening", help="Only games opened on this cell: corner, edge, center or a cell index")
+    parser.add_argument("--result", choices=sorted(RESULT_CODES), help="Only games with this result")
+    parser.add_argument("--export", metavar="FILE", help="Write the selected games to FILE (.csv or JSON lines)")
+    parser.add_argument("--import", dest="import_path", metavar="FILE",
+                        help="Append the games in FILE (.csv, JSON lines or another history) first")
+    parser.add_argument("--board-size", type=int, default=BOARD_SIZE,
+                        help="Board size for a new history file")
+    args = parser.parse_args()
+
+    history = GameHistory(args.history, args.board_size)
+    try:
+        if args.import_path:
+            print(f"Imported {history.import_file(args.import_path)} games")
+        opening = opening_cells(args.opening, history.board_size) if args.opening else None
+        result = RESULT_CODES[args.result] if args.result else None
+        selected = history.select(result, args.mode, opening)
+        print(f"{len(selected)} of {len(history)} games")
+        rates = history.win_rates(args.mode, opening) if result is None else None
+        if rates:
+            print("  ".join(f"{name}: {rate:.1%}" for name, rate in rates.items()))
+        if args.export:
+            print(f"Exported {history.export(args.export, selected)} games to {args.export}")
+    finally:
+        history.close()
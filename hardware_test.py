@@ -6,174 +6,209 @@ import json
 import time
 import logging
 
-logging.basicConfig(filename="test_results.log", level=logging.INFO, format="%(asctime)s - %(message)s")
+READY_TIMEOUT = 3.0
+RESPONSE_TIMEOUT = 3.0
+AI_GAME_TIMEOUT = 10.0
+POLL_INTERVAL = 0.05
+READY_MESSAGE = "TicTacToe Game Started"
+END_OF_MOVE = ("board", "error")
+# The sketch's DEFAULT_BAUD_RATE and BAUD_ERROR_LIMIT.
+DEFAULT_BAUD_RATE = 9600
+BAUD_ERROR_LIMIT = 3
+FAST_BAUD_RATE = 19200
+
 
 class TicTacToeArduinoTests(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.ser = serial.Serial(cls.SERIAL_PORT, cls.BAUD_RATE, timeout=1)
-        time.sleep(2)
+        cls.ser = serial.serial_for_url(cls.SERIAL_PORT, cls.BAUD_RATE, timeout=POLL_INTERVAL)
+        cls.pending = b""
+        cls.wait_for_ready()
 
     @classmethod
     def tearDownClass(cls):
         cls.ser.close()
 
-    def send_game_command(self, command_dict):
-        self.ser.write((json.dumps(command_dict) + '\n').encode())
-        time.sleep(0.5)
+    @classmethod
+    def wait_for_ready(cls):
+        # Opening the port resets the board; it is ready once it announces itself.
+        deadline = time.monotonic() + READY_TIMEOUT
+        while True:
+            response = cls.read_game_response(deadline)
+            if response is None:
+                logging.info("No startup message from the board, continuing without handshake.")
+                return
+            if response.get("type") == "info" and response.get("message") == READY_MESSAGE:
+                return
 
-    def receive_game_response(self):
-        if self.ser.in_waiting > 0:
-            line = self.ser.readline().decode().strip()
+    @classmethod
+    def read_game_response(cls, deadline):
+        while time.monotonic() < deadline:
+            cls.pending += cls.ser.readline()
+            if not cls.pending.endswith(b"\n"):
+                continue
+            line = cls.pending.decode(errors="replace").strip()
+            cls.pending = b""
             try:
-                return json.loads(line)
+                response = json.loads(line)
             except json.JSONDecodeError:
-                return None
+                continue
+            if isinstance(response, dict):
+                return response
         return None
 
+    def setUp(self):
+        # MODE 0 resets the game, so every test starts from an empty user vs user board.
+        self.request({"command": "MODE", "mode": 0}, "board")
+
+    def send_game_command(self, command_dict):
+        self.ser.write((json.dumps(command_dict) + '\n').encode())
+
+    def request(self, command_dict, until, timeout=RESPONSE_TIMEOUT):
+        if isinstance(until, str):
+            until = (until,)
+        self.send_game_command(command_dict)
+        deadline = time.monotonic() + timeout
+        responses = []
+        while True:
+            response = self.read_game_response(deadline)
+            if response is None:
+                self.fail(f"Timed out waiting for {'/'.join(until)} after {command_dict}, got {responses}")
+            responses.append(response)
+            if response.get("type") in until:
+                return responses
+
+    def play(self, moves):
+        responses = []
+        for row, col in moves:
+            responses = self.request({"command": "MOVE", "row": row, "col": col}, END_OF_MOVE)
+            self.assertEqual(responses[-1]["type"], "board")
+        return responses
+
     def test_initialize_board(self):
-        self.send_game_command({"command": "RESET"})
-        response1 = self.receive_game_response()
-        response2 = self.receive_game_response()
-        self.assertIsNotNone(response2)
-        if response2["type"] == "game_status":
-            self.assertEqual(response2["message"], "Game reset.")
-            response2 = self.receive_game_response()
-        self.assertEqual(response2["type"], "board")
-        board_state = response2.get("board", [])
+        responses = self.request({"command": "RESET"}, "board")
+        self.assertEqual([response["type"] for response in responses], ["game_status", "board"])
+        self.assertEqual(responses[0]["message"], "Game reset.")
+        board_state = responses[1].get("board", [])
         for row in board_state:
             for cell in row:
                 self.assertEqual(cell, " ")
         logging.info("test_initialize_board passed.")
 
     def test_make_valid_move(self):
-        self.send_game_command({"command": "RESET"})
-        self.receive_game_response()
-        self.receive_game_response()
+        self.request({"command": "RESET"}, "board")
 
-        self.send_game_command({"command": "MOVE", "row": 0, "col": 0})
-        response = self.receive_game_response()
+        response = self.request({"command": "MOVE", "row": 0, "col": 0}, END_OF_MOVE)[-1]
         self.assertEqual(response["type"], "board")
         board_state = response.get("board", [])
         self.assertEqual(board_state[0][0], "X")
         logging.info("test_make_valid_move passed.")
 
     def test_make_invalid_move(self):
-        self.send_game_command({"command": "RESET"})
-        self.receive_game_response()
-        self.receive_game_response()
+        self.request({"command": "RESET"}, "board")
 
-        self.send_game_command({"command": "MOVE", "row": 0, "col": 0})
-        self.receive_game_response()
+        self.request({"command": "MOVE", "row": 0, "col": 0}, END_OF_MOVE)
 
-        self.send_game_command({"command": "MOVE", "row": 0, "col": 0})
-        response = self.receive_game_response()
-        self.assertIsNotNone(response)
-        if response["type"] == "error":
-            self.assertEqual(response["message"], "Invalid move.")
-        else:
-            self.assertEqual(response["type"], "board")
+        response = self.request({"command": "MOVE", "row": 0, "col": 0}, END_OF_MOVE)[-1]
+        self.assertEqual(response["type"], "error")
+        self.assertEqual(response["message"], "Invalid move.")
         logging.info("test_make_invalid_move passed.")
 
     def test_check_win(self):
-        self.send_game_command({"command": "RESET"})
-        self.receive_game_response()
-        self.receive_game_response()
-
-        moves = [(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)]
-        for row, col in moves:
-            self.send_game_command({"command": "MOVE", "row": row, "col": col})
-            self.receive_game_response()
+        self.request({"command": "RESET"}, "board")
 
-        response = self.receive_game_response()
+        responses = self.play([(0, 0), (1, 0), (0, 1), (1, 1), (0, 2)])
+        response = responses[0]
         self.assertEqual(response["type"], "win_status")
         self.assertEqual(response["message"], "Player X wins!")
         logging.info("test_check_win passed.")
 
     def test_draw(self):
-        self.send_game_command({"command": "RESET"})
-        self.receive_game_response()
-        self.receive_game_response()
+        self.request({"command": "RESET"}, "board")
 
         moves = [
             (0, 0), (0, 1), (0, 2),
             (1, 1), (1, 0), (1, 2),
             (2, 1), (2, 0), (2, 2)
         ]
-        for row, col in moves:
-            self.send_game_command({"command": "MOVE", "row": row, "col": col})
-            self.receive_game_response()
-
-        response = self.receive_game_response()
+        responses = self.play(moves)
+        response = responses[0]
         self.assertEqual(response["type"], "win_status")
         self.assertEqual(response["message"], "It's a draw!")
         logging.info("test_draw passed.")
 
     def test_game_mode_switch(self):
-        self.send_game_command({"command": "MODE", "mode": 1})
-        responses = {"game_mode": False, "game_status": False, "board": False}
-        for _ in range(5):
-            response = self.receive_game_response()
-            if response:
-                response_type = response["type"]
-                if response_type == "game_mode":
-                    responses["game_mode"] = True
-                    self.assertIn("Game mode set to 1", response["message"])
-                elif response_type == "game_status":
-                    responses["game_status"] = True
-                    self.assertEqual(response["message"], "Game reset.")
-
-                if all(responses.values()):
-                    break
-
-        self.send_game_command({"command": "MODE", "mode": 2})
-        responses = {"game_mode": False, "game_status": False, "board": False}
-
-        for _ in range(5):
-            response = self.receive_game_response()
-            if response:
-                response_type = response["type"]
-                if response_type == "game_mode":
-                    responses["game_mode"] = True
-                    self.assertIn("Game mode set to 2", response["message"])
-                elif response_type == "game_status":
-                    responses["game_status"] = True
-                    self.assertEqual(response["message"], "Game reset.")
-                elif response_type == "board":
-                    responses["board"] = True
-                    board_state = response["board"]
-                    for row in board_state:
-                        for cell in row:
-                            self.assertEqual(cell, " ")
-                if all(responses.values()):
-                    break
+        responses = self.request({"command": "MODE", "mode": 1}, "board")
+        self.assertEqual([response["type"] for response in responses], ["game_mode", "game_status", "board"])
+        self.assertIn("Game mode set to 1", responses[0]["message"])
+        self.assertEqual(responses[1]["message"], "Game reset.")
+
+        responses = self.request({"command": "MODE", "mode": 2}, "win_status", AI_GAME_TIMEOUT)
+        self.assertEqual([response["type"] for response in responses[:3]], ["game_mode", "game_status", "board"])
+        self.assertIn("Game mode set to 2", responses[0]["message"])
+        self.assertEqual(responses[1]["message"], "Game reset.")
+        for row in responses[2]["board"]:
+            for cell in row:
+                self.assertEqual(cell, " ")
         logging.info("test_game_mode_switch passed.")
 
     def test_handle_ai_vs_ai(self):
-        self.send_game_command({"command": "MODE", "mode": 2})
-        self.receive_game_response()
-        self.receive_game_response()
-
-        while True:
-            response = self.receive_game_response()
-            if response and response["type"] == "win_status":
-                self.assertIn(response["message"], ["Player X wins!", "Player O wins!", "It's a draw!"])
-                break
+        response = self.request({"command": "MODE", "mode": 2}, "win_status", AI_GAME_TIMEOUT)[-1]
+        self.assertIn(response["message"], ["Player X wins!", "Player O wins!", "It's a draw!"])
         logging.info("test_handle_ai_vs_ai passed.")
 
+    def test_garbled_lines_fall_back_to_default_rate(self):
+        if self.BAUD_RATE != DEFAULT_BAUD_RATE:
+            self.skipTest(f"the board falls back to {DEFAULT_BAUD_RATE}, not to {self.BAUD_RATE}")
+        response = self.request({"command": "BAUD", "rate": FAST_BAUD_RATE}, ("baud", "error"))[-1]
+        if response["type"] == "error":
+            self.skipTest(response["message"])
+        self.ser.flush()
+        self.ser.baudrate = FAST_BAUD_RATE
+        response = self.request({"command": "BAUD", "rate": FAST_BAUD_RATE, "confirm": True}, "baud")[-1]
+        self.assertEqual(response["message"], f"Confirmed {FAST_BAUD_RATE}")
+
+        # Lines the board cannot parse; the last one makes it give up the confirmed rate.
+        for _ in range(BAUD_ERROR_LIMIT):
+            self.ser.write(b"garbled\n")
+        self.ser.flush()
+        self.ser.baudrate = DEFAULT_BAUD_RATE
+        deadline = time.monotonic() + RESPONSE_TIMEOUT
+        response = self.read_game_response(deadline)
+        self.assertIsNotNone(response, "No reply at the default rate after garbled lines")
+        self.assertEqual(response, {"type": "baud", "message": f"Reverted to {DEFAULT_BAUD_RATE}"})
+        self.assertEqual(self.request({"command": "RESET"}, "board")[-1]["type"], "board")
+        logging.info("test_garbled_lines_fall_back_to_default_rate passed.")
+
 
 if __name__ == '__main__':
     import argparse
     import sys
 
     parser = argparse.ArgumentParser(description="Run TicTacToe Arduino tests.")
-    parser.add_argument('serial_port', type=str, help='Serial port for Arduino connection (e.g., COM6)')
-    parser.add_argument('baud_rate', type=int, help='Baud rate for Arduino connection (e.g., 9600)')
+    parser.add_argument('serial_port', type=str, nargs='?', help='Serial port or URL for Arduino connection (e.g., COM6, or socket://127.0.0.1:7878 through serial_mux.py)')
+    parser.add_argument('baud_rate', type=int, nargs='?', default=9600, help='Baud rate for Arduino connection (e.g., 9600)')
+    parser.add_argument('--emulate', action='store_true', help='Run against the firmware emulator on a pty')
+    parser.add_argument('--no-delay', action='store_true', help='Do not pace emulator bytes at the baud rate')
     args = parser.parse_args()
+    # Only a run of this script logs to the file; importers such as board_pool keep their own logging.
+    logging.basicConfig(filename="test_results.log", level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    emulator = None
+    if args.emulate:
+        from firmware_emulator import PtyEmulator
+        emulator = PtyEmulator(baud_rate=0 if args.no_delay else args.baud_rate).start()
+        args.serial_port = emulator.port
+    elif not args.serial_port:
+        parser.error("serial_port is required unless --emulate is given")
 
     TicTacToeArduinoTests.SERIAL_PORT = args.serial_port
     TicTacToeArduinoTests.BAUD_RATE = args.baud_rate
 
     sys.argv = sys.argv[:1]
 
-    unittest.main(argv=sys.argv)
+    try:
+        unittest.main(argv=sys.argv)
+    finally:
+        if emulator:
+            emulator.stop()
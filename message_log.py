@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import logging
+import logging.handlers
+
+LOG_CAPACITY = 500
+HISTORY_MAX_BYTES = 1024 * 1024
+HISTORY_BACKUP_COUNT = 5
+
+
+class MessageLog:
+    # The message pane of both front ends: a bounded ring of lines, written to the Tk text
+    # widget once per frame, with an optional rotating file that keeps the full history.
+    def __init__(self, text, capacity=LOG_CAPACITY, history_path=None):
+        self.text = text
+        self.capacity = capacity
+        self.lines = collections.deque(maxlen=capacity)
+        self.pending = []
+        self.shown = 0
+        self.history = None
+        if history_path:
+            handler = logging.handlers.RotatingFileHandler(history_path, maxBytes=HISTORY_MAX_BYTES,
+                                                           backupCount=HISTORY_BACKUP_COUNT, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+            self.history = logging.getLogger(f"{__name__}.history.{id(self)}")
+            self.history.propagate = False
+            self.history.addHandler(handler)
+            self.history.setLevel(logging.INFO)
+
+    def write(self, line):
+        self.pending.append(line.replace("\n", " "))
+
+    def flush(self):
+        if not self.pending:
+            return False
+        if self.history:
+            for line in self.pending:
+                self.history.info(line)
+        # Lines that would be trimmed in the same frame are never inserted.
+        batch = self.pending[-self.capacity:]
+        self.pending = []
+        self.lines.extend(batch)
+        self.text.insert("end", "\n".join(batch) + "\n")
+        self.shown += len(batch)
+        overflow = self.shown - self.capacity
+        if overflow > 0:
+            self.text.delete("1.0", f"{overflow + 1}.0")
+            self.shown = self.capacity
+        self.text.see("end")
+        return True
+
+    def close(self):
+        if self.history:
+            for handler in list(self.history.handlers):
+                handler.close()
+                self.history.removeHandler(handler)
+            self.history = None
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import json
+from operator import itemgetter
+
+try:
+    import orjson
+    _loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    _loads = json.loads
+    JSON_BACKEND = "json"
+
+# The sketch and the emulator both print boards in this exact compact form.
+BOARD_TEMPLATE = '{"type":"board","board":[["%s","%s","%s"],["%s","%s","%s"],["%s","%s","%s"]]}'
+BOARD_SKELETON = BOARD_TEMPLATE % ((" ",) * 9)
+BOARD_OFFSETS = [index for index, char in enumerate(BOARD_TEMPLATE % (("\0",) * 9)) if char == "\0"]
+_BOARD_ROWS = [itemgetter(*BOARD_OFFSETS[row * 3:row * 3 + 3]) for row in range(3)]
+_MISSING = object()
+
+
+class Message:
+    # Typed messages still answer the dict-style lookups the rest of the client uses.
+    __slots__ = ()
+    type = None
+    fields = ()
+
+    def get(self, key, default=None):
+        if key == "type":
+            return self.type
+        if key in self.fields:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key == "type" or key in self.fields
+
+    def to_dict(self):
+        document = {"type": self.type}
+        for field in self.fields:
+            document[field] = getattr(self, field)
+        return document
+
+    def __eq__(self, other):
+        if isinstance(other, Message):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class BoardMessage(Message):
+    __slots__ = ("board",)
+    type = "board"
+    fields = ("board",)
+
+    def __init__(self, board):
+        self.board = board
+
+
+class TextMessage(Message):
+    __slots__ = ("message",)
+    fields = ("message",)
+
+    def __init__(self, message):
+        self.message = message
+
+
+class InfoMessage(TextMessage):
+    __slots__ = ()
+    type = "info"
+
+
+class WinStatusMessage(TextMessage):
+    __slots__ = ()
+    type = "win_status"
+
+
+class GameStatusMessage(TextMessage):
+    __slots__ = ()
+    type = "game_status"
+
+
+class GameModeMessage(TextMessage):
+    __slots__ = ()
+    type = "game_mode"
+
+
+class ErrorMessage(TextMessage):
+    __slots__ = ()
+    type = "error"
+
+
+class ProtoMessage(TextMessage):
+    __slots__ = ()
+    type = "proto"
+
+
+class EchoMessage(TextMessage):
+    __slots__ = ()
+    type = "echo"
+
+
+class BaudMessage(TextMessage):
+    __slots__ = ()
+    type = "baud"
+
+
+class RawMessage(Message):
+    # Anything outside the schema keeps its decoded document untouched.
+    __slots__ = ("document",)
+
+    def __init__(self, document):
+        self.document = document
+
+    @property
+    def type(self):
+        return self.document.get("type")
+
+    def get(self, key, default=None):
+        return self.document.get(key, default)
+
+    def __contains__(self, key):
+        return key in self.document
+
+    def to_dict(self):
+        return dict(self.document)
+
+
+MESSAGE_CLASSES = {cls.type: cls for cls in (BoardMessage, InfoMessage, WinStatusMessage, GameStatusMessage,
+                                             GameModeMessage, ErrorMessage, ProtoMessage, EchoMessage, BaudMessage)}
+
+
+def from_dict(document):
+    if not isinstance(document, dict):
+        return "Error: Invalid message received"
+    cls = MESSAGE_CLASSES.get(document.get("type"))
+    if cls is not None and len(document) == len(cls.fields) + 1:
+        try:
+            return cls(*map(document.__getitem__, cls.fields))
+        except KeyError:
+            pass
+    return RawMessage(document)
+
+
+def decode_line(line):
+    # Fast path: a board line is fixed-shape, so blanking X and O must leave the empty
+    # board exactly, and the cells can then be read from fixed offsets.
+    if len(line) == len(BOARD_SKELETON) and line.replace("X", " ").replace("O", " ") == BOARD_SKELETON:
+        first, second, third = _BOARD_ROWS
+        return BoardMessage([list(first(line)), list(second(line)), list(third(line))])
+    try:
+        document = _loads(line)
+    except ValueError:
+        return "Error: Invalid JSON received"
+    return from_dict(document)
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import json
+import os
+import threading
+
+# Seconds; tuned for per-frame and per-message work in the client.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.016, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    # For metrics updated from one thread only: += on an attribute is a read and a write, which is
+    # safe there and costs a fraction of taking a lock on every message.
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class SharedCounter(Counter):
+    # For counters bumped from several threads, e.g. commands sent from the GUI and from baud negotiation.
+    __slots__ = ("lock",)
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the quantile; None past the last bucket or when empty.
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+
+class Family:
+    # One metric per label value, created on first use.
+    __slots__ = ("factory", "children")
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.children = {}
+
+    def labels(self, value):
+        child = self.children.get(value)
+        if child is None:
+            # setdefault is atomic, so two threads adding the same label end up with one child.
+            child = self.children.setdefault(value, self.factory())
+        return child
+
+    def inc(self, value, amount=1):
+        self.labels(value).inc(amount)
+
+
+class MetricsRegistry:
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, name, kind, help_text, metric, label=None):
+        with self.lock:
+            entry = self.metrics.get(name)
+            if entry is None:
+                entry = self.metrics[name] = (kind, help_text, label, metric)
+            return entry[3]
+
+    def counter(self, name, help_text="", shared=False):
+        return self._register(name, "counter", help_text, SharedCounter() if shared else Counter())
+
+    def gauge(self, name, help_text=""):
+        return self._register(name, "gauge", help_text, Gauge())
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        return self._register(name, "histogram", help_text, Histogram(buckets))
+
+    def counter_family(self, name, help_text="", label="type", shared=False):
+        return self._register(name, "counter", help_text, Family(SharedCounter if shared else Counter), label)
+
+    def histogram_family(self, name, help_text="", label="type", buckets=LATENCY_BUCKETS):
+        return self._register(name, "histogram", help_text, Family(lambda: Histogram(buckets)), label)
+
+    def _series(self):
+        # Yields (name, kind, help, labels, metric) for every concrete series.
+        with self.lock:
+            entries = list(self.metrics.items())
+        for name, (kind, help_text, label, metric) in entries:
+            if isinstance(metric, Family):
+                for value, child in list(metric.children.items()):
+                    yield name, kind, help_text, {label: str(value)}, child
+            else:
+                yield name, kind, help_text, {}, metric
+
+    def value(self, name):
+        # Total of a counter or gauge across its label values.
+        entry = self.metrics.get(name)
+        if entry is None:
+            return 0
+        metric = entry[3]
+        if isinstance(metric, Family):
+            return sum(child.value for child in list(metric.children.values()))
+        return metric.value
+
+    def get(self, name):
+        entry = self.metrics.get(name)
+        return entry[3] if entry else None
+
+    def snapshot(self):
+        snapshot = {}
+        for name, kind, _, labels, metric in self._series():
+            if kind == "histogram":
+                data = {
+                    "count": metric.count,
+                    "sum": metric.sum,
+                    "p50": metric.quantile(0.5),
+                    "p95": metric.quantile(0.95),
+                    "p99": metric.quantile(0.99),
+                }
+            else:
+                data = {"value": metric.value}
+            if labels:
+                data["labels"] = labels
+            snapshot.setdefault(name, []).append(data)
+        return snapshot
+
+    def render_text(self):
+        lines = []
+        for name, kind, _, labels, metric in self._series():
+            series = name + _format_labels(labels)
+            if kind == "histogram":
+                p95 = metric.quantile(0.95)
+                lines.append(f"{series} count={metric.count} sum={metric.sum:.6f} "
+                             f"p95={'-' if p95 is None else f'<={p95}'}")
+            else:
+                lines.append(f"{series} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def render_prometheus(self):
+        lines = []
+        described = set()
+        for name, kind, help_text, labels, metric in self._series():
+            if name not in described:
+                described.add(name)
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ("+Inf",), metric.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(dict(labels, le=str(bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # The format follows the extension: .json, .txt, anything else is Prometheus text.
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        elif path.endswith(".txt"):
+            content = self.render_text()
+        else:
+            content = self.render_prometheus()
+        # Written aside and renamed, so a scraper never reads half a file.
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as output:
+            output.write(content)
+        os.replace(temporary, path)
+
+
+class _NullMetric:
+    __slots__ = ()
+    value = 0
+    count = 0
+
+    def inc(self, *args):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def labels(self, value):
+        return self
+
+    def quantile(self, fraction):
+        return None
+
+
+class NullRegistry:
+    # Hands out one shared no-op metric, so disabled instrumentation costs a bare method call.
+    enabled = False
+    _metric = _NullMetric()
+
+    def counter(self, name, help_text="", shared=False):
+        return self._metric
+
+    def gauge(self, name, help_text=""):
+        return self._metric
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        return self._metric
+
+    def counter_family(self, name, help_text="", label="type", shared=False):
+        return self._metric
+
+    def histogram_family(self, name, help_text="", label="type", buckets=LATENCY_BUCKETS):
+        return self._metric
+
+    def value(self, name):
+        return 0
+
+    def get(self, name):
+        return None
+
+    def snapshot(self):
+        return {}
+
+    def render_text(self):
+        return ""
+
+    def render_prometheus(self):
+        return ""
+
+    def export(self, path):
+        pass
+
+
+NULL_REGISTRY = NullRegistry()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+import serial.tools.list_ports
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+DEBOUNCE = 0.5
+POLL_INTERVAL = 1.0
+# Where there is no device directory to watch, the ports are fully re-enumerated this often.
+RESCAN_INTERVAL = 5.0
+DEVICE_DIR = "/dev"
+DEVICE_PREFIXES = ("ttyACM", "ttyUSB", "ttyAMA", "ttyS", "rfcomm", "cu.", "tty.")
+PIN_PREFIX = "sn:"
+
+
+class PortInfo:
+    __slots__ = ("device", "vid", "pid", "serial_number", "description")
+
+    def __init__(self, device, vid=None, pid=None, serial_number=None, description=None):
+        self.device = device
+        self.vid = vid
+        self.pid = pid
+        self.serial_number = serial_number
+        self.description = description
+
+    @classmethod
+    def from_listing(cls, port):
+        description = port.description if port.description not in (None, "", "n/a", port.device) else None
+        return cls(port.device, port.vid, port.pid, port.serial_number, description)
+
+    def key(self):
+        return self.device, self.vid, self.pid, self.serial_number, self.description
+
+    @property
+    def label(self):
+        details = []
+        if self.vid is not None and self.pid is not None:
+            details.append(f"{self.vid:04X}:{self.pid:04X}")
+        if self.serial_number:
+            details.append(f"SN {self.serial_number}")
+        label = self.device
+        if self.description:
+            label += f" - {self.description}"
+        if details:
+            label += f" ({', '.join(details)})"
+        return label
+
+    def __repr__(self):
+        return f"PortInfo({self.label!r})"
+
+
+class PortRegistry:
+    # Enumerates on a background thread and re-enumerates only when the set of device
+    # nodes changes, so the UI reads a cached list and never waits on a scan.
+    def __init__(self, list_ports=serial.tools.list_ports.comports, debounce=DEBOUNCE,
+                 poll_interval=POLL_INTERVAL, device_dir=DEVICE_DIR, use_udev=True):
+        self.list_ports = list_ports
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.device_dir = device_dir
+        self.use_udev = use_udev and pyudev is not None
+        self.lock = threading.Lock()
+        self.ports = []
+        self.version = 0
+        self.scans = 0
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.poll_interval + self.debounce + 1)
+            self.thread = None
+
+    def refresh(self):
+        # Enumerates on the calling thread; returns True if the list changed.
+        ports = sorted((PortInfo.from_listing(port) for port in self.list_ports()), key=lambda port: port.device)
+        with self.lock:
+            self.scans += 1
+            changed = [port.key() for port in ports] != [port.key() for port in self.ports]
+            if changed:
+                self.ports = ports
+                self.version += 1
+        self.ready.set()
+        return changed
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, list(self.ports)
+
+    def find(self, serial_number):
+        with self.lock:
+            for port in self.ports:
+                if port.serial_number == serial_number:
+                    return port
+        return None
+
+    def resolve(self, name):
+        # "sn:<serial number>" pins a board wherever it enumerates; anything else is a path.
+        if name.startswith(PIN_PREFIX):
+            port = self.find(name[len(PIN_PREFIX):])
+            return port.device if port else None
+        return name
+
+    def run(self):
+        self.refresh()
+        if self.use_udev:
+            try:
+                self._watch_udev()
+                return
+            except Exception:
+                # No netlink access (containers, some sandboxes): polling the device directory still works.
+                pass
+        try:
+            self._watch_device_dir()
+        except Exception:
+            # Watching is best effort; the cached list stays usable and refresh() still works.
+            self.ready.set()
+
+    def _signature(self):
+        try:
+            names = os.listdir(self.device_dir)
+        except OSError:
+            return None
+        return sorted(name for name in names if name.startswith(DEVICE_PREFIXES))
+
+    def _watch_device_dir(self):
+        signature = self._signature()
+        scanned_at = time.monotonic()
+        while not self.stopped.wait(self.poll_interval):
+            current = self._signature()
+            if current is None:
+                if time.monotonic() - scanned_at >= RESCAN_INTERVAL:
+                    self.refresh()
+                    scanned_at = time.monotonic()
+                continue
+            if current == signature:
+                continue
+            # A board resetting or re-enumerating adds and removes nodes in quick succession;
+            # wait until the directory holds still before paying for a scan.
+            while not self.stopped.wait(self.debounce):
+                settled = self._signature()
+                if settled == current:
+                    break
+                current = settled
+            signature = current
+            self.refresh()
+            scanned_at = time.monotonic()
+
+    def _watch_udev(self):
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by(subsystem="tty")
+        monitor.start()
+        while not self.stopped.is_set():
+            if monitor.poll(timeout=self.poll_interval) is None:
+                continue
+            while not self.stopped.is_set() and monitor.poll(timeout=self.debounce) is not None:
+                pass
+            self.refresh()
+
+
+class PortPicker:
+    # Keeps a port combobox in step with a registry. poll() runs on the UI thread and only
+    # touches the widget when the registry's version moved.
+    def __init__(self, combobox, variable, registry, pinned=None):
+        self.combobox = combobox
+        self.variable = variable
+        self.registry = registry
+        self.pinned = pinned
+        self.version = None
+        self.devices = {}
+
+    def selected(self):
+        value = self.variable.get()
+        return self.devices.get(value, value)
+
+    def target(self):
+        # What to open: the pin itself when the pinned board is selected, so that a reconnect
+        # finds the board again even if it comes back on another device node.
+        device = self.selected()
+        if self.pinned:
+            port = self.registry.find(self.pinned)
+            if port and port.device == device:
+                return PIN_PREFIX + self.pinned
+        return device
+
+    def poll(self):
+        version, ports = self.registry.snapshot()
+        if version == self.version:
+            return False
+        self.version = version
+        current = self.selected()
+        # A typed-in URL such as socket://host:port is not a listed port and is kept as it is.
+        choice = current if current not in self.devices.values() else ""
+        self.devices = {port.label: port.device for port in ports}
+        self.combobox.config(values=list(self.devices))
+        for port in ports:
+            if self.pinned and port.serial_number == self.pinned:
+                choice = port.label
+                break
+            if port.device == current:
+                choice = port.label
+        self.variable.set(choice)
+        return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List serial ports and watch for boards being plugged in.")
+    parser.add_argument("--watch", action="store_true", help="Keep printing the list whenever it changes")
+    args = parser.parse_args()
+
+    registry = PortRegistry()
+    registry.refresh()
+    version, ports = registry.snapshot()
+    for port in ports:
+        print(port.label)
+    if args.watch:
+        registry.start()
+        try:
+            while True:
+                time.sleep(0.2)
+                latest, ports = registry.snapshot()
+                if latest != version:
+                    version = latest
+                    print(f"--- {time.strftime('%H:%M:%S')}")
+                    for port in ports:
+                        print(port.label)
+        except KeyboardInterrupt:
+            registry.stop()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from uart_core import UARTCommunication, DEFAULT_BAUD_RATE
+from messages import Message, InfoMessage
+from metrics import NULL_REGISTRY
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7878
+# A subscriber this far behind is disconnected rather than slowing everyone else down.
+MAX_BACKLOG = 256 * 1024
+# pyserial's socket:// discards whatever already arrived when it opens, so greet a moment later,
+# as the emulator's boot delay does.
+GREETING_DELAY = 0.05
+# The multiplexer owns the link settings; clients that try to change them get these replies.
+PROTO_REPLY = {"type": "proto", "message": "json"}
+BAUD_REPLY = {"type": "error", "message": "Baud rate is set by the multiplexer."}
+
+log = logging.getLogger(__name__)
+
+
+def encode(document):
+    # Compact separators keep board lines on the clients' fixed-shape fast path.
+    return (json.dumps(document, separators=(",", ":")) + "\n").encode()
+
+
+class _LoopQueue:
+    # Stands in for UARTCommunication.messages, handing what the reader thread puts over to the event loop.
+    def __init__(self, loop, callback):
+        self.loop = loop
+        self.callback = callback
+
+    def put(self, item):
+        self.loop.call_soon_threadsafe(self.callback, item)
+
+
+class SerialMux:
+    # Owns the port through UARTCommunication and shares it: every message from the board is sent to
+    # every subscriber, and their commands go through the one writer queue, so they never interleave.
+    def __init__(self, port, baud_rate=DEFAULT_BAUD_RATE, host=DEFAULT_HOST, tcp_port=DEFAULT_PORT, unix_path=None,
+                 metrics=None):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.host = host
+        self.tcp_port = tcp_port
+        self.unix_path = unix_path
+        self.uart = UARTCommunication(metrics)
+        self.metrics = metrics or NULL_REGISTRY
+        self.subscribers = set()
+        self.handlers = set()
+        self.servers = []
+        self.greeting = None
+        self.closing = False
+        self.loop = None
+        self.task = None
+        self.url = None
+        self.ready = threading.Event()
+        self.broadcasts = self.metrics.counter("mux_broadcasts_total", "Board messages sent to subscribers")
+        self.slow_subscribers = self.metrics.counter("mux_slow_subscribers_total",
+                                                     "Subscribers dropped for falling behind")
+        self.subscriber_gauge = self.metrics.gauge("mux_subscribers", "Connected subscribers")
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        status = await self.loop.run_in_executor(None, self.uart.open_port, self.port, self.baud_rate)
+        if not status.startswith("Connected"):
+            raise ConnectionError(status)
+        self.uart.messages = _LoopQueue(self.loop, self.on_board_message)
+        self.uart.start_reader()
+        self.uart.start_writer()
+        self.uart.writer.on_status = _LoopQueue(self.loop, self.on_link_status).put
+        if self.tcp_port is not None:
+            server = await asyncio.start_server(self.serve_client, self.host, self.tcp_port)
+            self.servers.append(server)
+            self.url = "socket://%s:%d" % server.sockets[0].getsockname()[:2]
+        if self.unix_path:
+            if os.path.exists(self.unix_path):
+                os.unlink(self.unix_path)
+            self.servers.append(await asyncio.start_unix_server(self.serve_client, self.unix_path))
+        self.ready.set()
+        return status
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    async def stop(self):
+        self.closing = True
+        for server in self.servers:
+            server.close()
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        # Closed subscribers read end-of-stream, so their handlers finish by themselves.
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        for server in self.servers:
+            await server.wait_closed()
+        self.servers = []
+        self.uart.stop_writer()
+        self.uart.stop_reader()
+        if self.uart.ser:
+            await self.loop.run_in_executor(None, self.uart.ser.close)
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    def broadcast(self, data):
+        for subscriber in list(self.subscribers):
+            if subscriber.transport.get_write_buffer_size() > MAX_BACKLOG:
+                self.slow_subscribers.inc()
+                self.drop(subscriber)
+                continue
+            subscriber.write(data)
+
+    def drop(self, subscriber):
+        self.subscribers.discard(subscriber)
+        self.subscriber_gauge.set(len(self.subscribers))
+        subscriber.close()
+
+    def on_board_message(self, message):
+        if not isinstance(message, Message):
+            # Garbled lines stay here; subscribers only ever see well-formed messages.
+            if not self.closing:
+                log.warning("Board: %s", message)
+            return
+        data = encode(message.to_dict())
+        if isinstance(message, InfoMessage):
+            # The board only announces itself after a reset; late subscribers get the announcement too.
+            self.greeting = data
+        self.broadcasts.inc()
+        self.broadcast(data)
+
+    def on_link_status(self, text):
+        log.warning("Link: %s", text)
+        self.broadcast(encode({"type": "info", "message": text}))
+
+    def forward(self, line, subscriber):
+        try:
+            command = json.loads(line)
+        except ValueError:
+            command = None
+        if isinstance(command, dict):
+            if command.get("command") == "PROTO":
+                subscriber.write(encode(PROTO_REPLY))
+                return
+            if command.get("command") == "BAUD":
+                subscriber.write(encode(BAUD_REPLY))
+                return
+        # Anything else goes to the board as it came, so the board answers bad commands itself.
+        if not self.uart.writer.put(line.rstrip(b"\r\n") + b"\n"):
+            subscriber.write(encode({"type": "error", "message": "Multiplexer write queue full."}))
+
+    def shutdown(self):
+        # Thread-safe: ends serve_forever in whichever task called start().
+        self.loop.call_soon_threadsafe(self.task.cancel)
+
+    async def serve_client(self, reader, writer):
+        self.handlers.add(asyncio.current_task())
+        self.subscribers.add(writer)
+        self.subscriber_gauge.set(len(self.subscribers))
+        try:
+            if self.greeting:
+                await asyncio.sleep(GREETING_DELAY)
+                writer.write(self.greeting)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    self.forward(line, writer)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            if writer in self.subscribers:
+                self.drop(writer)
+            self.handlers.discard(asyncio.current_task())
+
+
+def run_in_thread(mux):
+    # Runs the multiplexer on its own event loop; returns once it is serving.
+    errors = []
+
+    def main():
+        async def serve():
+            try:
+                await mux.start()
+            except Exception as e:
+                errors.append(e)
+                mux.ready.set()
+                return
+            try:
+                await mux.serve_forever()
+            except asyncio.CancelledError:
+                pass
+            finally:
+                await mux.stop()
+
+        asyncio.run(serve())
+
+    thread = threading.Thread(target=main, daemon=True)
+    thread.start()
+    mux.ready.wait()
+    if errors:
+        raise errors[0]
+    return thread
+
+
+def stop_thread(mux, thread, timeout=5):
+    mux.shutdown()
+    thread.join(timeout)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Share one board between several clients over TCP or a Unix socket.")
+    parser.add_argument("serial_port", help="Port or URL of the board, e.g. /dev/ttyACM0")
+    parser.add_argument("--baud-rate", type=int, default=DEFAULT_BAUD_RATE)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port clients connect to (-1 for none)")
+    parser.add_argument("--unix", metavar="PATH", help="Also listen on this Unix socket")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    mux = SerialMux(args.serial_port, args.baud_rate, args.host, None if args.port < 0 else args.port, args.unix)
+
+    async def main():
+        status = await mux.start()
+        log.info("%s; clients connect to %s", status, mux.url or mux.unix_path)
+        try:
+            await mux.serve_forever()
+        finally:
+            await mux.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
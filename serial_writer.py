@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+
+from metrics import NULL_REGISTRY
+
+WRITE_QUEUE_SIZE = 64
+# Queued commands are at most a few dozen bytes; a batch this size still fits a USB packet or two.
+MAX_BATCH_BYTES = 256
+BLOCK_TIMEOUT = 1.0
+RECONNECT_INITIAL = 0.25
+RECONNECT_MAX = 8.0
+DROP = "drop"
+BLOCK = "block"
+POLICIES = (DROP, BLOCK)
+
+
+class SerialWriter(threading.Thread):
+    # Owns every write to the port. Callers only enqueue, so a stalled or vanished device
+    # never blocks them; whatever is queued goes out in one write per batch.
+    def __init__(self, ser, reopen=None, capacity=WRITE_QUEUE_SIZE, policy=DROP, block_timeout=BLOCK_TIMEOUT,
+                 on_status=None, metrics=NULL_REGISTRY):
+        super().__init__(daemon=True)
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}")
+        self.ser = ser
+        self.reopen = reopen
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_status = on_status
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.busy = False
+        self.lost = None
+        self.reconnecting = False
+        self.running = True
+        self.dropped = 0
+        self.batches = metrics.counter("serial_write_batches_total", "Writes issued by the writer thread")
+        # The same series UARTCommunication counts direct writes in; here only what reached the port counts.
+        self.bytes_sent = metrics.counter("serial_bytes_sent_total", "Bytes written to the port", shared=True)
+        self.commands_sent = metrics.counter_family("serial_commands_sent_total", "Commands sent, by command",
+                                                    label="command", shared=True)
+        self.drops = metrics.counter("serial_writes_dropped_total", "Commands refused because the write queue was full",
+                                     shared=True)
+        self.reconnects = metrics.counter("serial_reconnects_total", "Times the port was reopened after a failure")
+
+    def put(self, data, command=None):
+        # Returns False if the queue stayed full (after waiting, under the block policy). command names
+        # the data in serial_commands_sent_total once it has been written.
+        with self.condition:
+            if len(self.pending) >= self.capacity:
+                if self.policy == BLOCK:
+                    self.condition.wait_for(lambda: len(self.pending) < self.capacity or not self.running,
+                                            self.block_timeout)
+                if len(self.pending) >= self.capacity or not self.running:
+                    self.dropped += 1
+                    self.drops.inc()
+                    return False
+            self.pending.append((bytes(data), command))
+            self.condition.notify_all()
+            return True
+
+    def drain(self, timeout=None):
+        # Waits until everything queued so far has been written.
+        with self.condition:
+            return self.condition.wait_for(lambda: not (self.pending or self.busy), timeout)
+
+    def connection_lost(self, error):
+        # Lets the reader report a dead port before anything is written to it.
+        with self.condition:
+            if self.lost is None:
+                self.lost = error
+            self.condition.notify_all()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def _status(self, text):
+        if self.on_status:
+            self.on_status(text)
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.lost is not None or not self.running)
+                if not self.running:
+                    return
+                error, self.lost = self.lost, None
+                batch = bytearray()
+                entries = []
+                if error is None:
+                    # Coalesce whatever has queued up into a single write.
+                    while self.pending and (not batch or len(batch) + len(self.pending[0][0]) <= MAX_BATCH_BYTES):
+                        entry = self.pending.popleft()
+                        batch += entry[0]
+                        entries.append(entry)
+                    self.busy = True
+            if error is None:
+                try:
+                    self.ser.write(batch)
+                    self.batches.inc()
+                    self.bytes_sent.inc(len(batch))
+                    for _, command in entries:
+                        if command is not None:
+                            self.commands_sent.inc(command)
+                except Exception as e:
+                    error = e
+                    with self.condition:
+                        # The failed batch goes out first once the port is back.
+                        self.pending.extendleft(reversed(entries))
+                finally:
+                    with self.condition:
+                        self.busy = False
+                        self.condition.notify_all()
+            if error is not None and not self._reconnect(error):
+                return
+
+    def _reconnect(self, error):
+        if self.reopen is None:
+            with self.condition:
+                self.running = False
+                self.pending.clear()
+                self.condition.notify_all()
+            self._status(f"Error: {error}")
+            return False
+        self.reconnecting = True
+        self._status(f"Connection lost: {error}; reconnecting")
+        delay = RECONNECT_INITIAL
+        try:
+            while True:
+                with self.condition:
+                    if self.condition.wait_for(lambda: not self.running, delay):
+                        return False
+                try:
+                    self.ser = self.reopen()
+                except Exception:
+                    delay = min(delay * 2, RECONNECT_MAX)
+                    continue
+                break
+        finally:
+            self.reconnecting = False
+        with self.condition:
+            # Anything the dead port's reader reported while we were reopening is stale.
+            self.lost = None
+            queued = len(self.pending)
+        self.reconnects.inc()
+        self._status(f"Reconnected; replaying {queued} queued command(s)")
+        return True
+
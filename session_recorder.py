@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+# File layout: header, then records of [timestamp_ns][direction][length][data ...].
+# Timestamps are monotonic nanoseconds since the recording started; a session appended to an
+# existing recording carries on from its last timestamp, so they never go backwards.
+MAGIC = b"TTTCAP"
+VERSION = 1
+HEADER = struct.Struct("<6sBQ")
+RECORD = struct.Struct("<QBI")
+RX = 0
+TX = 1
+DIRECTIONS = {RX: "RX", TX: "TX"}
+FLUSH_INTERVAL = 0.5
+
+
+class SessionRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        elapsed = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # Raises ValueError for anything that is not a recording, before a byte is written to it.
+            end, elapsed = recording_end(path)
+            self.file = open(path, "r+b")
+            # A torn record left by a crash would hide everything appended after it.
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(HEADER.pack(MAGIC, VERSION, time.time_ns()))
+        self.started = time.monotonic_ns() - elapsed
+        self.flushed_at = time.monotonic()
+        self.records = 0
+
+    def record(self, direction, data):
+        if not data:
+            return
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(RECORD.pack(time.monotonic_ns() - self.started, direction, len(data)))
+            self.file.write(data)
+            self.records += 1
+            # A crash loses at most the last interval; a torn record at the end is skipped on replay.
+            now = time.monotonic()
+            if now - self.flushed_at >= FLUSH_INTERVAL:
+                self.file.flush()
+                self.flushed_at = now
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class RecordingSerial:
+    # Wraps an open port and records every byte that crosses it; anything else is passed through.
+    def __init__(self, ser, recorder):
+        self.ser = ser
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    @property
+    def baudrate(self):
+        return self.ser.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self.ser.baudrate = value
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.recorder.record(RX, data)
+        return data
+
+    def readline(self, *args):
+        data = self.ser.readline(*args)
+        self.recorder.record(RX, data)
+        return data
+
+    def readinto(self, buffer):
+        count = self.ser.readinto(buffer)
+        if count:
+            self.recorder.record(RX, bytes(memoryview(buffer)[:count]))
+        return count
+
+    def write(self, data):
+        written = self.ser.write(data)
+        self.recorder.record(TX, bytes(data))
+        return written
+
+
+class Capture:
+    # Memory-mapped view of a recording, so captures far larger than RAM can be walked.
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"{path} is empty")
+        if len(self.map) < HEADER.size or self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a session recording")
+        _, self.version, self.started_ns = HEADER.unpack_from(self.map)
+        self.view = memoryview(self.map)
+
+    def records(self):
+        # Yields (timestamp_ns, direction, data); data is a zero-copy slice of the map.
+        offset = HEADER.size
+        end = len(self.map)
+        while offset + RECORD.size <= end:
+            timestamp, direction, length = RECORD.unpack_from(self.map, offset)
+            start = offset + RECORD.size
+            if start + length > end:
+                return
+            offset = start + length
+            yield timestamp, direction, self.view[start:offset]
+
+    def close(self):
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            # A caller still holds a record; the map is unmapped once that is collected.
+            pass
+        self.file.close()
+
+
+class ReplaySerial:
+    # Stands in for the port: the recorded RX bytes come back out of read and readline,
+    # either on their original schedule or as fast as they are asked for. Writes are dropped.
+    def __init__(self, path, realtime=False, timeout=1):
+        self.capture = Capture(path)
+        self.records = self.capture.records()
+        self.realtime = realtime
+        self.timeout = timeout
+        self.pending = b""
+        self.next_record = None
+        self.started = time.monotonic_ns()
+        self.is_open = True
+        self.baudrate = 9600
+
+    def _load(self, block):
+        # Moves the next due RX record into pending; returns False if none is due yet.
+        while True:
+            if self.next_record is None:
+                self.next_record = next(self.records, None)
+                if self.next_record is None:
+                    return False
+            timestamp, direction, data = self.next_record
+            if direction != RX:
+                self.next_record = None
+                continue
+            if self.realtime:
+                wait = (timestamp - (time.monotonic_ns() - self.started)) / 1e9
+                if wait > 0:
+                    if not block:
+                        return False
+                    # Waits at most one read timeout, like a real port.
+                    time.sleep(min(wait, self.timeout))
+                    block = False
+                    continue
+            self.pending = data
+            self.next_record = None
+            return True
+
+    @property
+    def in_waiting(self):
+        if not self.pending:
+            self._load(block=False)
+        return len(self.pending)
+
+    def read(self, size=1):
+        if not self.pending and not self._load(block=True):
+            if self.next_record is None and self.is_open:
+                # End of the capture: behave like an idle port whose read timed out.
+                time.sleep(self.timeout)
+            return b""
+        data = bytes(self.pending[:size])
+        self.pending = self.pending[size:]
+        return data
+
+    def readline(self):
+        line = bytearray()
+        while not line.endswith(b"\n"):
+            if not self.pending and not self._load(block=True):
+                break
+            end = bytes(self.pending).find(b"\n")
+            size = len(self.pending) if end < 0 else end + 1
+            line += self.pending[:size]
+            self.pending = self.pending[size:]
+        return bytes(line)
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            self.pending = b""
+            self.next_record = None
+            self.records.close()
+            self.capture.close()
+
+
+def recording_end(path):
+    # Offset just past the last whole record, and that record's timestamp.
+    capture = Capture(path)
+    try:
+        end, last = HEADER.size, 0
+        for timestamp, _, data in capture.records():
+            end += RECORD.size + len(data)
+            last = timestamp
+            data.release()
+        return end, last
+    finally:
+        capture.close()
+
+
+def summarize(path):
+    capture = Capture(path)
+    try:
+        counts = {RX: 0, TX: 0}
+        sizes = {RX: 0, TX: 0}
+        last = 0
+        for timestamp, direction, data in capture.records():
+            counts[direction] = counts.get(direction, 0) + 1
+            sizes[direction] = sizes.get(direction, 0) + len(data)
+            last = timestamp
+        return {
+            "started": capture.started_ns / 1e9,
+            "seconds": last / 1e9,
+            "rx_records": counts[RX],
+            "rx_bytes": sizes[RX],
+            "tx_records": counts[TX],
+            "tx_bytes": sizes[TX],
+        }
+    finally:
+        capture.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import datetime
+
+    parser = argparse.ArgumentParser(description="Inspect a recorded serial session.")
+    parser.add_argument("capture", help="Recording written by the GUI's --record option")
+    parser.add_argument("--dump", action="store_true", help="Print every record")
+    args = parser.parse_args()
+
+    if args.dump:
+        capture = Capture(args.capture)
+        try:
+            for timestamp, direction, data in capture.records():
+                print(f"{timestamp / 1e9:12.6f} {DIRECTIONS.get(direction, '??')} {bytes(data)!r}")
+        finally:
+            capture.close()
+    summary = summarize(args.capture)
+    started = datetime.datetime.fromtimestamp(summary["started"]).isoformat(timespec="seconds")
+    print(f"Recorded {started}, {summary['seconds']:.3f} s: "
+          f"RX {summary['rx_records']} records / {summary['rx_bytes']} bytes, "
+          f"TX {summary['tx_records']} records / {summary['tx_bytes']} bytes")
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import random
+import time
+
+import engine
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RESULTS = ("X", "O", "draw")
+DEFAULT_BATCH = 5000
+
+
+class RandomAgent:
+    # Same rejection sampling as aiMoveRandom in the sketch.
+    def move(self, x_mask, o_mask, ply, rng):
+        occupied = x_mask | o_mask
+        while True:
+            cell = rng.randrange(9)
+            if not occupied >> cell & 1:
+                return cell
+
+
+class SolverAgent:
+    def __init__(self):
+        self.table = engine.get_engine().table
+
+    def move(self, x_mask, o_mask, ply, rng):
+        return self.table[engine.position_key(x_mask, o_mask)][1]
+
+
+class ScriptedAgent:
+    # Plays its scripted cells while they are free, then hands over to the fallback agent.
+    def __init__(self, cells, fallback):
+        self.cells = cells
+        self.fallback = fallback
+
+    def move(self, x_mask, o_mask, ply, rng):
+        turn = ply // 2
+        if turn < len(self.cells) and not (x_mask | o_mask) >> self.cells[turn] & 1:
+            return self.cells[turn]
+        return self.fallback.move(x_mask, o_mask, ply, rng)
+
+
+def make_agent(spec):
+    # "random", "solver" or "scripted:4,0[:fallback]" with cells numbered row * 3 + col.
+    name, _, rest = spec.partition(":")
+    if name == "random":
+        return RandomAgent()
+    if name == "solver":
+        return SolverAgent()
+    if name == "scripted":
+        cells, _, fallback = rest.partition(":")
+        return ScriptedAgent([int(cell) for cell in cells.split(",") if cell], make_agent(fallback or "random"))
+    raise ValueError(f"Unknown agent: {spec}")
+
+
+def play_game(agent_x, agent_o, rng):
+    x_mask = o_mask = 0
+    for ply in range(9):
+        if ply % 2 == 0:
+            x_mask |= 1 << agent_x.move(x_mask, o_mask, ply, rng)
+            if engine.is_win(x_mask):
+                return "X", ply + 1
+        else:
+            o_mask |= 1 << agent_o.move(x_mask, o_mask, ply, rng)
+            if engine.is_win(o_mask):
+                return "O", ply + 1
+    return "draw", 9
+
+
+def play_batch(job):
+    x_spec, o_spec, games, seed = job
+    agent_x, agent_o = make_agent(x_spec), make_agent(o_spec)
+    rng = random.Random(seed)
+    counts = dict.fromkeys(RESULTS, 0)
+    moves = 0
+    for _ in range(games):
+        result, length = play_game(agent_x, agent_o, rng)
+        counts[result] += 1
+        moves += length
+    return counts, moves
+
+
+def _vector_moves(spec, x_masks, o_masks, ply, rng, best_moves):
+    name, _, rest = spec.partition(":")
+    occupied = x_masks | o_masks
+    empty = ((occupied[:, None] >> np.arange(9)) & 1) == 0
+    if name == "random":
+        # Uniform over the empty cells, the distribution the rejection loop converges to.
+        scores = np.where(empty, rng.random((len(occupied), 9)), -1.0)
+        return scores.argmax(axis=1)
+    if name == "solver":
+        return best_moves[x_masks | (o_masks << 9)].astype(np.int64)
+    if name == "scripted":
+        cells, _, fallback = rest.partition(":")
+        cells = [int(cell) for cell in cells.split(",") if cell]
+        moves = _vector_moves(fallback or "random", x_masks, o_masks, ply, rng, best_moves)
+        if ply // 2 < len(cells):
+            cell = cells[ply // 2]
+            moves = np.where(empty[:, cell], cell, moves)
+        return moves
+    raise ValueError(f"Unknown agent: {spec}")
+
+
+def play_vectorized(x_spec, o_spec, games, seed):
+    if np is None:
+        raise RuntimeError("The vectorized mode needs NumPy")
+    rng = np.random.default_rng(seed)
+    best_moves = np.zeros(1 << 18, dtype=np.int8)
+    for key, (_, move) in engine.get_engine().table.items():
+        best_moves[key] = max(move, 0)
+    lines = np.array(engine.WIN_MASKS, dtype=np.int64)
+
+    x_masks = np.zeros(games, dtype=np.int64)
+    o_masks = np.zeros(games, dtype=np.int64)
+    results = np.full(games, 2, dtype=np.int8)
+    lengths = np.full(games, 9, dtype=np.int64)
+    active = np.ones(games, dtype=bool)
+    for ply in range(9):
+        index = np.flatnonzero(active)
+        if not len(index):
+            break
+        spec = x_spec if ply % 2 == 0 else o_spec
+        moves = _vector_moves(spec, x_masks[index], o_masks[index], ply, rng, best_moves)
+        masks = x_masks if ply % 2 == 0 else o_masks
+        masks[index] |= np.left_shift(1, moves)
+        won = ((masks[index, None] & lines) == lines).any(axis=1)
+        finished = index[won]
+        results[finished] = ply % 2
+        lengths[finished] = ply + 1
+        active[finished] = False
+
+    counts = {result: int((results == code).sum()) for code, result in enumerate(RESULTS)}
+    return counts, int(lengths.sum())
+
+
+def run(x_spec, o_spec, games, workers=None, batch_size=DEFAULT_BATCH, seed=None, vectorized=False):
+    workers = workers or os.cpu_count() or 1
+    seed = random.randrange(1 << 30) if seed is None else seed
+    sizes = [batch_size] * (games // batch_size)
+    if games % batch_size:
+        sizes.append(games % batch_size)
+    jobs = [(x_spec, o_spec, size, seed + index) for index, size in enumerate(sizes)]
+
+    engine.get_engine()
+    start = time.perf_counter()
+    if vectorized:
+        batches = [play_vectorized(*job) for job in jobs]
+        workers = 1
+    elif workers == 1:
+        batches = [play_batch(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            batches = list(pool.imap_unordered(play_batch, jobs))
+    elapsed = time.perf_counter() - start
+
+    counts = dict.fromkeys(RESULTS, 0)
+    moves = 0
+    for batch_counts, batch_moves in batches:
+        for result in RESULTS:
+            counts[result] += batch_counts[result]
+        moves += batch_moves
+    return {
+        "x": x_spec,
+        "o": o_spec,
+        "games": games,
+        "workers": workers,
+        "vectorized": vectorized,
+        "x_win_rate": counts["X"] / games,
+        "o_win_rate": counts["O"] / games,
+        "draw_rate": counts["draw"] / games,
+        "average_moves": moves / games,
+        "seconds": elapsed,
+        "games_per_second": games / elapsed,
+        "games_per_second_per_core": games / elapsed / workers,
+    }
+
+
+def print_report(report):
+    mode = "vectorized" if report["vectorized"] else f"{report['workers']} workers"
+    print(f"{report['x']} (X) vs {report['o']} (O), {report['games']:,} games, {mode}")
+    print(f"  X wins {report['x_win_rate']:.2%}  O wins {report['o_win_rate']:.2%}  "
+          f"draws {report['draw_rate']:.2%}  average length {report['average_moves']:.2f}")
+    print(f"  {report['games_per_second']:,.0f} games/s, "
+          f"{report['games_per_second_per_core']:,.0f} games/s per core ({report['seconds']:.2f} s)")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Play TicTacToe agents against each other in bulk.")
+    parser.add_argument("--x", default="random", help="Agent for X: random, solver or scripted:CELLS[:FALLBACK]")
+    parser.add_argument("--o", default="random", help="Agent for O")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--vectorized", action="store_true", help="Advance whole batches with NumPy")
+    parser.add_argument("--scaling", action="store_true", help="Also run on one worker and report scaling efficiency")
+    parser.add_argument("--json", action="store_true", help="Print the reports as JSON")
+    args = parser.parse_args()
+
+    reports = [run(args.x, args.o, args.games, args.workers, args.batch_size, args.seed, args.vectorized)]
+    if args.scaling and not args.vectorized and args.workers > 1:
+        single = run(args.x, args.o, args.games, 1, args.batch_size, args.seed)
+        reports.append(single)
+        reports[0]["scaling_efficiency"] = reports[0]["games_per_second"] / single["games_per_second"] / args.workers
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
+        if "scaling_efficiency" in reports[0]:
+            print(f"scaling efficiency on {args.workers} workers: {reports[0]['scaling_efficiency']:.0%}")
@@ -1,10 +1,62 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from GUI import UARTCommunication, send_move, set_mode, reset_game
+from uart_core import UARTCommunication, SerialReader, HostAI, send_move, set_mode, reset_game
+import uart_core
+from GUI import BoardRenderer, MessageLog, MetricsView, handle_message
+import queue
+import json
+import tempfile
+import os
+import sys
+
+from TicTacToeSWPart.uart_communicate import LineFramer
+from TicTacToeSWPart import uart_communicate
+import binary_protocol
+import engine
+import board_core
+import tablebase_gen
+import session_recorder
+import game_history
+from game_history import GameHistory, GameRecorder, Game
+import messages
+from messages import Message
+import metrics
+from metrics import MetricsRegistry, NULL_REGISTRY
+import time
+import simulate
+from board_pool import BoardPool, run_hardware_suite
+from port_registry import PortRegistry, PortPicker
+import serial
+import serial_writer
+from serial_writer import SerialWriter
+import threading
+import socket
+import subprocess
+from serial_mux import SerialMux, run_in_thread, stop_thread
+from async_uart import AsyncUARTCommunication
+import asyncio
+import random
+import re
+try:
+    import numpy as np
+except ImportError:
+    np = None
+import firmware_emulator
+from firmware_emulator import TicTacToeFirmware, TcpEmulator, PtyEmulator
 import logging
 
 logging.basicConfig(filename="test_results.log", level=logging.INFO, format="%(asctime)s - %(message)s")
 
+
+def setUpModule():
+    # HostAI, the emulator and simulate share engine.get_engine(); without this it caches under ~/.cache.
+    engine._engine = engine.Engine(cache_path=None)
+
+
+def tearDownModule():
+    engine._engine = None
+
+
 class TestUARTCommunication(unittest.TestCase):
     def setUp(self):
         self.uart = UARTCommunication()
@@ -85,6 +137,1404 @@ class TestGameCommands(unittest.TestCase):
         logging.info("test_reset_game_command passed.")
 
 
+class TestSerialReader(unittest.TestCase):
+    def setUp(self):
+        self.messages = queue.Queue()
+        self.reader = SerialReader(MagicMock(), self.messages)
+
+    def test_feed_keeps_partial_lines(self):
+        self.reader.feed(b'{"type": "info", "mess')
+        self.assertTrue(self.messages.empty())
+        self.reader.feed(b'age": "ready"}\n{"type": "error", "message": "Invalid move."}\n')
+        self.assertEqual(self.messages.get_nowait(), {"type": "info", "message": "ready"})
+        self.assertEqual(self.messages.get_nowait()["type"], "error")
+        logging.info("test_feed_keeps_partial_lines passed.")
+
+    def test_feed_reports_invalid_json(self):
+        self.reader.feed(b'Invalid JSON\n')
+        self.assertIn("Error:", self.messages.get_nowait())
+        logging.info("test_feed_reports_invalid_json passed.")
+
+    def test_run_stops_on_port_error(self):
+        self.reader.ser.in_waiting = 0
+        self.reader.ser.read.side_effect = [b'{"board": []}\n', Exception("device lost")]
+        self.reader.run()
+        self.assertEqual(self.messages.get_nowait(), {"board": []})
+        self.assertEqual(self.messages.get_nowait(), "Error: device lost")
+        logging.info("test_run_stops_on_port_error passed.")
+
+    def test_drain_messages_is_bounded(self):
+        uart = UARTCommunication()
+        for i in range(5):
+            uart.messages.put({"type": "info", "message": str(i)})
+        self.assertEqual(len(uart.drain_messages(limit=3)), 3)
+        self.assertEqual(len(uart.drain_messages()), 2)
+        self.assertEqual(uart.drain_messages(), [])
+        logging.info("test_drain_messages_is_bounded passed.")
+
+
+class TestLineFramer(unittest.TestCase):
+    def test_feed_returns_every_complete_line(self):
+        framer = LineFramer()
+        self.assertEqual(framer.feed(b"first\r\nsec"), ["first"])
+        self.assertEqual(framer.feed(b"ond\nthird\n\nfou"), ["second", "third"])
+        self.assertEqual(framer.feed(b"rth\n"), ["fourth"])
+        self.assertEqual(framer.buffer, b"")
+        logging.info("test_feed_returns_every_complete_line passed.")
+
+    def test_read_from_uses_in_waiting_only(self):
+        ser = MagicMock()
+        ser.in_waiting = 0
+        framer = LineFramer()
+        self.assertEqual(framer.read_from(ser), [])
+        ser.read.assert_not_called()
+
+        ser.in_waiting = 6
+        ser.read.return_value = b"ready\n"
+        self.assertEqual(framer.read_from(ser), ["ready"])
+        ser.read.assert_called_once_with(6)
+        logging.info("test_read_from_uses_in_waiting_only passed.")
+
+    def test_terminal_shares_the_game_link(self):
+        uart = uart_communicate.UARTCommunication()
+        self.assertIsInstance(uart, UARTCommunication)
+        self.assertIsInstance(uart.framer, uart_core.MessageFramer)
+        uart.set_baud_rate(19200)
+        self.assertEqual(uart.baud_rate, 19200)
+        self.assertEqual(uart.send_message("hello"), "Port not opened")
+        uart.ser = MagicMock(is_open=True)
+        self.assertEqual(uart.send_message("hello"), "Sent: hello")
+        uart.ser.write.assert_called_once_with(b"hello\n")
+        logging.info("test_terminal_shares_the_game_link passed.")
+
+
+class TestFirmwareEmulator(unittest.TestCase):
+    def setUp(self):
+        self.firmware = TicTacToeFirmware(seed=1)
+
+    def messages(self, command):
+        return [json.loads(line) for line in self.firmware.handle_line(json.dumps(command))]
+
+    def test_startup_message(self):
+        self.assertEqual(self.firmware.reboot(), ['{"type":"info","message":"TicTacToe Game Started"}'])
+        logging.info("test_startup_message passed.")
+
+    def test_reset_and_move(self):
+        responses = self.messages({"command": "RESET"})
+        self.assertEqual([r["type"] for r in responses], ["game_status", "board"])
+        self.assertEqual(responses[1]["board"], [[" "] * 3] * 3)
+        board = self.messages({"command": "MOVE", "row": 0, "col": 0})[0]["board"]
+        self.assertEqual(board[0][0], "X")
+        self.assertEqual(self.messages({"command": "MOVE", "row": 0, "col": 0}),
+                         [{"type": "error", "message": "Invalid move."}])
+        logging.info("test_reset_and_move passed.")
+
+    def test_win_and_draw(self):
+        for row, col in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+            self.messages({"command": "MOVE", "row": row, "col": col})
+        responses = self.messages({"command": "MOVE", "row": 0, "col": 2})
+        self.assertEqual(responses[0], {"type": "win_status", "message": "Player X wins!"})
+        self.assertEqual(responses[1]["type"], "board")
+
+        self.messages({"command": "RESET"})
+        for row, col in [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (1, 2), (2, 1), (2, 0)]:
+            self.messages({"command": "MOVE", "row": row, "col": col})
+        responses = self.messages({"command": "MOVE", "row": 2, "col": 2})
+        self.assertEqual(responses[0], {"type": "win_status", "message": "It's a draw!"})
+        logging.info("test_win_and_draw passed.")
+
+    def test_user_vs_ai_answers_every_move(self):
+        responses = self.messages({"command": "MODE", "mode": 1})
+        self.assertEqual(responses[0], {"type": "game_mode", "message": "Game mode set to 1"})
+        responses = self.messages({"command": "MOVE", "row": 1, "col": 1})
+        self.assertEqual([r["type"] for r in responses], ["board", "board"])
+        self.assertEqual(sum(row.count("O") for row in responses[1]["board"]), 1)
+        logging.info("test_user_vs_ai_answers_every_move passed.")
+
+    def test_ai_vs_ai_plays_to_the_end(self):
+        responses = self.messages({"command": "MODE", "mode": 2})
+        self.assertEqual(responses[-1]["type"], "win_status")
+        self.assertIn(responses[-1]["message"], ["Player X wins!", "Player O wins!", "It's a draw!"])
+        logging.info("test_ai_vs_ai_plays_to_the_end passed.")
+
+    def test_echo_returns_payload(self):
+        self.assertEqual(self.messages({"command": "ECHO", "data": "x" * 64}),
+                         [{"type": "echo", "message": "x" * 64}])
+        self.assertEqual(self.messages({"command": "ECHO"}), [{"type": "echo", "message": ""}])
+        logging.info("test_echo_returns_payload passed.")
+
+    def test_baud_change_reverts_without_confirmation(self):
+        now = [100.0]
+        self.firmware.clock = lambda: now[0]
+        output = self.firmware.handle_line(json.dumps({"command": "BAUD", "rate": 57600}))
+        self.assertEqual(output, ['{"type":"baud","message":"Switching to 57600"}', 57600])
+        now[0] += 2.5
+        self.assertEqual(self.firmware.poll(), [9600, '{"type":"baud","message":"Reverted to 9600"}'])
+
+        self.firmware.handle_line(json.dumps({"command": "BAUD", "rate": 57600}))
+        self.assertEqual(self.messages({"command": "BAUD", "rate": 57600, "confirm": True}),
+                         [{"type": "baud", "message": "Confirmed 57600"}])
+        now[0] += 2.5
+        self.assertEqual(self.firmware.poll(), [])
+        self.assertEqual(self.messages({"command": "BAUD", "rate": 12345}),
+                         [{"type": "error", "message": "Unsupported baud rate."}])
+        logging.info("test_baud_change_reverts_without_confirmation passed.")
+
+    def test_garbled_lines_drop_to_default_baud_rate(self):
+        self.firmware.handle_line(json.dumps({"command": "BAUD", "rate": 115200}))
+        self.firmware.handle_line(json.dumps({"command": "BAUD", "rate": 115200, "confirm": True}))
+        self.assertEqual(self.firmware.handle_line("\x9c\xf1"), [])
+        self.assertEqual(self.firmware.handle_line("\x9c\xf1"), [])
+        self.assertEqual(self.firmware.handle_line("\x9c\xf1"), [9600, '{"type":"baud","message":"Reverted to 9600"}'])
+        self.assertEqual(self.firmware.baud_rate, 9600)
+        logging.info("test_garbled_lines_drop_to_default_baud_rate passed.")
+
+    def test_sketch_counts_parse_errors_like_the_emulator(self):
+        # The emulator hides sketch bugs on this path, so check the sketch source agrees with it.
+        sketch_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "INOTicTacToe", "INOTicTacToe.ino")
+        with open(sketch_path) as sketch_file:
+            sketch = sketch_file.read()
+        constants = dict(re.findall(r"^const \w+ (\w+) = (\d+);", sketch, re.MULTILINE))
+        self.assertEqual(int(constants["BAUD_ERROR_LIMIT"]), firmware_emulator.BAUD_ERROR_LIMIT)
+        self.assertEqual(int(constants["DEFAULT_BAUD_RATE"]), firmware_emulator.DEFAULT_BAUD_RATE)
+        rates = re.search(r"BAUD_RATES\[\] = \{([\d, ]+)\}", sketch).group(1)
+        self.assertEqual(tuple(int(rate) for rate in rates.split(",")), firmware_emulator.BAUD_RATES)
+        loop = sketch[sketch.index("void loop()"):]
+        self.assertRegex(loop, r"if \(!error\) \{\s+parseErrors = 0;")
+        self.assertRegex(loop, r"\} else \{\s+countParseError\(\);\s+\}")
+        # Mode 1 on boards the tablebase does not cover falls back to random moves, as in the emulator.
+        ai_move = sketch[sketch.index("void aiMoveTablebase()"):sketch.index("void handleAiVsAi()")]
+        self.assertRegex(ai_move, r"if \(BOARD_SIZE != 3\) \{[^}]*aiMoveRandom\(\);\s+return;")
+        logging.info("test_sketch_counts_parse_errors_like_the_emulator passed.")
+
+    def test_garbage_is_ignored(self):
+        self.assertEqual(self.firmware.handle_line("Invalid JSON"), [])
+        self.assertEqual(self.firmware.handle_line('{"row": 1}'), [])
+        logging.info("test_garbage_is_ignored passed.")
+
+    def round_trip(self, port, baud_rate=9600):
+        uart = UARTCommunication()
+        self.assertEqual(uart.open_port(port, baud_rate), f"Connected to {port}")
+        try:
+            uart.start_reader()
+            self.assertEqual(uart.messages.get(timeout=2)["message"], "TicTacToe Game Started")
+            send_move(uart, 2, 2)
+            response = uart.messages.get(timeout=2)
+            while response["type"] == "info":
+                response = uart.messages.get(timeout=2)
+            self.assertEqual(response["board"][2][2], "X")
+        finally:
+            uart.stop_reader()
+            uart.ser.close()
+
+    def test_gui_client_over_socket_url(self):
+        with TcpEmulator(baud_rate=0) as emulator:
+            self.round_trip(emulator.url)
+        logging.info("test_gui_client_over_socket_url passed.")
+
+    @unittest.skipUnless(hasattr(os, "openpty"), "requires a pty")
+    def test_gui_client_over_pty(self):
+        with PtyEmulator(baud_rate=115200) as emulator:
+            self.round_trip(emulator.port, 115200)
+        logging.info("test_gui_client_over_pty passed.")
+
+
+class TestBinaryProtocol(unittest.TestCase):
+    def test_cobs_round_trip(self):
+        for data in [b"", b"\x00", b"\x00\x00", b"\x11\x22\x00\x33", bytes(range(1, 255)), bytes(range(256)) * 2]:
+            encoded = binary_protocol.cobs_encode(data)
+            self.assertNotIn(0, encoded)
+            self.assertEqual(binary_protocol.cobs_decode(encoded), data)
+        logging.info("test_cobs_round_trip passed.")
+
+    def test_board_frame_is_compact(self):
+        board = [["X", "O", " "], [" ", "X", " "], ["O", " ", "X"]]
+        frame = binary_protocol.encode_message({"type": "board", "board": board})
+        self.assertEqual(len(frame), 7)
+        self.assertEqual(binary_protocol.decode_frame(frame[:-1]), {"type": "board", "board": board})
+        logging.info("test_board_frame_is_compact passed.")
+
+    def test_payload_limit_matches_the_sketch(self):
+        sketch_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "INOTicTacToe", "INOTicTacToe.ino")
+        with open(sketch_path) as sketch_file:
+            limit = re.search(r"FRAME_MAX_PAYLOAD = (\d+);", sketch_file.read()).group(1)
+        self.assertEqual(int(limit), binary_protocol.MAX_PAYLOAD)
+        firmware = TicTacToeFirmware(seed=1)
+        firmware.handle_line(json.dumps({"command": "PROTO", "format": "binary"}))
+        frame = firmware.handle_line(json.dumps({"command": "ECHO", "data": "x" * 100}))[0]
+        self.assertEqual(binary_protocol.decode_frame(frame[:-1]), {"type": "echo", "message": "x" * int(limit)})
+        raw = bytes([binary_protocol.MESSAGE_TYPES["echo"], 60]) + b"x" * 60
+        oversized = binary_protocol.cobs_encode(raw + bytes([binary_protocol.crc8(raw)]))
+        self.assertEqual(binary_protocol.parse_frame(oversized), "Error: Invalid frame received")
+        logging.info("test_payload_limit_matches_the_sketch passed.")
+
+    def test_decoder_splits_frames_and_rejects_corruption(self):
+        frames = (binary_protocol.encode_message({"type": "win_status", "message": "Player X wins!"}) +
+                  binary_protocol.encode_message({"type": "error", "message": "Invalid move."}))
+        decoder = binary_protocol.FrameDecoder()
+        self.assertEqual(decoder.feed(frames[:5]), [])
+        messages = decoder.feed(frames[5:])
+        self.assertEqual(messages, [{"type": "win_status", "message": "Player X wins!"},
+                                    {"type": "error", "message": "Invalid move."}])
+        corrupted = bytearray(frames)
+        corrupted[3] ^= 0x01
+        self.assertEqual(decoder.feed(bytes(corrupted))[0], "Error: Invalid frame received")
+        logging.info("test_decoder_splits_frames_and_rejects_corruption passed.")
+
+    def test_negotiation_switches_to_binary(self):
+        with TcpEmulator(baud_rate=0) as emulator:
+            uart = UARTCommunication()
+            uart.open_port(emulator.url)
+            try:
+                uart.start_reader()
+                self.assertEqual(uart.negotiate_protocol("binary"), "Protocol: binary")
+                send_move(uart, 1, 1)
+                response = uart.messages.get(timeout=2)
+                while response["type"] != "board":
+                    response = uart.messages.get(timeout=2)
+                self.assertEqual(response["board"][1][1], "X")
+                self.assertEqual(uart.reader.protocol, "binary")
+            finally:
+                uart.stop_reader()
+                uart.ser.close()
+        logging.info("test_negotiation_switches_to_binary passed.")
+
+    def test_negotiation_falls_back_to_json(self):
+        uart = UARTCommunication()
+        uart.ser = MagicMock()
+        uart.ser.is_open = True
+        uart.reader = SerialReader(uart.ser, uart.messages)
+        self.assertEqual(uart.negotiate_protocol("binary", timeout=0.05), "Protocol: json (board did not switch)")
+        uart.ser.write.assert_called_with(b'{"command": "PROTO", "format": "binary"}\n')
+        logging.info("test_negotiation_falls_back_to_json passed.")
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "requires a pty")
+class TestBaudNegotiation(unittest.TestCase):
+    def setUp(self):
+        # Rates above 38400 corrupt about one byte in a hundred.
+        self.emulator = PtyEmulator(baud_rate=9600, max_stable_baud=38400).start()
+        self.uart = UARTCommunication()
+        self.uart.open_port(self.emulator.port)
+        self.uart.start_reader()
+
+    def tearDown(self):
+        self.uart.stop_reader()
+        self.uart.ser.close()
+        self.emulator.stop()
+
+    def board_after_move(self, row, col):
+        send_move(self.uart, row, col)
+        response = self.uart.messages.get(timeout=2)
+        while not isinstance(response, Message) or response.type != "board":
+            response = self.uart.messages.get(timeout=2)
+        return response["board"]
+
+    def test_settles_on_fastest_clean_rate(self):
+        self.assertEqual(self.uart.negotiate_baud(), "Baud rate: 38400")
+        self.assertEqual(self.emulator.firmware.baud_rate, 38400)
+        self.assertFalse(self.emulator.firmware.baud_pending)
+        self.assertEqual(self.board_after_move(1, 1)[1][1], "X")
+        logging.info("test_settles_on_fastest_clean_rate passed.")
+
+    def test_falls_back_when_errors_climb(self):
+        self.uart.negotiate_baud()
+        self.emulator.max_stable_baud = 19200
+        self.uart.reader.errors += 3
+        self.uart.checked_at = 0.0
+        self.assertTrue(self.uart.link_degraded())
+        self.assertEqual(self.uart.fall_back_baud(), "Baud rate: 19200 (fell back from 38400)")
+        self.assertEqual(self.emulator.firmware.baud_rate, 19200)
+        self.assertEqual(self.board_after_move(0, 0)[0][0], "X")
+        logging.info("test_falls_back_when_errors_climb passed.")
+
+
+class TestSessionRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "session.cap")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_recorded_game_replays_through_the_handlers(self):
+        with TcpEmulator(baud_rate=0) as emulator:
+            uart = UARTCommunication()
+            uart.open_port(emulator.url)
+            self.assertEqual(uart.start_recording(self.path), f"Recording to {self.path}")
+            try:
+                uart.start_reader()
+                self.assertEqual(uart.messages.get(timeout=2)["type"], "info")
+                send_move(uart, 1, 1)
+                self.assertEqual(uart.messages.get(timeout=2)["type"], "board")
+            finally:
+                uart.stop_reader()
+                uart.stop_recording()
+                uart.ser.close()
+        summary = session_recorder.summarize(self.path)
+        self.assertEqual(summary["tx_records"], 1)
+        self.assertGreater(summary["rx_bytes"], 0)
+
+        replay = UARTCommunication()
+        self.assertEqual(replay.open_replay(self.path), f"Replaying {self.path}")
+        responses = []
+        response = replay.receive_message()
+        while isinstance(response, Message):
+            responses.append(response)
+            response = replay.receive_message()
+        replay.ser.close()
+        self.assertEqual([r["type"] for r in responses], ["info", "board"])
+
+        buttons = [[MagicMock() for _ in range(3)] for _ in range(3)]
+        renderer, log = BoardRenderer(buttons), MessageLog(MagicMock())
+        for response in responses:
+            handle_message(response, renderer, log)
+        renderer.flush()
+        buttons[1][1].config.assert_called_once_with(text="X")
+        logging.info("test_recorded_game_replays_through_the_handlers passed.")
+
+    def test_replay_timing_and_torn_tail(self):
+        recorder = session_recorder.SessionRecorder(self.path)
+        recorder.record(session_recorder.RX, b'{"type": "info", "message": "first"}\n')
+        time.sleep(0.3)
+        recorder.record(session_recorder.RX, b'{"type": "info", "message": "second"}\n')
+        recorder.close()
+        with open(self.path, "ab") as capture:
+            capture.write(session_recorder.RECORD.pack(0, session_recorder.RX, 100) + b"torn")
+        self.assertEqual(session_recorder.summarize(self.path)["rx_records"], 2)
+
+        for realtime in (False, True):
+            replay = session_recorder.ReplaySerial(self.path, realtime=realtime)
+            start = time.monotonic()
+            self.assertIn(b"first", replay.readline())
+            self.assertIn(b"second", replay.readline())
+            elapsed = time.monotonic() - start
+            replay.close()
+            if realtime:
+                self.assertGreater(elapsed, 0.25)
+            else:
+                self.assertLess(elapsed, 0.1)
+        logging.info("test_replay_timing_and_torn_tail passed.")
+
+    def test_appending_continues_the_recording(self):
+        recorder = session_recorder.SessionRecorder(self.path)
+        recorder.record(session_recorder.TX, b'{"command": "RESET"}\n')
+        time.sleep(0.05)
+        recorder.record(session_recorder.RX, b'{"type": "info", "message": "first"}\n')
+        recorder.close()
+        with open(self.path, "ab") as capture:
+            capture.write(session_recorder.RECORD.pack(0, session_recorder.RX, 100) + b"torn")
+        started = session_recorder.summarize(self.path)["started"]
+
+        recorder = session_recorder.SessionRecorder(self.path)
+        recorder.record(session_recorder.RX, b'{"type": "info", "message": "second"}\n')
+        recorder.close()
+        capture = session_recorder.Capture(self.path)
+        records = [(timestamp, bytes(data)) for timestamp, _, data in capture.records()]
+        capture.close()
+        self.assertEqual(len(records), 3)
+        self.assertIn(b"second", records[2][1])
+        self.assertGreaterEqual(records[2][0], records[1][0])
+        self.assertGreater(records[1][0], 0.04e9)
+        self.assertEqual(session_recorder.summarize(self.path)["started"], started)
+
+        other = os.path.join(self.directory.name, "notes.txt")
+        with open(other, "w") as notes:
+            notes.write("not a recording")
+        with self.assertRaises(ValueError):
+            session_recorder.SessionRecorder(other)
+        with open(other) as notes:
+            self.assertEqual(notes.read(), "not a recording")
+        uart = UARTCommunication()
+        uart.ser = MagicMock(is_open=True)
+        self.assertTrue(uart.start_recording(other).startswith("Error: "))
+        logging.info("test_appending_continues_the_recording passed.")
+
+
+class TestMessages(unittest.TestCase):
+    def test_board_fast_path_matches_json(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            cells = tuple(rng.choice(" XO") for _ in range(9))
+            line = messages.BOARD_TEMPLATE % cells
+            message = messages.decode_line(line)
+            self.assertIsInstance(message, messages.BoardMessage)
+            self.assertEqual(message, json.loads(line))
+        spaced = '{"type": "board", "board": [["X", " ", " "], [" ", "O", " "], [" ", " ", " "]]}'
+        self.assertEqual(messages.decode_line(spaced).board[1][1], "O")
+        self.assertEqual(messages.decode_line(messages.BOARD_TEMPLATE % (('"',) + (" ",) * 8)),
+                         "Error: Invalid JSON received")
+        logging.info("test_board_fast_path_matches_json passed.")
+
+    def test_typed_messages_keep_dict_lookups(self):
+        message = messages.decode_line('{"type":"win_status","message":"Player X wins!"}')
+        self.assertIsInstance(message, messages.WinStatusMessage)
+        self.assertEqual((message["type"], message.get("message"), "message" in message),
+                         ("win_status", "Player X wins!", True))
+        self.assertFalse(hasattr(message, "__dict__"))
+        raw = messages.decode_line('{"type":"score","x":1}')
+        self.assertIsInstance(raw, messages.RawMessage)
+        self.assertEqual((raw.type, raw["x"], raw), ("score", 1, {"type": "score", "x": 1}))
+        self.assertEqual(messages.decode_line("[1, 2]"), "Error: Invalid message received")
+        logging.info("test_typed_messages_keep_dict_lookups passed.")
+
+    def test_dispatch_table_routes_by_type(self):
+        buttons = [[MagicMock() for _ in range(3)] for _ in range(3)]
+        renderer, log = BoardRenderer(buttons), MessageLog(MagicMock())
+        with patch("GUI.show_win_status") as show:
+            handle_message(messages.BoardMessage([["X", " ", " "], [" "] * 3, [" "] * 3]), renderer, log)
+            handle_message(messages.WinStatusMessage("Player X wins!"), renderer, log)
+            handle_message({"type": "error", "message": "Invalid move."}, renderer, log)
+            handle_message("Error: Invalid JSON received", renderer, log)
+        renderer.flush()
+        buttons[0][0].config.assert_called_once_with(text="X")
+        show.assert_called_once_with("Player X wins!")
+        self.assertEqual(log.pending, ["Game status: Player X wins!", "Game status: Invalid move.",
+                                       "Received: Error: Invalid JSON received"])
+        logging.info("test_dispatch_table_routes_by_type passed.")
+
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_and_export_formats(self):
+        registry = MetricsRegistry()
+        registry.counter("bytes_total", "Bytes").inc(5)
+        registry.counter_family("messages_total", "Messages").inc("board", 2)
+        latency = registry.histogram("latency_seconds", "Latency", buckets=(0.01, 0.1))
+        for value in (0.005, 0.05, 0.5):
+            latency.observe(value)
+        text = registry.render_prometheus()
+        self.assertIn("# TYPE bytes_total counter\nbytes_total 5", text)
+        self.assertIn('messages_total{type="board"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertEqual((latency.quantile(0.5), latency.quantile(0.99)), (0.1, None))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.json")
+            registry.export(path)
+            with open(path, encoding="utf-8") as exported:
+                snapshot = json.load(exported)
+            self.assertEqual(snapshot["messages_total"], [{"value": 2, "labels": {"type": "board"}}])
+            self.assertEqual(os.listdir(directory), ["metrics.json"])
+        logging.info("test_prometheus_and_export_formats passed.")
+
+    def test_serial_traffic_is_counted(self):
+        registry = MetricsRegistry()
+        uart = UARTCommunication(registry)
+        uart.ser = MagicMock()
+        uart.send_message({"command": "MOVE", "row": 0, "col": 0})
+        reader = SerialReader(MagicMock(), uart.messages, registry)
+        reader.ser.in_waiting = 0
+        data = b'{"type":"info","message":"ready"}\nInvalid JSON\n'
+        reader.ser.read.side_effect = [data, Exception("device lost")]
+        reader.run()
+        self.assertEqual(registry.value("serial_bytes_sent_total"), len(uart.ser.write.call_args[0][0]))
+        self.assertEqual(registry.value("serial_commands_sent_total"), 1)
+        self.assertEqual(registry.value("serial_bytes_received_total"), len(data))
+        self.assertEqual(registry.get("serial_messages_received_total").labels("info").value, 1)
+        self.assertEqual((registry.value("serial_decode_errors_total"), registry.value("serial_read_errors_total")),
+                         (1, 1))
+        self.assertEqual(registry.get("serial_decode_seconds").count, 1)
+        label = MagicMock()
+        MetricsView(label, registry).refresh(force=True)
+        self.assertIn("1 msgs", label.config.call_args[1]["text"])
+        logging.info("test_serial_traffic_is_counted passed.")
+
+    def test_shared_counters_count_every_thread(self):
+        registry = MetricsRegistry()
+        uart = UARTCommunication(registry)
+        uart.ser = MagicMock()
+        self.assertIsInstance(uart.bytes_sent, metrics.SharedCounter)
+        self.assertIsInstance(uart.commands_sent.labels("MOVE"), metrics.SharedCounter)
+        threads = [threading.Thread(target=lambda: [uart.bytes_sent.inc(3) for _ in range(20000)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.value("serial_bytes_sent_total"), 4 * 20000 * 3)
+
+        # Polling without a reader is counted apart from the reader thread.
+        uart.ser.in_waiting = 1
+        uart.ser.readline.return_value = b'{"type":"info","message":"ready"}\n'
+        uart.receive_message()
+        self.assertEqual(registry.value("serial_polled_messages_received_total"), 1)
+        self.assertEqual(registry.value("serial_messages_received_total"), 0)
+        SerialReader(MagicMock(), uart.messages, registry).feed(b'{"type":"info","message":"ready"}\n')
+        self.assertEqual(registry.value("serial_messages_received_total"), 1)
+        logging.info("test_shared_counters_count_every_thread passed.")
+
+    def test_disabled_metrics_record_nothing(self):
+        uart = UARTCommunication()
+        self.assertIs(uart.metrics, NULL_REGISTRY)
+        uart.ser = MagicMock()
+        uart.send_message({"command": "RESET"})
+        SerialReader(MagicMock(), uart.messages).feed(b'{"type":"info","message":"ready"}\n')
+        self.assertEqual((uart.metrics.snapshot(), uart.metrics.value("serial_bytes_sent_total")), ({}, 0))
+        logging.info("test_disabled_metrics_record_nothing passed.")
+
+
+class TestBoardRenderer(unittest.TestCase):
+    def setUp(self):
+        self.buttons = [[MagicMock() for _ in range(3)] for _ in range(3)]
+        self.renderer = BoardRenderer(self.buttons)
+
+    def test_only_changed_cells_are_touched(self):
+        self.renderer.submit([["X", " ", " "], [" ", " ", " "], [" ", " ", " "]])
+        self.assertTrue(self.renderer.flush())
+        self.buttons[0][0].config.assert_called_once_with(text="X")
+        self.renderer.submit([["X", " ", " "], [" ", "O", " "], [" ", " ", " "]])
+        self.renderer.flush()
+        self.buttons[1][1].config.assert_called_once_with(text="O")
+        self.assertEqual(self.buttons[0][0].config.call_count, 1)
+        self.assertEqual(self.renderer.updated_cells, 2)
+        self.assertEqual(self.renderer.skipped_updates, 16)
+        logging.info("test_only_changed_cells_are_touched passed.")
+
+    def test_boards_within_a_frame_are_coalesced(self):
+        self.renderer.submit([["X", " ", " "], [" ", " ", " "], [" ", " ", " "]])
+        self.renderer.submit([["X", "O", " "], [" ", " ", " "], [" ", " ", " "]])
+        self.renderer.submit([["X", "O", "X"], [" ", " ", " "], [" ", " ", " "]])
+        self.renderer.flush()
+        self.assertEqual(self.renderer.updated_cells, 3)
+        self.assertEqual(self.renderer.skipped_updates, 18 + 6)
+        self.assertFalse(self.renderer.flush())
+        logging.info("test_boards_within_a_frame_are_coalesced passed.")
+
+    def test_grid_follows_reported_board_size(self):
+        made = []
+        renderer = BoardRenderer(self.buttons, lambda i, j, size: made.append((i, j, size)) or MagicMock())
+        board = [[" "] * 5 for _ in range(5)]
+        board[4][4] = "X"
+        renderer.submit(board)
+        renderer.flush()
+        self.assertEqual(len(made), 25)
+        self.buttons[0][0].destroy.assert_called_once_with()
+        renderer.buttons[4][4].config.assert_called_once_with(text="X")
+        self.assertEqual(renderer.updated_cells, 1)
+        logging.info("test_grid_follows_reported_board_size passed.")
+
+
+class TestBoardCore(unittest.TestCase):
+    @staticmethod
+    def naive_status(board, length):
+        size = len(board)
+        for player, result in (("X", board_core.X_WINS), ("O", board_core.O_WINS)):
+            for i in range(size):
+                for j in range(size):
+                    for d_row, d_col in board_core.DIRECTIONS:
+                        end_row, end_col = i + (length - 1) * d_row, j + (length - 1) * d_col
+                        if 0 <= end_row < size and 0 <= end_col < size and all(
+                                board[i + n * d_row][j + n * d_col] == player for n in range(length)):
+                            return result
+        return board_core.DRAW if all(cell != " " for row in board for cell in row) else board_core.ONGOING
+
+    def test_classic_lines_match_engine(self):
+        geometry = board_core.get_geometry(3)
+        self.assertEqual(sorted(geometry.masks), sorted(engine.WIN_MASKS))
+        with self.assertRaises(ValueError):
+            board_core.BoardGeometry(3, 4)
+        logging.info("test_classic_lines_match_engine passed.")
+
+    @unittest.skipUnless(np, "requires NumPy")
+    def test_winner_of_a_reported_board(self):
+        geometry = board_core.get_geometry(3)
+        self.assertEqual(geometry.winner([["X", "O", "X"], ["O", "X", "O"], ["O", "X", "O"]]), "draw")
+        self.assertEqual(geometry.winner([["O", "X", "X"], [" ", "O", "X"], [" ", " ", "O"]]), "O")
+        self.assertIsNone(geometry.winner([[" "] * 3] * 3))
+        logging.info("test_winner_of_a_reported_board passed.")
+
+    @unittest.skipUnless(np, "requires NumPy")
+    def test_vectorized_status_matches_scan(self):
+        rng = np.random.default_rng(5)
+        for size, length in ((4, 3), (7, 4), (15, 5)):
+            geometry = board_core.get_geometry(size, length)
+            boards = rng.choice(np.array([0, 1, 2], dtype=np.int8), size=(300, size * size), p=(0.4, 0.3, 0.3))
+            status = geometry.status(boards)
+            self.assertEqual(status.tolist(), [self.naive_status(geometry.decode(cells), length) for cells in boards])
+            self.assertGreater(len(set(status.tolist())), 1)
+        logging.info("test_vectorized_status_matches_scan passed.")
+
+    @unittest.skipUnless(np, "requires NumPy")
+    def test_move_check_reads_lines_through_cell(self):
+        geometry = board_core.get_geometry(15)
+        cells = np.zeros(geometry.cells, dtype=np.int8)
+        for n in range(5):
+            cells[(2 + n) * 15 + 10 - n] = board_core.O
+        self.assertTrue(geometry.wins_at(cells, 4 * 15 + 8))
+        cells[4 * 15 + 8] = board_core.X
+        self.assertFalse(geometry.wins_at(cells, 4 * 15 + 8))
+        self.assertFalse(geometry.wins_at(cells, 0))
+        logging.info("test_move_check_reads_lines_through_cell passed.")
+
+    def test_emulator_agrees_on_larger_boards(self):
+        # The emulator checks wins through board_core; the scan is the loop the sketch runs.
+        for seed in range(20):
+            firmware = TicTacToeFirmware(seed=seed, board_size=7, win_length=4)
+            firmware.handle_line(json.dumps({"command": "MODE", "mode": 2}))
+            expected = {"X": board_core.X_WINS, "O": board_core.O_WINS, None: board_core.DRAW}[
+                None if not firmware.check_win() else firmware.current_player]
+            self.assertEqual(self.naive_status(firmware.board, 4), expected)
+        logging.info("test_emulator_agrees_on_larger_boards passed.")
+
+
+@unittest.skipUnless(np, "requires NumPy")
+class TestGameHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "games.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def feed(recorder, lines):
+        for line in lines:
+            recorder.observe(messages.decode_line(line))
+
+    @staticmethod
+    def random_games(count, seed=3):
+        rng = random.Random(seed)
+        games = []
+        for number in range(count):
+            moves = rng.sample(range(9), rng.randint(0, 9))
+            games.append(Game(number * 1000, rng.randint(0, 60000), rng.randint(0, 3), rng.randint(0, 3), moves))
+        return games
+
+    def test_games_are_rebuilt_from_the_message_stream(self):
+        history = GameHistory(self.path)
+        recorder = GameRecorder(history)
+        firmware = TicTacToeFirmware(seed=11)
+        self.feed(recorder, firmware.setup())
+        finals = []
+        for _ in range(5):
+            self.feed(recorder, firmware.handle_line(json.dumps({"command": "MODE", "mode": 2})))
+            finals.append([row[:] for row in firmware.board])
+        # User vs AI: the win is announced before the final board arrives.
+        self.feed(recorder, firmware.handle_line(json.dumps({"command": "MODE", "mode": 1})))
+        for row, col in ((0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2), (2, 0), (2, 1), (2, 2)):
+            if not firmware.game_over:
+                self.feed(recorder, firmware.handle_line(json.dumps({"command": "MOVE", "row": row, "col": col})))
+        finals.append([row[:] for row in firmware.board])
+        self.assertEqual(recorder.stored, 6)
+        geometry = board_core.get_geometry(3)
+        for game, final in zip(history.games(), finals):
+            board = [[" "] * 3 for _ in range(3)]
+            for turn, cell in enumerate(game.moves):
+                board[cell // 3][cell % 3] = "XO"[turn % 2]
+            self.assertEqual(board, final)
+            self.assertEqual(game.result, geometry.status(geometry.encode(final)[None])[0])
+        self.assertEqual([game.mode for game in history.games()], [2] * 5 + [1])
+        history.close()
+        logging.info("test_games_are_rebuilt_from_the_message_stream passed.")
+
+    def test_indexed_queries_match_a_scan(self):
+        games = self.random_games(3000)
+        history = GameHistory(self.path)
+        history.extend(games[:2000])
+        history.close()
+        # The sidecar covers 2000 games; the rest are indexed when the file is opened again.
+        history = GameHistory(self.path)
+        history.extend(games[2000:2500])
+        history.file.close()
+        with open(self.path, "ab") as output:
+            output.write(history.pack(games[2500])[:10])
+        history = GameHistory(self.path)
+        self.assertEqual(len(history), 2500)
+        history.extend(games[2500:])
+        corners = game_history.opening_cells("corner")
+        for filters in ({"mode": 1, "opening": corners}, {"result": board_core.X_WINS, "mode": 2},
+                        {"opening": 4}, {"result": [board_core.DRAW, board_core.O_WINS], "opening": 0}, {}):
+            expected = [number for number, game in enumerate(games)
+                        if all(getattr(game, field) in (value if isinstance(value, list) else [value])
+                               for field, value in filters.items())]
+            self.assertEqual(history.select(**filters).tolist(), expected)
+        self.assertEqual(history.games([5, 2999]), [games[5], games[2999]])
+        finished = [game for game in games if game.mode == 1 and game.opening in corners and game.result]
+        self.assertAlmostEqual(history.win_rates(mode=1, opening=corners)["X"],
+                               sum(game.result == board_core.X_WINS for game in finished) / len(finished))
+        history.close()
+        os.remove(history.index_path)
+        history = GameHistory(self.path)
+        self.assertEqual(history.select(mode=1, opening=corners).tolist(),
+                         [number for number, game in enumerate(games) if game.mode == 1 and game.opening in corners])
+        history.close()
+        logging.info("test_indexed_queries_match_a_scan passed.")
+
+    def test_export_and_import_round_trip(self):
+        games = self.random_games(200)
+        history = GameHistory(self.path)
+        history.extend(games)
+        for name in ("games.csv", "games.jsonl", "copy.bin"):
+            target = os.path.join(self.directory.name, name)
+            if name.endswith(".bin"):
+                source = target
+                copy = GameHistory(source)
+                copy.extend(games)
+                copy.close()
+            else:
+                self.assertEqual(history.export(target), 200)
+            imported = GameHistory(os.path.join(self.directory.name, "imported-" + name + ".bin"))
+            self.assertEqual(imported.import_file(target), 200)
+            self.assertEqual(imported.games(), games)
+            imported.close()
+        with self.assertRaises(ValueError):
+            GameHistory(os.path.join(self.directory.name, "games.csv"))
+        history.close()
+        logging.info("test_export_and_import_round_trip passed.")
+
+
+class TestHeadlessImports(unittest.TestCase):
+    def test_link_and_front_ends_load_without_tk(self):
+        root = os.path.dirname(os.path.abspath(__file__))
+        code = ("import sys; import uart_core, serial_mux, GUI, TicTacToeSWPart.uart_communicate; "
+                "print(' '.join(sorted({name.split('.')[0] for name in sys.modules} & {'tkinter', 'numpy'})))")
+        environment = dict(os.environ, PYTHONPATH=root)
+        result = subprocess.run([sys.executable, "-c", code], cwd=root, env=environment, capture_output=True,
+                                text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "")
+        import GUI
+        import uart_core
+        self.assertIs(GUI.UARTCommunication, uart_core.UARTCommunication)
+        logging.info("test_link_and_front_ends_load_without_tk passed.")
+
+
+class TestMessageLog(unittest.TestCase):
+    def test_lines_are_batched_per_flush(self):
+        text = MagicMock()
+        log = MessageLog(text, capacity=10)
+        self.assertFalse(log.flush())
+        log.write("first")
+        log.write("second")
+        self.assertTrue(log.flush())
+        text.insert.assert_called_once_with("end", "first\nsecond\n")
+        text.delete.assert_not_called()
+        self.assertIs(uart_communicate.MessageLog, MessageLog)
+        logging.info("test_lines_are_batched_per_flush passed.")
+
+    def test_old_lines_are_trimmed(self):
+        text = MagicMock()
+        log = MessageLog(text, capacity=3)
+        for i in range(2):
+            log.write(str(i))
+        log.flush()
+        for i in range(2, 4):
+            log.write(str(i))
+        log.flush()
+        text.delete.assert_called_once_with("1.0", "2.0")
+        for i in range(4, 10):
+            log.write(str(i))
+        log.flush()
+        text.insert.assert_called_with("end", "7\n8\n9\n")
+        self.assertEqual(list(log.lines), ["7", "8", "9"])
+        self.assertEqual(log.shown, 3)
+        logging.info("test_old_lines_are_trimmed passed.")
+
+    def test_history_keeps_every_line(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.log")
+            log = MessageLog(MagicMock(), capacity=2, history_path=path)
+            for i in range(5):
+                log.write(f"line {i}")
+            log.flush()
+            log.close()
+            with open(path, encoding="utf-8") as history:
+                self.assertEqual(len(history.readlines()), 5)
+        logging.info("test_history_keeps_every_line passed.")
+
+
+class TestEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = engine.Engine(cache_path=None)
+
+    def test_table_covers_every_reachable_position(self):
+        self.assertEqual(len(self.engine.table), 5478)
+        self.assertEqual(self.engine.evaluate([[" "] * 3] * 3), 0)
+        logging.info("test_table_covers_every_reachable_position passed.")
+
+    def test_wins_and_blocks(self):
+        self.assertEqual(self.engine.best_move([["X", "X", " "], ["O", "O", " "], [" ", " ", " "]]), (0, 2))
+        self.assertEqual(self.engine.best_move([["X", "X", " "], ["O", " ", " "], [" ", " ", " "]]), (0, 2))
+        self.assertIsNone(self.engine.best_move([["X", "X", "X"], ["O", "O", " "], [" ", " ", " "]]))
+        logging.info("test_wins_and_blocks passed.")
+
+    def test_table_matches_alpha_beta_search(self):
+        for key, (score, _) in self.engine.table.items():
+            x_mask, o_mask = engine.split_key(key)
+            if engine.x_to_move(x_mask, o_mask):
+                self.assertEqual(engine.search(x_mask, o_mask)[0], score)
+            else:
+                self.assertEqual(engine.search(o_mask, x_mask)[0], score)
+        logging.info("test_table_matches_alpha_beta_search passed.")
+
+    def test_cache_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "table.bin")
+            engine.save_table(self.engine.table, path)
+            self.assertEqual(engine.load_table(path), self.engine.table)
+            with open(path, "r+b") as cache:
+                cache.truncate(100)
+            self.assertEqual(engine.Engine(path).table, self.engine.table)
+        logging.info("test_cache_round_trip passed.")
+
+    def test_host_ai_answers_only_on_its_turn(self):
+        uart = MagicMock()
+        host_ai = HostAI(uart)
+        host_ai.engine = self.engine
+        board = [["X", " ", " "], [" ", " ", " "], [" ", " ", " "]]
+        self.assertIsNone(host_ai.on_board(board))
+        host_ai.enabled = True
+        self.assertEqual(host_ai.on_board(board), (1, 1))
+        uart.send_message.assert_called_once_with({"command": "MOVE", "row": 1, "col": 1})
+        self.assertIsNone(host_ai.on_board([["X", " ", " "], [" ", "O", " "], [" ", " ", " "]]))
+        logging.info("test_host_ai_answers_only_on_its_turn passed.")
+
+
+class TestTablebase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tablebase = tablebase_gen.Tablebase(engine.Engine(cache_path=None).table)
+
+    def test_every_position_gets_an_optimal_move(self):
+        self.assertEqual(self.tablebase.verify(), [])
+        self.assertEqual(len(set(tablebase_gen.SYMMETRIES)), 8)
+        logging.info("test_every_position_gets_an_optimal_move passed.")
+
+    def test_table_is_compact(self):
+        report = self.tablebase.size_report()
+        self.assertLess(report["total_bytes"], report["direct_index_bytes"] // 10)
+        self.assertEqual(report["hash_slots"], len(self.tablebase.moves))
+        logging.info("test_table_is_compact passed.")
+
+    def test_header_is_up_to_date(self):
+        with open(tablebase_gen.HEADER_PATH, encoding="utf-8") as header:
+            self.assertEqual(header.read(), self.tablebase.render_header())
+        logging.info("test_header_is_up_to_date passed.")
+
+    def test_emulated_ai_blocks_a_win(self):
+        firmware = TicTacToeFirmware(seed=1)
+        firmware.board = [["X", "X", " "], [" ", "O", " "], [" ", " ", " "]]
+        firmware.current_player = "O"
+        firmware.ai_move_tablebase()
+        self.assertEqual(firmware.board[0][2], "O")
+        logging.info("test_emulated_ai_blocks_a_win passed.")
+
+
+class TestSimulation(unittest.TestCase):
+    def test_solver_never_loses(self):
+        rng = random.Random(3)
+        solver, opponent = simulate.make_agent("solver"), simulate.make_agent("random")
+        for _ in range(200):
+            self.assertNotEqual(simulate.play_game(opponent, solver, rng)[0], "X")
+            self.assertNotEqual(simulate.play_game(solver, opponent, rng)[0], "O")
+        self.assertEqual(simulate.play_game(solver, solver, rng), ("draw", 9))
+        logging.info("test_solver_never_loses passed.")
+
+    def test_scripted_opening_is_played_first(self):
+        agent = simulate.make_agent("scripted:4,0:solver")
+        self.assertEqual(agent.move(0, 0, 0, random.Random()), 4)
+        self.assertEqual(agent.move(0b10000, 0b1, 2, random.Random()), agent.fallback.move(0b10000, 0b1, 2, None))
+        with self.assertRaises(ValueError):
+            simulate.make_agent("minimax")
+        logging.info("test_scripted_opening_is_played_first passed.")
+
+    def test_batches_are_aggregated_across_workers(self):
+        report = simulate.run("random", "random", 3000, workers=2, batch_size=700, seed=5)
+        self.assertEqual(report["games"], 3000)
+        self.assertAlmostEqual(report["x_win_rate"] + report["o_win_rate"] + report["draw_rate"], 1.0)
+        single = simulate.run("random", "random", 3000, workers=1, batch_size=700, seed=5)
+        for key in ("x_win_rate", "o_win_rate", "draw_rate", "average_moves"):
+            self.assertEqual(report[key], single[key])
+        logging.info("test_batches_are_aggregated_across_workers passed.")
+
+    @unittest.skipIf(simulate.np is None, "requires NumPy")
+    def test_vectorized_mode(self):
+        report = simulate.run("solver", "random", 2000, batch_size=1000, seed=1, vectorized=True)
+        self.assertEqual(report["o_win_rate"], 0.0)
+        self.assertEqual(simulate.run("solver", "solver", 100, seed=1, vectorized=True)["draw_rate"], 1.0)
+        logging.info("test_vectorized_mode passed.")
+
+
+@unittest.skipUnless(hasattr(os, "openpty"), "requires a pty")
+class TestBoardPool(unittest.TestCase):
+    def setUp(self):
+        self.emulators = [PtyEmulator(baud_rate=0).start() for _ in range(3)]
+        self.pool = BoardPool([emulator.port for emulator in self.emulators])
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def test_hardware_suite_runs_on_every_board(self):
+        results = self.pool.run_hardware_suite()
+        self.assertEqual(list(results), self.pool.ports)
+        for result in results.values():
+            self.assertTrue(result.ok, result.value.output)
+            self.assertEqual(result.value.testsRun, 8)
+        logging.info("test_hardware_suite_runs_on_every_board passed.")
+
+    def test_one_failing_board_does_not_stop_the_others(self):
+        self.pool.ports.append("/dev/does-not-exist")
+        results = self.pool.map(lambda port: open(port).close() or port)
+        self.assertEqual(sum(result.ok for result in results.values()), 3)
+        self.assertIsInstance(results["/dev/does-not-exist"].error, OSError)
+        logging.info("test_one_failing_board_does_not_stop_the_others passed.")
+
+    def test_sessions_talk_to_all_boards(self):
+        with self.pool:
+            results = self.pool.map_sessions(lambda uart: uart.send_message({"command": "RESET"}))
+        self.assertTrue(all(result.value.startswith("Sent:") for result in results.values()))
+        self.assertEqual(self.pool.sessions, {})
+        logging.info("test_sessions_talk_to_all_boards passed.")
+
+
+class TestSerialWriter(unittest.TestCase):
+    def blocked_port(self):
+        # The first write stalls until released, so later commands pile up behind it.
+        release = threading.Event()
+        ser = MagicMock()
+        ser.write.side_effect = lambda data: release.wait(2) and len(data)
+        return ser, release
+
+    def test_queued_writes_are_coalesced(self):
+        ser, release = self.blocked_port()
+        writer = SerialWriter(ser)
+        writer.start()
+        for command in (b"A\n", b"B\n", b"C\n", b"D\n"):
+            self.assertTrue(writer.put(command))
+            time.sleep(0.02)
+        release.set()
+        self.assertTrue(writer.drain(2))
+        writer.stop()
+        self.assertEqual([call[0][0] for call in ser.write.call_args_list], [b"A\n", b"B\nC\nD\n"])
+        logging.info("test_queued_writes_are_coalesced passed.")
+
+    def test_full_queue_drops_or_blocks(self):
+        ser, release = self.blocked_port()
+        registry = MetricsRegistry()
+        writer = SerialWriter(ser, capacity=2, block_timeout=0.05, metrics=registry)
+        writer.start()
+        writer.put(b"1\n", "MOVE")
+        time.sleep(0.05)
+        self.assertTrue(writer.put(b"2\n", "MOVE") and writer.put(b"3\n", "MOVE"))
+        self.assertFalse(writer.put(b"4\n", "MOVE"))
+        writer.policy = serial_writer.BLOCK
+        self.assertFalse(writer.put(b"5\n", "MOVE"))
+        threading.Timer(0.1, release.set).start()
+        writer.block_timeout = 2
+        self.assertTrue(writer.put(b"6\n", "MOVE"))
+        self.assertTrue(writer.drain(2))
+        writer.stop()
+        self.assertEqual(writer.dropped, 2)
+        self.assertEqual(b"".join(call[0][0] for call in ser.write.call_args_list), b"1\n2\n3\n6\n")
+        # Dropped commands never reach the port, so they are not counted as sent.
+        self.assertEqual(registry.value("serial_bytes_sent_total"), 8)
+        self.assertEqual(registry.value("serial_commands_sent_total"), 4)
+        logging.info("test_full_queue_drops_or_blocks passed.")
+
+    def test_reconnects_with_backoff_and_replays(self):
+        dead, fresh = MagicMock(), MagicMock()
+        dead.write.side_effect = OSError("device disconnected")
+        attempts = []
+
+        def reopen():
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                raise OSError("no such device")
+            return fresh
+
+        statuses = []
+        registry = MetricsRegistry()
+        with patch("serial_writer.RECONNECT_INITIAL", 0.02):
+            writer = SerialWriter(dead, reopen, on_status=statuses.append, metrics=registry)
+            writer.start()
+            writer.put(b"MOVE\n", "MOVE")
+            deadline = time.monotonic() + 3
+            while not fresh.write.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+            writer.put(b"RESET\n", "RESET")
+            self.assertTrue(writer.drain(2))
+            writer.stop()
+        self.assertEqual([call[0][0] for call in fresh.write.call_args_list], [b"MOVE\n", b"RESET\n"])
+        # The write that failed is counted once, when it is replayed.
+        self.assertEqual(registry.value("serial_bytes_sent_total"), len(b"MOVE\nRESET\n"))
+        self.assertEqual(registry.value("serial_commands_sent_total"), 2)
+        self.assertGreater(attempts[2] - attempts[1], attempts[1] - attempts[0])
+        self.assertEqual(statuses, ["Connection lost: device disconnected; reconnecting",
+                                    "Reconnected; replaying 1 queued command(s)"])
+        logging.info("test_reconnects_with_backoff_and_replays passed.")
+
+    def test_uart_reopens_port_when_reader_fails(self):
+        uart = UARTCommunication()
+        uart.ser, uart.port = MagicMock(), "/dev/ttyACM0"
+        uart.ser.in_waiting = 0
+        uart.ser.read.side_effect = OSError("device disconnected")
+        fresh = MagicMock()
+        fresh.in_waiting = 0
+        fresh.read.return_value = b""
+        with patch("serial.serial_for_url", return_value=fresh) as reopen, \
+                patch("serial_writer.RECONNECT_INITIAL", 0.01):
+            uart.start_writer()
+            uart.start_reader()
+            deadline = time.monotonic() + 3
+            while (uart.reader.ser is not fresh or uart.writer.reconnecting) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(uart.send_message({"command": "RESET"}).startswith("Sent:"))
+            self.assertTrue(uart.writer.drain(2))
+            uart.stop_writer()
+            uart.stop_reader()
+        reopen.assert_called_once_with("/dev/ttyACM0", 9600, timeout=1)
+        fresh.write.assert_called_once_with(b'{"command": "RESET"}\n')
+        self.assertIn("Reconnected; replaying 0 queued command(s)", uart.drain_messages())
+        logging.info("test_uart_reopens_port_when_reader_fails passed.")
+
+
+class FakeBoard(threading.Thread):
+    # Stands in for the writer: runs the emulated sketch one line at a time on its own thread,
+    # so later commands wait in its inbox like they would in the board's receive buffer.
+    def __init__(self, uart, hang_after=None):
+        super().__init__(daemon=True)
+        self.uart = uart
+        self.firmware = TicTacToeFirmware(seed=4)
+        self.inbox = queue.Queue()
+        self.hang_after = hang_after
+        self.handled = 0
+        self.busy = False
+        self.most_waiting = 0
+        self.overlapped = 0
+        self.commands = []
+        self.reconnecting = False
+        self.start()
+
+    def put(self, data, command=None):
+        self.inbox.put(data)
+        self.commands.append(command)
+        self.most_waiting = max(self.most_waiting, sum(len(line) for line in list(self.inbox.queue)))
+        self.overlapped += self.busy
+        return True
+
+    def run(self):
+        while True:
+            line = self.inbox.get()
+            self.busy = True
+            time.sleep(0.002)
+            output = self.firmware.handle_line(line.decode())
+            if self.hang_after is None or self.handled < self.hang_after:
+                for reply in output:
+                    self.uart.reader.tap.put(messages.decode_line(reply))
+            self.handled += 1
+            self.busy = False
+
+
+class TestBatchCommands(unittest.TestCase):
+    DRAW = [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (1, 2), (2, 1), (2, 0), (2, 2)]
+
+    def fake_link(self, hang_after=None):
+        uart = UARTCommunication(MetricsRegistry())
+        uart.reader = MagicMock(game_mode=0)
+        uart.writer = FakeBoard(uart, hang_after)
+        return uart
+
+    @staticmethod
+    def moves(cells):
+        return [{"command": "MOVE", "row": row, "col": col} for row, col in cells]
+
+    def test_replies_are_matched_in_order_on_the_emulator(self):
+        with TcpEmulator(baud_rate=0) as emulator:
+            uart = UARTCommunication()
+            uart.open_port(emulator.url)
+            uart.start_reader()
+            uart.start_writer()
+            self.assertEqual(uart.messages.get(timeout=2).type, "info")
+            self.assertIsNone(uart.reader.game_mode)
+            commands = ([{"command": "MODE", "mode": 0}] + self.moves(self.DRAW) + self.moves([(0, 0)])
+                        + [{"command": "MODE", "mode": 1}] + self.moves([(1, 1)]) + [{"command": "MODE", "mode": 2}]
+                        + self.moves([(0, 0)]))
+            results = uart.send_batch(commands, window=4)
+            mode = uart.reader.game_mode
+            uart.stop_writer()
+            uart.stop_reader()
+            uart.ser.close()
+        self.assertEqual([reply.type for reply in results[0].replies], ["game_mode", "game_status", "board"])
+        self.assertTrue(all(result.reply.type == "board" for result in results[1:10]))
+        self.assertEqual(results[9].replies[0], {"type": "win_status", "message": "It's a draw!"})
+        self.assertEqual(results[10].error, "Invalid move.")
+        self.assertEqual([reply.type for reply in results[12].replies], ["board", "board"])
+        self.assertEqual(results[13].replies[-1].type, "win_status")
+        self.assertEqual(results[14].error, "Invalid move.")
+        self.assertTrue(all(result.ok for result in results[:10] + results[11:14]))
+        self.assertEqual(mode, 2)
+        logging.info("test_replies_are_matched_in_order_on_the_emulator passed.")
+
+    def test_commands_waiting_on_the_board_fit_its_buffer(self):
+        uart = self.fake_link()
+        results = uart.send_batch([{"command": "RESET"}] + self.moves(self.DRAW) * 2)
+        self.assertTrue(all(result.ok for result in results[:10]))
+        self.assertTrue(all(result.error == "Invalid move." for result in results[10:]))
+        self.assertLessEqual(uart.writer.most_waiting, uart_core.BOARD_RX_BUFFER)
+        self.assertGreater(uart.writer.overlapped, 0)
+        self.assertEqual(uart.writer.commands.count("MOVE"), 18)
+        logging.info("test_commands_waiting_on_the_board_fit_its_buffer passed.")
+
+    def test_a_silent_board_stops_the_batch(self):
+        uart = self.fake_link(hang_after=2)
+        results = uart.send_batch(self.moves(self.DRAW), window=2, timeout=0.2)
+        self.assertTrue(results[0].ok and results[1].ok)
+        self.assertEqual(results[2].error, "Timed out waiting for the board")
+        self.assertTrue(all(result.error.startswith(("No reply", "Not sent")) for result in results[3:]))
+        self.assertIsNone(uart.reader.tap)
+        self.assertEqual(UARTCommunication().send_batch(self.moves([(0, 0)]))[0].error, "Port not opened")
+        logging.info("test_a_silent_board_stops_the_batch passed.")
+
+    def test_an_unknown_mode_needs_a_mode_command_first(self):
+        # A greeting replayed by serial_mux to a late client says nothing about the mode the board is in.
+        uart = self.fake_link()
+        uart.reader = SerialReader(MagicMock(), queue.Queue())
+        uart.reader.feed(b'{"type":"game_mode","message":"Game mode set to 1"}\n')
+        self.assertEqual(uart.reader.game_mode, 1)
+        uart.reader.feed(b'{"type":"info","message":"TicTacToe Game Started"}\n')
+        self.assertIsNone(uart.reader.game_mode)
+        results = uart.send_batch(self.moves([(1, 1)]))
+        self.assertEqual(results[0].error, "Game mode unknown: start the batch with a MODE command")
+        self.assertEqual(uart.writer.handled, 0)
+        results = uart.send_batch([{"command": "MODE", "mode": 1}] + self.moves([(1, 1)]), timeout=1)
+        self.assertTrue(all(result.ok for result in results), results)
+        self.assertEqual([reply.type for reply in results[1].replies], ["board", "board"])
+        logging.info("test_an_unknown_mode_needs_a_mode_command_first passed.")
+
+
+class TestSerialMux(unittest.TestCase):
+    def setUp(self):
+        self.emulator = TcpEmulator(baud_rate=0).start()
+        self.unix_path = None
+        if hasattr(socket, "AF_UNIX"):
+            self.unix_path = os.path.join(tempfile.mkdtemp(), "mux.sock")
+        self.mux = SerialMux(self.emulator.url, tcp_port=0, unix_path=self.unix_path)
+        self.thread = run_in_thread(self.mux)
+        deadline = time.monotonic() + 2
+        while self.mux.greeting is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def tearDown(self):
+        stop_thread(self.mux, self.thread)
+        self.emulator.stop()
+
+    def test_subscribers_share_one_board(self):
+        clients = []
+        try:
+            for _ in range(3):
+                uart = UARTCommunication()
+                self.assertEqual(uart.open_port(self.mux.url), f"Connected to {self.mux.url}")
+                uart.start_reader()
+                clients.append(uart)
+            for uart in clients:
+                self.assertEqual(uart.messages.get(timeout=2)["message"], "TicTacToe Game Started")
+            send_move(clients[0], 1, 1)
+            for uart in clients:
+                self.assertEqual(uart.messages.get(timeout=2)["board"][1][1], "X")
+            # Link settings belong to the multiplexer, so only the asking client hears the refusal.
+            self.assertEqual(clients[1].negotiate_protocol("binary"), "Protocol: json (board did not switch)")
+            self.assertEqual(clients[2].negotiate_baud(), "Baud rate: 9600")
+            self.assertEqual({message.type for message in clients[0].drain_messages()}, {"echo"})
+        finally:
+            for uart in clients:
+                uart.stop_reader()
+                uart.ser.close()
+        logging.info("test_subscribers_share_one_board passed.")
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "requires Unix sockets")
+    def test_unix_socket_subscriber(self):
+        with socket.socket(socket.AF_UNIX) as client:
+            client.settimeout(2)
+            client.connect(self.unix_path)
+            stream = client.makefile("rwb")
+            self.assertEqual(json.loads(stream.readline())["type"], "info")
+            stream.write(b'{"command": "MOVE", "row": 0, "col": 2}\n')
+            stream.flush()
+            self.assertEqual(json.loads(stream.readline())["board"][0][2], "X")
+        logging.info("test_unix_socket_subscriber passed.")
+
+    def test_hardware_suite_through_mux(self):
+        result = run_hardware_suite(self.mux.url, 9600)
+        self.assertTrue(result.wasSuccessful(), result.output)
+        self.assertEqual(result.testsRun, 8)
+        logging.info("test_hardware_suite_through_mux passed.")
+
+
+class TestPortRegistry(unittest.TestCase):
+    @staticmethod
+    def listing(device, serial_number=None):
+        return MagicMock(device=device, vid=0x2341, pid=0x0043, serial_number=serial_number, description="Arduino Uno")
+
+    def test_refresh_caches_and_resolves_pins(self):
+        listing = [self.listing("/dev/ttyACM0", "A1")]
+        registry = PortRegistry(lambda: listing, use_udev=False)
+        self.assertTrue(registry.refresh())
+        self.assertFalse(registry.refresh())
+        version, ports = registry.snapshot()
+        self.assertEqual((version, ports[0].label), (1, "/dev/ttyACM0 - Arduino Uno (2341:0043, SN A1)"))
+        listing[:] = [self.listing("/dev/ttyACM1", "A1")]
+        registry.refresh()
+        self.assertEqual(registry.resolve("sn:A1"), "/dev/ttyACM1")
+        self.assertIsNone(registry.resolve("sn:B2"))
+        self.assertEqual(registry.resolve("/dev/ttyUSB0"), "/dev/ttyUSB0")
+        logging.info("test_refresh_caches_and_resolves_pins passed.")
+
+    def test_watcher_debounces_device_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            listing = []
+            registry = PortRegistry(lambda: list(listing), debounce=0.2, poll_interval=0.02,
+                                    device_dir=directory, use_udev=False).start()
+            self.assertTrue(registry.ready.wait(1))
+            time.sleep(0.05)
+            self.assertEqual(registry.scans, 1)
+            # A board enumerating creates its nodes one after another.
+            for name in ("ttyACM0", "ttyACM1", "ttyUSB0"):
+                open(os.path.join(directory, name), "w").close()
+                listing.append(self.listing(f"{directory}/{name}"))
+                time.sleep(0.05)
+            deadline = time.monotonic() + 3
+            while registry.snapshot()[0] < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            registry.stop()
+        self.assertEqual(len(registry.snapshot()[1]), 3)
+        self.assertEqual(registry.scans, 2)
+        logging.info("test_watcher_debounces_device_changes passed.")
+
+    def test_picker_follows_pinned_board(self):
+        listing = [self.listing("/dev/ttyACM0", "A1"), self.listing("/dev/ttyACM1", "B2")]
+        registry = PortRegistry(lambda: listing, use_udev=False)
+        registry.refresh()
+        combobox, variable = MagicMock(), MagicMock()
+        variable.get.return_value = ""
+        picker = PortPicker(combobox, variable, registry, pinned="B2")
+        self.assertTrue(picker.poll())
+        self.assertFalse(picker.poll())
+        label = variable.set.call_args[0][0]
+        self.assertIn("SN B2", label)
+        variable.get.return_value = label
+        self.assertEqual(picker.selected(), "/dev/ttyACM1")
+        listing[1] = self.listing("/dev/ttyACM2", "B2")
+        registry.refresh()
+        picker.poll()
+        self.assertEqual(len(combobox.config.call_args[1]["values"]), 2)
+        self.assertIn("/dev/ttyACM2", variable.set.call_args[0][0])
+        variable.get.return_value = variable.set.call_args[0][0]
+        self.assertEqual(picker.target(), "sn:B2")
+        variable.get.return_value = "socket://127.0.0.1:7878"
+        self.assertEqual(picker.target(), "socket://127.0.0.1:7878")
+        logging.info("test_picker_follows_pinned_board passed.")
+
+    @patch('serial.serial_for_url')
+    def test_reconnect_follows_pinned_board(self, serial_for_url):
+        listing = [self.listing("/dev/ttyACM0", "A1")]
+        registry = PortRegistry(lambda: listing, use_udev=False)
+        registry.refresh()
+        uart = UARTCommunication()
+        uart.ports = registry
+        self.assertEqual(uart.open_port("sn:A1"), "Connected to sn:A1")
+        serial_for_url.assert_called_with("/dev/ttyACM0", 9600, timeout=1)
+        # The board resets and comes back on another node.
+        listing[:] = [self.listing("/dev/ttyACM1", "A1")]
+        registry.refresh()
+        uart.reopen()
+        serial_for_url.assert_called_with("/dev/ttyACM1", 9600, timeout=1)
+        listing[:] = []
+        registry.refresh()
+        with self.assertRaises(serial.SerialException):
+            uart.reopen()
+        self.assertIn("No board with serial number A1", uart.open_port("sn:A1"))
+        logging.info("test_reconnect_follows_pinned_board passed.")
+
+    def test_udev_failure_falls_back_to_polling(self):
+        registry = PortRegistry(lambda: [], use_udev=False)
+        registry.use_udev = True
+        with patch.object(registry, "_watch_udev", side_effect=OSError("no netlink")), \
+                patch.object(registry, "_watch_device_dir") as watch_device_dir:
+            registry.run()
+        watch_device_dir.assert_called_once_with()
+        logging.info("test_udev_failure_falls_back_to_polling passed.")
+
+
+class TestAsyncUARTCommunication(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.emulators = []
+
+    def tearDown(self):
+        for emulator in self.emulators:
+            emulator.stop()
+
+    def emulator(self):
+        emulator = TcpEmulator(baud_rate=0).start()
+        self.emulators.append(emulator)
+        return emulator
+
+    async def test_open_failure_returns_error(self):
+        uart = AsyncUARTCommunication()
+        self.assertIn("Error:", await uart.open("/dev/does-not-exist"))
+        self.assertEqual(await uart.send({"command": "RESET"}), "Port not opened")
+        logging.info("test_open_failure_returns_error passed.")
+
+    async def test_slow_writes_do_not_block_the_loop(self):
+        uart = AsyncUARTCommunication()
+        uart.loop = asyncio.get_running_loop()
+        port, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        port.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        uart.ser = MagicMock(is_open=True, close=port.close)
+        uart.fd = port.fileno()
+        os.set_blocking(uart.fd, False)
+        first = {"command": "ECHO", "data": "x" * 100000}
+        second = {"command": "RESET"}
+        # Neither send waits for the peer: what the socket does not take is queued for add_writer.
+        self.assertTrue((await uart.send(first)).startswith("Sent"))
+        self.assertTrue(uart.outgoing)
+        self.assertTrue((await uart.send(second)).startswith("Sent"))
+        expected = (json.dumps(first) + "\n" + json.dumps(second) + "\n").encode()
+        received = bytearray()
+        peer.setblocking(False)
+        while len(received) < len(expected):
+            received += await asyncio.wait_for(uart.loop.sock_recv(peer, 65536), 5)
+        self.assertEqual(bytes(received), expected)
+        self.assertFalse(uart.outgoing)
+        self.assertFalse(uart.loop.remove_writer(uart.fd))
+        uart.close()
+        logging.info("test_slow_writes_do_not_block_the_loop passed.")
+
+    async def test_request_and_iterate(self):
+        async with AsyncUARTCommunication() as uart:
+            emulator = self.emulator()
+            self.assertEqual(await uart.open(emulator.url), f"Connected to {emulator.url}")
+            self.assertEqual((await uart.__anext__())["type"], "info")
+            responses = await uart.request({"command": "RESET"})
+            self.assertEqual([r["type"] for r in responses], ["game_status", "board"])
+            # Only the reply that completed the request is taken from the iterator.
+            self.assertEqual(await uart.__anext__(), responses[0])
+            responses = await uart.request({"command": "MODE", "mode": 2}, expect="win_status")
+            self.assertEqual(responses[0]["message"], "Game mode set to 2")
+            with self.assertRaises(asyncio.TimeoutError):
+                await uart.request({"command": "RESET"}, expect="never", timeout=0.1)
+            await uart.aclose()
+            remaining = [message async for message in uart]
+            self.assertEqual(remaining[:len(responses) - 1], responses[:-1])
+            self.assertNotIn(responses[-1], remaining[:len(responses)])
+            self.assertEqual(remaining[len(responses) - 1]["type"], "game_status")
+        logging.info("test_request_and_iterate passed.")
+
+    @unittest.skipUnless(hasattr(os, "openpty"), "requires a pty")
+    async def test_many_sessions_share_one_loop(self):
+        async def session(emulator):
+            async with AsyncUARTCommunication() as uart:
+                await uart.open(emulator.port)
+                await uart.__anext__()
+                return (await uart.request({"command": "MOVE", "row": 1, "col": 1}))[-1]["board"][1][1]
+
+        emulators = [PtyEmulator(baud_rate=0).start() for _ in range(50)]
+        self.emulators.extend(emulators)
+        results = await asyncio.gather(*(session(emulator) for emulator in emulators))
+        self.assertEqual(results, ["X"] * 50)
+        logging.info("test_many_sessions_share_one_loop passed.")
+
+
 if __name__ == '__main__':
     unittest.main()
     logging.info("All tests in tests.py executed successfully.")
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import engine
+
+BOARD_CELLS = 9
+HEADER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "INOTicTacToe", "tablebase.h")
+HASH_MULTIPLIER = 0x9E37
+DISPLACEMENT_STEP = 0x2F1B
+KEYS_PER_BUCKET = 4
+MAX_DISPLACEMENT = 256
+
+# Each symmetry maps canonical cell i to board cell SYMMETRIES[t][i].
+IDENTITY = tuple(range(BOARD_CELLS))
+ROTATE = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+MIRROR = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+
+def _compose(first, second):
+    return tuple(first[second[i]] for i in range(BOARD_CELLS))
+
+
+def _symmetries():
+    result = []
+    current = IDENTITY
+    for _ in range(4):
+        result.append(current)
+        result.append(_compose(current, MIRROR))
+        current = _compose(current, ROTATE)
+    return tuple(result)
+
+
+SYMMETRIES = _symmetries()
+_tablebase = None
+
+
+def cells_from_masks(x_mask, o_mask):
+    return [1 if x_mask >> i & 1 else 2 if o_mask >> i & 1 else 0 for i in range(BOARD_CELLS)]
+
+
+def base3_code(cells, symmetry=IDENTITY):
+    code = 0
+    for i in reversed(range(BOARD_CELLS)):
+        code = code * 3 + cells[symmetry[i]]
+    return code
+
+
+def canonicalize(cells):
+    best_code, best_symmetry = None, 0
+    for index, symmetry in enumerate(SYMMETRIES):
+        code = base3_code(cells, symmetry)
+        if best_code is None or code < best_code:
+            best_code, best_symmetry = code, index
+    return best_code, best_symmetry
+
+
+def hash_slot(key, displacement, size):
+    # 16-bit arithmetic so the sketch computes the same slot with uint16_t.
+    value = ((key + displacement * DISPLACEMENT_STEP) * HASH_MULTIPLIER) & 0xFFFF
+    value ^= value >> 7
+    return value % size
+
+
+def solved_positions(table):
+    # Canonical code -> best move in canonical orientation for every non-terminal position.
+    positions = {}
+    for key, (_, move) in sorted(table.items()):
+        if move < 0:
+            continue
+        cells = cells_from_masks(*engine.split_key(key))
+        code, symmetry = canonicalize(cells)
+        if code in positions:
+            continue
+        mapping = SYMMETRIES[symmetry]
+        positions[code] = mapping.index(move)
+    return positions
+
+
+def build_perfect_hash(keys):
+    size = len(keys)
+    while True:
+        bucket_count = max(1, size // KEYS_PER_BUCKET)
+        buckets = [[] for _ in range(bucket_count)]
+        for key in keys:
+            buckets[key % bucket_count].append(key)
+        displacements = [0] * bucket_count
+        taken = [False] * size
+        order = sorted(range(bucket_count), key=lambda b: -len(buckets[b]))
+        for bucket in order:
+            members = buckets[bucket]
+            if not members:
+                continue
+            for displacement in range(MAX_DISPLACEMENT):
+                slots = {hash_slot(key, displacement, size) for key in members}
+                if len(slots) == len(members) and not any(taken[slot] for slot in slots):
+                    for slot in slots:
+                        taken[slot] = True
+                    displacements[bucket] = displacement
+                    break
+            else:
+                break
+        else:
+            return size, displacements
+        size += 1
+
+
+class Tablebase:
+    def __init__(self, table=None):
+        timings = {}
+        start = time.perf_counter()
+        if table is None:
+            table = engine.build_table()
+        self.table = table
+        timings["solve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.positions = solved_positions(table)
+        timings["canonicalize"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        keys = sorted(self.positions)
+        self.size, self.displacements = build_perfect_hash(keys)
+        self.moves = [0x0F] * self.size
+        for key in keys:
+            self.moves[self.slot(key)] = self.positions[key]
+        timings["hash"] = time.perf_counter() - start
+        self.timings = timings
+
+    def slot(self, key):
+        return hash_slot(key, self.displacements[key % len(self.displacements)], self.size)
+
+    def lookup_cells(self, cells):
+        # Same steps as tablebaseMove() in the generated header.
+        code, symmetry = canonicalize(cells)
+        return SYMMETRIES[symmetry][self.moves[self.slot(code)]]
+
+    def best_move(self, board):
+        cells = [1 if cell == "X" else 2 if cell == "O" else 0 for row in board for cell in row]
+        return divmod(self.lookup_cells(cells), 3)
+
+    def packed_moves(self):
+        moves = self.moves + [0x0F] * (len(self.moves) % 2)
+        return [moves[i] | moves[i + 1] << 4 for i in range(0, len(moves), 2)]
+
+    def size_report(self):
+        displacement_bytes = len(self.displacements)
+        move_bytes = len(self.packed_moves())
+        return {
+            "reachable_positions": len(self.table),
+            "canonical_positions": len(self.positions),
+            "hash_slots": self.size,
+            "buckets": len(self.displacements),
+            "displacement_bytes": displacement_bytes,
+            "move_bytes": move_bytes,
+            "symmetry_bytes": len(SYMMETRIES) * BOARD_CELLS,
+            "total_bytes": displacement_bytes + move_bytes + len(SYMMETRIES) * BOARD_CELLS,
+            "direct_index_bytes": (3 ** BOARD_CELLS + 1) // 2,
+        }
+
+    def verify(self):
+        # Every reachable position, in every orientation, must get a move the solver rates optimal.
+        failures = []
+        for key, (score, move) in self.table.items():
+            if move < 0:
+                continue
+            x_mask, o_mask = engine.split_key(key)
+            chosen = self.lookup_cells(cells_from_masks(x_mask, o_mask))
+            bit = 1 << chosen
+            if (x_mask | o_mask) & bit:
+                failures.append(key)
+                continue
+            if engine.x_to_move(x_mask, o_mask):
+                value = -self.table[engine.position_key(x_mask | bit, o_mask)][0]
+            else:
+                value = -self.table[engine.position_key(x_mask, o_mask | bit)][0]
+            if value != score:
+                failures.append(key)
+        return failures
+
+    def render_header(self):
+        def rows(values, per_line=16):
+            lines = []
+            for i in range(0, len(values), per_line):
+                lines.append("    " + ", ".join(f"0x{value:02X}" for value in values[i:i + per_line]) + ",")
+            return "\n".join(lines)
+
+        symmetries = "\n".join("    {" + ", ".join(str(cell) for cell in symmetry) + "}," for symmetry in SYMMETRIES)
+        report = self.size_report()
+        return f"""// Generated by tablebase_gen.py; do not edit by hand.
+// {report['canonical_positions']} canonical positions in {report['hash_slots']} slots, {report['total_bytes']} bytes of flash.
+#ifndef TABLEBASE_H
+#define TABLEBASE_H
+
+#include <Arduino.h>
+#include <avr/pgmspace.h>
+
+const uint16_t TABLEBASE_SLOTS = {self.size};
+const uint16_t TABLEBASE_BUCKETS = {len(self.displacements)};
+const uint16_t TABLEBASE_HASH_MULTIPLIER = 0x{HASH_MULTIPLIER:04X};
+const uint16_t TABLEBASE_DISPLACEMENT_STEP = 0x{DISPLACEMENT_STEP:04X};
+
+const uint8_t TABLEBASE_SYMMETRIES[8][9] PROGMEM = {{
+{symmetries}
+}};
+
+const uint8_t TABLEBASE_DISPLACEMENTS[{len(self.displacements)}] PROGMEM = {{
+{rows(self.displacements)}
+}};
+
+// Two best moves per byte, low nibble first, in canonical orientation.
+const uint8_t TABLEBASE_MOVES[{len(self.packed_moves())}] PROGMEM = {{
+{rows(self.packed_moves())}
+}};
+
+// Returns the cell (row * 3 + col) of a best move for the side to move.
+// cells[i] is 0 for empty, 1 for X and 2 for O.
+static uint8_t tablebaseMove(const uint8_t cells[9]) {{
+    uint16_t bestCode = 0xFFFF;
+    uint8_t bestSymmetry = 0;
+    for (uint8_t t = 0; t < 8; t++) {{
+        uint16_t code = 0;
+        for (int8_t i = 8; i >= 0; i--) {{
+            code = code * 3 + cells[pgm_read_byte(&TABLEBASE_SYMMETRIES[t][i])];
+        }}
+        if (code < bestCode) {{
+            bestCode = code;
+            bestSymmetry = t;
+        }}
+    }}
+    uint8_t displacement = pgm_read_byte(&TABLEBASE_DISPLACEMENTS[bestCode % TABLEBASE_BUCKETS]);
+    uint16_t mixed = (uint16_t)(bestCode + (uint16_t)displacement * TABLEBASE_DISPLACEMENT_STEP);
+    uint16_t value = (uint16_t)((uint32_t)mixed * TABLEBASE_HASH_MULTIPLIER);
+    value ^= value >> 7;
+    uint16_t slot = value % TABLEBASE_SLOTS;
+    uint8_t packed = pgm_read_byte(&TABLEBASE_MOVES[slot >> 1]);
+    uint8_t move = (slot & 1) ? (packed >> 4) : (packed & 0x0F);
+    return pgm_read_byte(&TABLEBASE_SYMMETRIES[bestSymmetry][move]);
+}}
+
+#endif
+"""
+
+
+def get_tablebase():
+    global _tablebase
+    if _tablebase is None:
+        _tablebase = Tablebase(engine.get_engine().table)
+    return _tablebase
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Generate the PROGMEM tablebase header for the TicTacToe sketch.")
+    parser.add_argument("--output", default=HEADER_PATH, help="Header file to write")
+    parser.add_argument("--repeat", type=int, default=1, help="Generate this many times and report the fastest run")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(max(1, args.repeat)):
+        start = time.perf_counter()
+        tablebase = Tablebase()
+        runs.append((time.perf_counter() - start, tablebase))
+    elapsed, tablebase = min(runs, key=lambda run: run[0])
+
+    start = time.perf_counter()
+    failures = tablebase.verify()
+    verify_time = time.perf_counter() - start
+
+    with open(args.output, "w", newline="\n") as header:
+        header.write(tablebase.render_header())
+
+    report = tablebase.size_report()
+    report["generation_ms"] = round(elapsed * 1000, 2)
+    report.update({f"{phase}_ms": round(seconds * 1000, 2) for phase, seconds in tablebase.timings.items()})
+    report["verify_ms"] = round(verify_time * 1000, 2)
+    report["verify_failures"] = len(failures)
+    report["output"] = args.output
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in report.items():
+            print(f"{name + ':':<22}{value}")
+    if failures:
+        raise SystemExit(1)
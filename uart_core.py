@@ -0,0 +1,644 @@
+# -*- coding: utf-8 -*-
+
+import json
+import queue
+import random
+import string
+import threading
+import time
+
+import serial
+
+from binary_protocol import parse_frame
+from messages import Message, ProtoMessage, InfoMessage, GameModeMessage, decode_line, from_dict
+from session_recorder import SessionRecorder, RecordingSerial, ReplaySerial
+from metrics import NULL_REGISTRY
+from serial_writer import SerialWriter, WRITE_QUEUE_SIZE, DROP
+import engine
+
+# The link to the board, without any user interface: framing, decoding, the reader and writer
+# threads and the commands. Nothing here may import tkinter, so services and tests run headless.
+MAX_MESSAGES_PER_FRAME = 64
+NEGOTIATION_TIMEOUT = 3.0
+NEGOTIATION_RETRY = 1.0
+DEFAULT_BAUD_RATE = 9600
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200)
+BAUD_REPLY_TIMEOUT = 1.0
+BAUD_TEST_ECHOES = 8
+BAUD_TEST_PAYLOAD = 32
+BAUD_TEST_TIMEOUT = 0.5
+BAUD_RESYNC_TIMEOUT = 3.0
+BAUD_CHECK_INTERVAL = 1.0
+BAUD_ERROR_LIMIT = 3
+ECHO_ALPHABET = string.ascii_letters + string.digits
+BATCH_WINDOW = 8
+# An Uno's serial receive buffer: commands queued behind the one the board is working on must fit in it.
+BOARD_RX_BUFFER = 64
+# Seconds without a reply before a batch gives up; an AI vs AI game streams boards well within it.
+BATCH_REPLY_TIMEOUT = 3.0
+GAME_REPLIES = ("board", "win_status", "game_status", "game_mode", "error")
+
+
+def parse_message(line):
+    return decode_line(line)
+
+
+class MessageFramer:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.protocol = "json"
+
+    def reset(self):
+        # A reopened board has reset, so it talks JSON again.
+        self.buffer.clear()
+        self.protocol = "json"
+
+    def decode(self, line):
+        return parse_message(line)
+
+    def read_from(self, ser):
+        # Takes only what the driver already holds, so a poll never waits on the wire.
+        waiting = ser.in_waiting
+        return self.feed(ser.read(waiting)) if waiting else []
+
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while True:
+            binary = self.protocol == "binary"
+            end = self.buffer.find(b"\x00" if binary else b"\n")
+            if end < 0:
+                break
+            chunk = bytes(self.buffer[:end])
+            del self.buffer[:end + 1]
+            if binary:
+                if not chunk:
+                    continue
+                message = parse_frame(chunk)
+                if isinstance(message, dict):
+                    message = from_dict(message)
+            else:
+                line = chunk.decode(errors="replace").strip()
+                if not line:
+                    continue
+                message = self.decode(line)
+            if isinstance(message, ProtoMessage):
+                # Everything after the reply is in the format the board just switched to.
+                if message.message in ("json", "binary"):
+                    self.protocol = message.message
+            messages.append(message)
+        return messages
+
+
+class SerialReader(threading.Thread):
+    def __init__(self, ser, messages, metrics=NULL_REGISTRY):
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.messages = messages
+        self.framer = MessageFramer()
+        self.negotiated = threading.Event()
+        self.tap = None
+        self.on_lost = None
+        self.errors = 0
+        # The mode the board last reported in a game_mode reply; None until it does.
+        self.game_mode = None
+        self.running = True
+        self.timed = metrics.enabled
+        self.bytes_received = metrics.counter("serial_bytes_received_total", "Bytes read from the port")
+        self.received = metrics.counter_family("serial_messages_received_total", "Messages decoded, by type")
+        self.decode_errors = metrics.counter("serial_decode_errors_total", "Lines or frames that failed to decode")
+        self.read_errors = metrics.counter("serial_read_errors_total", "Reads that failed and stopped the reader")
+        self.decode_seconds = metrics.histogram("serial_decode_seconds", "Time to frame and decode one read")
+
+    @property
+    def protocol(self):
+        return self.framer.protocol
+
+    def stop(self):
+        self.running = False
+
+    def feed(self, data):
+        start = time.perf_counter() if self.timed else 0.0
+        messages = self.framer.feed(data)
+        if self.timed:
+            self.decode_seconds.observe(time.perf_counter() - start)
+        for message in messages:
+            if not isinstance(message, Message):
+                self.errors += 1
+                self.decode_errors.inc()
+            else:
+                self.received.inc(message.type)
+                if isinstance(message, ProtoMessage):
+                    self.negotiated.set()
+                elif isinstance(message, GameModeMessage):
+                    mode = str(message.message).split()[-1:]
+                    self.game_mode = int(mode[0]) if mode and mode[0].isdigit() else None
+                elif isinstance(message, InfoMessage):
+                    # A booting board is in mode 0, but serial_mux replays the greeting to clients
+                    # joining later, so it does not tell what mode the board is in.
+                    self.game_mode = None
+            tap = self.tap
+            if tap is not None:
+                tap.put(message)
+            self.messages.put(message)
+
+    def run(self):
+        while self.running:
+            try:
+                # Blocks on this thread only; the Tk loop never waits on the port.
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                self.read_errors.inc()
+                self.messages.put(f"Error: {e}")
+                if self.running and self.on_lost:
+                    self.on_lost(e)
+                break
+            if data:
+                self.bytes_received.inc(len(data))
+                self.feed(data)
+
+
+class UARTCommunication:
+    def __init__(self, metrics=None):
+        self.ser = None
+        self.port = None
+        self.reader = None
+        self.writer = None
+        self.messages = queue.Queue()
+        self.metrics = metrics or NULL_REGISTRY
+        # Sent from the GUI thread, baud negotiation and batches alike. With a writer running,
+        # SerialWriter counts these instead, once the data is on the port.
+        self.bytes_sent = self.metrics.counter("serial_bytes_sent_total", "Bytes written to the port", shared=True)
+        self.commands_sent = self.metrics.counter_family("serial_commands_sent_total", "Commands sent, by command",
+                                                         label="command", shared=True)
+        # receive_message polls the port without a reader; its counts are kept apart from the reader's.
+        self.bytes_received = self.metrics.counter("serial_polled_bytes_received_total",
+                                                   "Bytes read by receive_message")
+        self.received = self.metrics.counter_family("serial_polled_messages_received_total",
+                                                    "Messages decoded by receive_message, by type")
+        self.decode_errors = self.metrics.counter("serial_polled_decode_errors_total",
+                                                  "Lines receive_message failed to decode")
+        self.baud_gauge = self.metrics.gauge("serial_baud_rate", "Baud rate the port is running at")
+        self.recorder = None
+        # A port_registry.PortRegistry, set by front ends that let "sn:<serial number>" pin a board.
+        self.ports = None
+        self.baud_rate = DEFAULT_BAUD_RATE
+        self.baud_lock = threading.Lock()
+        self.checked_errors = 0
+        self.checked_at = 0.0
+
+    def list_ports(self):
+        # Enumeration is only needed when asked for; importing it costs more than the rest of pyserial.
+        import serial.tools.list_ports
+        return [port.device for port in serial.tools.list_ports.comports()]
+
+    def device_for(self, port):
+        # Pins are looked up on every open, as a board that re-enumerates may get a new device node.
+        device = self.ports.resolve(port) if self.ports else port
+        if device is None:
+            raise serial.SerialException(f"No board with serial number {port.split(':', 1)[1]} is connected")
+        return device
+
+    def open_port(self, port, baud_rate=DEFAULT_BAUD_RATE):
+        try:
+            self.ser = serial.serial_for_url(self.device_for(port), baud_rate, timeout=1)
+            self.port = port
+            self.baud_rate = baud_rate
+            self.baud_gauge.set(baud_rate)
+            return f"Connected to {port}"
+        except Exception as e:
+            self.ser = None
+            return f"Error: {e}"
+
+    def open_replay(self, path, realtime=False):
+        try:
+            self.ser = ReplaySerial(path, realtime)
+            return f"Replaying {path}"
+        except (OSError, ValueError) as e:
+            self.ser = None
+            return f"Error: {e}"
+
+    def start_recording(self, path):
+        if not (self.ser and self.ser.is_open):
+            return "Port not opened"
+        self.stop_recording()
+        try:
+            self.recorder = SessionRecorder(path)
+        except (OSError, ValueError) as e:
+            return f"Error: {e}"
+        self.ser = RecordingSerial(self.ser, self.recorder)
+        if self.reader:
+            self.reader.ser = self.ser
+        if self.writer:
+            self.writer.ser = self.ser
+        return f"Recording to {path}"
+
+    def stop_recording(self):
+        if not self.recorder:
+            return
+        self.ser = self.ser.ser
+        if self.reader:
+            self.reader.ser = self.ser
+        if self.writer:
+            self.writer.ser = self.ser
+        self.recorder.close()
+        self.recorder = None
+
+    def start_reader(self):
+        self.stop_reader()
+        if self.ser and self.ser.is_open:
+            self.reader = SerialReader(self.ser, self.messages, self.metrics)
+            if self.writer:
+                self.reader.on_lost = self.writer.connection_lost
+            self.reader.start()
+
+    def stop_reader(self):
+        if self.reader:
+            self.reader.stop()
+            self.reader = None
+
+    def start_writer(self, capacity=WRITE_QUEUE_SIZE, policy=DROP):
+        self.stop_writer()
+        if self.ser and self.ser.is_open:
+            self.writer = SerialWriter(self.ser, self.reopen, capacity, policy, on_status=self.messages.put,
+                                       metrics=self.metrics)
+            if self.reader:
+                self.reader.on_lost = self.writer.connection_lost
+            self.writer.start()
+
+    def stop_writer(self):
+        if self.writer:
+            self.writer.stop()
+            self.writer = None
+
+    def reopen(self):
+        # Runs on the writer thread. A board that came back has reset, so it talks JSON at the default rate.
+        try:
+            self.ser.close()
+        except Exception:
+            pass
+        ser = serial.serial_for_url(self.device_for(self.port), DEFAULT_BAUD_RATE, timeout=1)
+        self.ser = RecordingSerial(ser, self.recorder) if self.recorder else ser
+        self.set_baud_rate(DEFAULT_BAUD_RATE, drain=False)
+        if self.reader:
+            self.start_reader()
+        return self.ser
+
+    def is_active(self):
+        # Still active while the writer is reconnecting to a port that went away.
+        return bool(self.ser and self.ser.is_open) or bool(self.writer and self.writer.reconnecting)
+
+    def negotiate_protocol(self, protocol="binary", timeout=NEGOTIATION_TIMEOUT):
+        if not self.reader:
+            return "Port not opened"
+        self.reader.negotiated.clear()
+        # Retry while a freshly opened board may still be in its bootloader.
+        deadline = time.monotonic() + timeout
+        while not self.reader.negotiated.is_set() and time.monotonic() < deadline:
+            self.send_message({"command": "PROTO", "format": protocol})
+            self.reader.negotiated.wait(min(NEGOTIATION_RETRY, deadline - time.monotonic()))
+        if self.reader.protocol == protocol:
+            return f"Protocol: {protocol}"
+        # Firmware without PROTO support ignores the command and keeps sending JSON.
+        return f"Protocol: {self.reader.protocol} (board did not switch)"
+
+    def set_baud_rate(self, baud_rate, drain=True):
+        if drain and self.writer:
+            # Whatever is queued was meant for the current rate.
+            self.writer.drain(BAUD_REPLY_TIMEOUT)
+        self.ser.baudrate = baud_rate
+        self.baud_rate = baud_rate
+        self.baud_gauge.set(baud_rate)
+
+    def expect(self, replies, types, timeout):
+        # Returns the first reply of one of the given types (or None) and the garbled messages seen before it.
+        deadline = time.monotonic() + timeout
+        errors = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, errors
+            try:
+                message = replies.get(timeout=remaining)
+            except queue.Empty:
+                return None, errors
+            if not isinstance(message, Message):
+                errors += 1
+            elif message.type in types:
+                return message, errors
+
+    def echo_test(self, replies, count=BAUD_TEST_ECHOES):
+        for _ in range(count):
+            payload = "".join(random.choice(ECHO_ALPHABET) for _ in range(BAUD_TEST_PAYLOAD))
+            self.send_message({"command": "ECHO", "data": payload})
+            deadline = time.monotonic() + BAUD_TEST_TIMEOUT
+            while True:
+                reply, errors = self.expect(replies, ("echo",), deadline - time.monotonic())
+                if errors or reply is None:
+                    return False
+                # Late echoes of an earlier probe are intact, just stale.
+                if reply.get("message") == payload:
+                    break
+        return True
+
+    def resync(self, replies, rates):
+        # The board reverts by itself after a missed confirmation or a few garbled lines,
+        # so probing at the rate it falls back to finds it again.
+        for rate in rates:
+            self.set_baud_rate(rate)
+            deadline = time.monotonic() + BAUD_RESYNC_TIMEOUT
+            while time.monotonic() < deadline:
+                if self.echo_test(replies, count=1):
+                    return True
+        return False
+
+    def try_baud_rate(self, replies, rate, restore=None):
+        previous = self.baud_rate
+        self.send_message({"command": "BAUD", "rate": rate})
+        reply, _ = self.expect(replies, ("baud", "error"), BAUD_REPLY_TIMEOUT)
+        if reply is None or reply["type"] != "baud":
+            # Older firmware ignores BAUD and unsupported rates are refused at the current rate.
+            return False
+        self.set_baud_rate(rate)
+        if self.echo_test(replies):
+            self.send_message({"command": "BAUD", "rate": rate, "confirm": True})
+            reply, _ = self.expect(replies, ("baud", "error"), BAUD_REPLY_TIMEOUT)
+            if reply is not None and reply.get("message") == f"Confirmed {rate}":
+                return True
+        self.resync(replies, restore or (previous, DEFAULT_BAUD_RATE))
+        return False
+
+    def step_up(self, replies, candidates):
+        for rate in sorted(candidates):
+            if rate > self.baud_rate and not self.try_baud_rate(replies, rate):
+                break
+
+    def negotiate_baud(self, candidates=BAUD_RATES):
+        if not self.reader:
+            return "Port not opened"
+        if not self.baud_lock.acquire(blocking=False):
+            return "Baud negotiation already running"
+        replies = self.reader.tap = queue.Queue()
+        try:
+            # Also waits out a board that is still in its bootloader after the port opened.
+            if self.resync(replies, (self.baud_rate,)):
+                self.step_up(replies, candidates)
+        finally:
+            self.reader.tap = None
+            # Garbled probes from a rejected rate are not a sign of a degrading link.
+            self.checked_errors = self.reader.errors
+            self.baud_lock.release()
+        return f"Baud rate: {self.baud_rate}"
+
+    def link_degraded(self):
+        now = time.monotonic()
+        if (not self.reader or self.baud_rate <= DEFAULT_BAUD_RATE or self.baud_lock.locked()
+                or now - self.checked_at < BAUD_CHECK_INTERVAL):
+            return False
+        self.checked_at = now
+        errors = self.reader.errors - self.checked_errors
+        self.checked_errors = self.reader.errors
+        return errors >= BAUD_ERROR_LIMIT
+
+    def fall_back_baud(self):
+        # Drops to the default rate, then climbs again below the rate that went bad.
+        if not self.reader:
+            return "Port not opened"
+        if not self.baud_lock.acquire(blocking=False):
+            return "Baud negotiation already running"
+        failed = self.baud_rate
+        replies = self.reader.tap = queue.Queue()
+        try:
+            if not self.try_baud_rate(replies, DEFAULT_BAUD_RATE, restore=(DEFAULT_BAUD_RATE,)):
+                self.resync(replies, (DEFAULT_BAUD_RATE,))
+            self.step_up(replies, [rate for rate in BAUD_RATES if rate < failed])
+        finally:
+            self.reader.tap = None
+            self.checked_errors = self.reader.errors
+            self.baud_lock.release()
+        return f"Baud rate: {self.baud_rate} (fell back from {failed})"
+
+    def drain_messages(self, limit=MAX_MESSAGES_PER_FRAME):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def send_message(self, message):
+        writer = self.writer
+        if writer is not None:
+            json_message = json.dumps(message)
+            data = (json_message + "\n").encode()
+            if not writer.put(data, message.get("command")):
+                return f"Error: Write queue full, dropped {json_message}"
+            if writer.reconnecting:
+                return f"Queued: {json_message} (reconnecting)"
+            return f"Sent: {json_message}"
+        if self.ser and self.ser.is_open:
+            try:
+                json_message = json.dumps(message)
+                data = (json_message + "\n").encode()
+                self.ser.write(data)
+                self.bytes_sent.inc(len(data))
+                self.commands_sent.inc(message.get("command"))
+                return f"Sent: {json_message}"
+            except Exception as e:
+                return f"Error: {e}"
+        return "Port not opened"
+
+    def write_command(self, data, command):
+        # Sends already encoded bytes; returns None, or why they were not sent.
+        writer = self.writer
+        if writer is not None:
+            return None if writer.put(data, command.get("command")) else "Write queue full"
+        if not (self.ser and self.ser.is_open):
+            return "Port not opened"
+        try:
+            self.ser.write(data)
+        except Exception as e:
+            return str(e)
+        self.bytes_sent.inc(len(data))
+        self.commands_sent.inc(command.get("command"))
+        return None
+
+    def send_batch(self, commands, window=BATCH_WINDOW, buffer_bytes=BOARD_RX_BUFFER, timeout=BATCH_REPLY_TIMEOUT):
+        # Sends the commands back to back, up to window of them unanswered at once, and returns one
+        # CommandResult per command. The board answers strictly in order, so its replies are matched to
+        # the oldest unanswered command. Replies to commands sent before the batch must be in already.
+        results = [CommandResult(command) for command in commands]
+        if not self.reader:
+            for result in results:
+                result.error = "Port not opened"
+            return results
+        # How many replies a command gets depends on the mode, so it must be known, not guessed.
+        if self.reader.game_mode is None and (not commands or commands[0].get("command") != "MODE"):
+            for result in results:
+                result.error = "Game mode unknown: start the batch with a MODE command"
+            return results
+        # The lock keeps baud negotiation, which also reads through the tap, out while the batch runs.
+        if not self.baud_lock.acquire(timeout=timeout):
+            for result in results:
+                result.error = "Baud negotiation running"
+            return results
+        replies = self.reader.tap = queue.Queue()
+        try:
+            self.run_batch(results, replies, max(1, window), buffer_bytes, timeout)
+        finally:
+            self.reader.tap = None
+            self.baud_lock.release()
+        return results
+
+    def run_batch(self, results, replies, window, buffer_bytes, timeout):
+        encoded = [(json.dumps(result.command, separators=(",", ":")) + "\n").encode() for result in results]
+        mode = self.reader.game_mode
+        total = len(results)
+        started = [0.0] * total
+        sent = done = 0
+        # Bytes of the commands sent after the one the board is working on, i.e. sitting in its buffer.
+        waiting = 0
+        deadline = time.monotonic() + timeout
+        while done < total:
+            while (sent < total and sent - done < window
+                   and (sent == done or waiting + len(encoded[sent]) <= buffer_bytes)):
+                started[sent] = time.perf_counter()
+                error = self.write_command(encoded[sent], results[sent].command)
+                if error:
+                    results[sent].error = f"Not sent: {error}"
+                    for result in results[sent + 1:]:
+                        result.error = "Not sent: an earlier command was not sent"
+                    total = sent
+                    break
+                if sent > done:
+                    waiting += len(encoded[sent])
+                sent += 1
+            if done >= total:
+                break
+            try:
+                message = replies.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                results[done].error = "Timed out waiting for the board"
+                for result in results[done + 1:sent]:
+                    result.error = "No reply: an earlier command timed out"
+                for result in results[sent:total]:
+                    result.error = "Not sent: an earlier command timed out"
+                return
+            if not isinstance(message, Message) or message.type not in GAME_REPLIES:
+                continue
+            deadline = time.monotonic() + timeout
+            result = results[done]
+            result.replies.append(message)
+            command = result.command
+            if command.get("command") == "MODE":
+                mode_after = command.get("mode")
+            else:
+                mode_after = mode
+            if not reply_complete(command, result.replies, mode_after):
+                continue
+            if message.type == "error":
+                result.error = message.get("message")
+            else:
+                mode = mode_after
+            result.seconds = time.perf_counter() - started[done]
+            done += 1
+            if done < sent:
+                # The board has read the next command out of its buffer.
+                waiting -= len(encoded[done])
+
+    def receive_message(self):
+        if self.ser and self.ser.is_open:
+            try:
+                if self.ser.in_waiting > 0:
+                    data = self.ser.readline()
+                    self.bytes_received.inc(len(data))
+                    response = data.decode().strip()
+                    if response:
+                        message = parse_message(response)
+                        if isinstance(message, Message):
+                            self.received.inc(message.type)
+                        else:
+                            self.decode_errors.inc()
+                        return message
+            except Exception as e:
+                return f"Error: {e}"
+        return "Port not opened"
+
+
+class CommandResult:
+    __slots__ = ("command", "replies", "error", "seconds")
+
+    def __init__(self, command):
+        self.command = command
+        self.replies = []
+        self.error = None
+        self.seconds = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.seconds is not None
+
+    @property
+    def reply(self):
+        return self.replies[-1] if self.replies else None
+
+    def __repr__(self):
+        outcome = f"error={self.error!r}" if self.error else f"{len(self.replies)} replies"
+        return f"CommandResult({self.command!r}, {outcome})"
+
+
+def reply_complete(command, replies, mode):
+    # Whether the board has finished answering command, by what the sketch sends for it in mode.
+    last = replies[-1]
+    if last.type == "error":
+        return True
+    name = command.get("command")
+    if mode == 2 and name in ("MODE", "RESET"):
+        # AI vs AI plays the whole game before the board reads the next command.
+        return last.type == "win_status"
+    if last.type != "board":
+        return False
+    if name == "MOVE" and mode == 1:
+        # The board replies for O in the same breath, unless X's move ended the game.
+        cells = [cell for row in last.get("board") for cell in row]
+        return cells.count("X") == cells.count("O") or any(reply.type == "win_status" for reply in replies)
+    return True
+
+
+class HostAI:
+    # Plays O from the host engine while the board itself runs plain user vs user.
+    def __init__(self, uart):
+        self.uart = uart
+        self.enabled = False
+        self.engine = None
+
+    def on_board(self, board):
+        # The host engine only knows the classic board.
+        if not self.enabled or len(board) != engine.BOARD_SIZE:
+            return None
+        x_mask, o_mask = engine.board_to_masks(board)
+        if (engine.x_to_move(x_mask, o_mask) or engine.is_win(x_mask) or engine.is_win(o_mask)
+                or x_mask | o_mask == engine.FULL_MASK):
+            return None
+        if self.engine is None:
+            self.engine = engine.get_engine()
+        move = self.engine.best_move(board)
+        if move:
+            send_move(self.uart, *move)
+        return move
+
+
+def send_move(uart, row, col):
+    message = {"command": "MOVE", "row": row, "col": col}
+    uart.send_message(message)
+
+
+def set_mode(uart, mode):
+    message = {"command": "MODE", "mode": mode}
+    uart.send_message(message)
+
+
+def reset_game(uart):
+    message = {"command": "RESET"}
+    uart.send_message(message)